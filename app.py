@@ -3,9 +3,11 @@ import json
 import os
 import random
 import math
-from datetime import date
+import bisect
+from datetime import date, timedelta
 from collections import defaultdict, Counter
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 import streamlit.components.v1 as components
@@ -13,6 +15,13 @@ import plotly.express as px
 
 import io
 import json
+import gzip
+import copy
+import time
+import uuid
+import atexit
+import hashlib
+import threading
 import streamlit as st
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
@@ -36,7 +45,7 @@ def get_drive_service():
     creds = service_account.Credentials.from_service_account_info(info, scopes=DRIVE_SCOPES)
     return build("drive", "v3", credentials=creds, cache_discovery=False)
 
-def drive_download_text(file_id: str) -> str:
+def drive_download_bytes(file_id: str) -> bytes:
     service = get_drive_service()
     req = service.files().get_media(fileId=file_id, supportsAllDrives=True)
     fh = io.BytesIO()
@@ -44,47 +53,1122 @@ def drive_download_text(file_id: str) -> str:
     done = False
     while not done:
         _, done = downloader.next_chunk()
-    return fh.getvalue().decode("utf-8")
+    return fh.getvalue()
 
-def drive_upload_text(file_id: str, text: str):
+def drive_download_text(file_id: str) -> str:
+    return drive_download_bytes(file_id).decode("utf-8")
+
+def drive_upload_bytes(file_id: str, data: bytes, mimetype="application/json", content_hash=None):
     service = get_drive_service()
     media = MediaIoBaseUpload(
-        io.BytesIO(text.encode("utf-8")),
-        mimetype="application/json",
+        io.BytesIO(data),
+        mimetype=mimetype,
         resumable=False,
     )
-    service.files().update(
+    meta = service.files().update(
         fileId=file_id,
         media_body=media,
+        fields=DRIVE_REVISION_FIELDS,
+        supportsAllDrives=True,
+    ).execute()
+    # 방금 올린 내용이 곧 최신본 → 캐시에 바로 반영 (다른 세션이 다시 받지 않게)
+    _drive_cache_put(file_id, data, _drive_meta_revision(meta), content_hash)
+
+def drive_upload_text(file_id: str, text: str):
+    drive_upload_bytes(file_id, text.encode("utf-8"))
+
+
+# ---------------------------------------------------------
+# ✅ 프로세스 공용 읽기 캐시
+#   - 파일 내용(bytes)을 revision과 함께 보관
+#   - 다시 읽을 땐 메타데이터(version/modifiedTime/md5)만 먼저 확인
+#     → 그대로면 다운로드 생략 (경기 끝나고 20명이 동시에 열어도 실제 다운로드는 1번)
+#   - 세션마다 받은 데이터를 고쳐 쓰므로 parse는 호출마다 새로 함
+#     (같은 dict를 나눠 쓰면 안 되고, deepcopy보다 json.loads가 빠름)
+# ---------------------------------------------------------
+DRIVE_REVISION_FIELDS = "version,modifiedTime,md5Checksum"
+
+def _drive_meta_revision(meta):
+    meta = meta or {}
+    if not any(meta.get(k) for k in ("version", "modifiedTime", "md5Checksum")):
+        return None
+    return "|".join(str(meta.get(k, "")) for k in ("version", "modifiedTime", "md5Checksum"))
+
+def drive_file_revision(file_id: str) -> str:
+    """파일 revision 문자열 (가벼운 메타데이터 호출 1번)"""
+    service = get_drive_service()
+    meta = service.files().get(
+        fileId=file_id,
+        fields=DRIVE_REVISION_FIELDS,
         supportsAllDrives=True,
     ).execute()
+    return _drive_meta_revision(meta)
+
+@st.cache_resource
+def _drive_read_cache():
+    # file_id → {"rev": revision 또는 None, "hash": 내용 hash(샤드) 또는 None, "data": 내용}
+    return {"lock": threading.Lock(), "files": {}}
+
+def _drive_cache_put(file_id: str, data: bytes, rev=None, content_hash=None):
+    cache = _drive_read_cache()
+    with cache["lock"]:
+        cache["files"][file_id] = {"rev": rev, "hash": content_hash, "data": data}
+
+def _drive_cache_drop(file_id: str):
+    cache = _drive_read_cache()
+    with cache["lock"]:
+        cache["files"].pop(file_id, None)
+
+@st.cache_resource
+def _drive_inflight():
+    # (file_id, 버전 키) → 진행 중인 다운로드 {"event", "data", "error"}
+    return {"lock": threading.Lock(), "calls": {}}
+
+def drive_download_bytes_shared(file_id: str, version_key=None) -> bytes:
+    """single-flight 다운로드
+    - 같은 파일(같은 버전)을 동시에 받으려는 요청은 진행 중인 1개를 기다렸다가 결과를 같이 씀
+    - version_key(revision/hash)까지 키에 넣음: 더 새 버전을 본 요청이 옛 다운로드에 붙지 않게
+    """
+    inflight = _drive_inflight()
+    key = (file_id, version_key)
+    with inflight["lock"]:
+        call = inflight["calls"].get(key)
+        leader = call is None
+        if leader:
+            call = {"event": threading.Event(), "data": None, "error": None}
+            inflight["calls"][key] = call
+
+    if not leader:
+        call["event"].wait()
+        if call["error"] is not None:
+            raise call["error"]
+        return call["data"]
+
+    try:
+        call["data"] = drive_download_bytes(file_id)
+    except Exception as e:
+        call["error"] = e
+        raise
+    finally:
+        with inflight["lock"]:
+            inflight["calls"].pop(key, None)
+        call["event"].set()
+    return call["data"]
+
+def drive_read_bytes_cached(file_id: str) -> bytes:
+    """revision이 캐시와 같으면 캐시 내용, 다르면 새로 다운로드"""
+    cache = _drive_read_cache()
+    try:
+        rev = drive_file_revision(file_id)
+    except Exception:
+        rev = None  # 메타데이터 확인 실패 → 그냥 다운로드
+
+    if rev is not None:
+        with cache["lock"]:
+            ent = cache["files"].get(file_id)
+        if ent and ent["rev"] == rev:
+            return ent["data"]
+
+    data = drive_download_bytes_shared(file_id, rev)
+    if rev is not None:
+        _drive_cache_put(file_id, data, rev)
+    return data
+
+def drive_read_text_cached(file_id: str) -> str:
+    return drive_read_bytes_cached(file_id).decode("utf-8")
+
+def drive_read_bytes_by_hash(file_id: str, content_hash: str) -> bytes:
+    """내용 hash를 이미 아는 파일(샤드): hash가 같으면 메타데이터 확인도 없이 캐시 사용"""
+    cache = _drive_read_cache()
+    with cache["lock"]:
+        ent = cache["files"].get(file_id)
+    if ent and content_hash and ent["hash"] == content_hash:
+        return ent["data"]
+
+    data = drive_download_bytes_shared(file_id, content_hash)
+    _drive_cache_put(file_id, data, content_hash=content_hash)
+    return data
 
 def load_json_drive(file_id: str, default):
     try:
-        raw = drive_download_text(file_id)
+        raw = drive_read_text_cached(file_id)
         return json.loads(raw) if raw.strip() else default
     except Exception:
         return default
 
 def save_json_drive(file_id: str, data):
-    text = json.dumps(data, ensure_ascii=False, indent=2)
-    drive_upload_text(file_id, text)
+    drive_upload_text(file_id, _json_compact_text(data))
 
+def drive_create_bytes(name: str, data: bytes, folder_id: str, mimetype="application/json", content_hash=None) -> str:
+    """folder_id 폴더 안에 새 파일을 만들고 file id를 돌려준다."""
+    service = get_drive_service()
+    media = MediaIoBaseUpload(
+        io.BytesIO(data),
+        mimetype=mimetype,
+        resumable=False,
+    )
+    created = service.files().create(
+        body={"name": name, "parents": [folder_id], "mimeType": mimetype},
+        media_body=media,
+        fields="id",
+        supportsAllDrives=True,
+    ).execute()
+    _drive_cache_put(created["id"], data, content_hash=content_hash)
+    return created["id"]
 
-PLAYERS_FILE_ID = st.secrets["drive"]["players_file_id"]
-SESSIONS_FILE_ID = st.secrets["drive"]["sessions_file_id"]
+def drive_create_text(name: str, text: str, folder_id: str) -> str:
+    return drive_create_bytes(name, text.encode("utf-8"), folder_id)
 
-def load_players():
+def drive_delete_file(file_id: str):
+    service = get_drive_service()
+    service.files().delete(fileId=file_id, supportsAllDrives=True).execute()
+    _drive_cache_drop(file_id)
+
+def drive_parent_folder(file_id: str) -> str:
+    service = get_drive_service()
+    meta = service.files().get(fileId=file_id, fields="parents", supportsAllDrives=True).execute()
+    parents = meta.get("parents") or []
+    if not parents:
+        raise RuntimeError(f"Drive 파일 {file_id}의 상위 폴더를 찾을 수 없습니다.")
+    return parents[0]
+
+
+# ---------------------------------------------------------
+# ✅ 저장소 선택 (drive / local / sqlite)
+#   - 환경변수 MSA_STORAGE_BACKEND / MSA_STORAGE_PATH 가 우선
+#   - 없으면 secrets 의 [storage] backend / path
+#   - 아무것도 없으면 지금처럼 Google Drive
+#   local : path 폴더의 players.json / sessions.json (기본: app.py 폴더)
+#   sqlite: path 의 SQLite 파일 (기본: app.py 폴더의 msa.sqlite3)
+# ---------------------------------------------------------
+STORAGE_BACKEND_NAMES = ["drive", "local", "sqlite"]
+PLAYERS_FILE = "players.json"
+SESSIONS_FILE = "sessions.json"
+SQLITE_FILE = "msa.sqlite3"
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _storage_setting(key: str, default=None):
+    env = os.environ.get(f"MSA_STORAGE_{key.upper()}")
+    if env:
+        return env
+    try:
+        return st.secrets.get("storage", {}).get(key, default)
+    except Exception:
+        return default  # secrets.toml 자체가 없을 때
+
+STORAGE_BACKEND = str(_storage_setting("backend", "drive")).strip().lower()
+if STORAGE_BACKEND not in STORAGE_BACKEND_NAMES:
+    raise RuntimeError(
+        f"알 수 없는 저장소 '{STORAGE_BACKEND}' (가능: {', '.join(STORAGE_BACKEND_NAMES)})"
+    )
+STORAGE_PATH = _storage_setting("path")
+# sessions 저장 압축: "gzip"(기본) / "none"
+STORAGE_COMPRESS = str(_storage_setting("compress", "gzip")).strip().lower()
+
+if STORAGE_BACKEND == "drive":
+    PLAYERS_FILE_ID = st.secrets["drive"]["players_file_id"]
+    SESSIONS_FILE_ID = st.secrets["drive"]["sessions_file_id"]
+    # 날짜별 샤드 파일을 만들 폴더 (없으면 sessions 파일과 같은 폴더)
+    SESSIONS_FOLDER_ID = st.secrets["drive"].get("sessions_folder_id")
+else:
+    PLAYERS_FILE_ID = SESSIONS_FILE_ID = SESSIONS_FOLDER_ID = None
+
+def _drive_load_players():
     return load_json_drive(PLAYERS_FILE_ID, [])
 
-def save_players(players):
+def _drive_save_players(players):
     save_json_drive(PLAYERS_FILE_ID, players)
 
-def load_sessions():
-    return load_json_drive(SESSIONS_FILE_ID, {})
 
-def save_sessions(sessions):
-    save_json_drive(SESSIONS_FILE_ID, sessions)
+# ---------------------------------------------------------
+# ✅ sessions 날짜별 샤드 저장
+#   - SESSIONS_FILE_ID 에는 작은 manifest만 둔다
+#       {"format": "msa-sessions-manifest", "version": 1,
+#        "dates": {"2025-11-03": {"file_id": "...", "hash": "..."}, ...}}
+#   - 날짜 하나 = Drive 파일 하나 (sessions_2025-11-03.json)
+#   - 저장할 때는 hash가 바뀐 날짜만 업로드 → 저장 비용이 변경량에 비례
+#   - 예전 통짜 sessions.json 은 그대로 읽히고, 첫 저장 때 샤드로 옮겨짐
+#   - 샤드 내용은 compact 형식 (아래 encode_stored_days)
+# ---------------------------------------------------------
+SESSIONS_MANIFEST_FORMAT = "msa-sessions-manifest"
+SESSIONS_MANIFEST_VERSION = 1
+
+def _json_text(data) -> str:
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def _doc_hash(data) -> str:
+    return _text_hash(_json_text(data))
+
+def _sessions_date_hashes(sessions) -> dict:
+    """날짜별 내용 hash (샤드 manifest의 hash와 같은 값)"""
+    return {d: _doc_hash(day_data) for d, day_data in sessions.items()}
+
+# ✅ 날짜별 hash 캐시 (통계 인덱스/경기 테이블/저장 flush 가 함께 씀)
+#   - 조회할 때마다 전체를 hash 하지 않고, sessions 를 고쳤다는 신호(revision)가 있을 때만 다시 계산
+#   - 신호: save_sessions(→ 저장 flush 대상 표시), 예전 시즌 읽어서 합치기, 처음 읽기
+#   - sessions 는 항상 save_sessions 와 함께 고치므로 revision 만 보면 됨
+def sessions_rev_bump(sessions=None, dates=None):
+    """sessions 를 고쳤다고 알림 (dates 를 주면 그 날짜만 다시 hash, 나머지는 이전 값 재사용)"""
+    rev = st.session_state.get("_sessions_rev", 0) + 1
+    st.session_state["_sessions_rev"] = rev
+    cached = st.session_state.get("_sessions_hash_cache")
+    if sessions is None or dates is None or cached is None or cached[0][0] != id(sessions):
+        st.session_state.pop("_sessions_hash_cache", None)
+        return
+    old = cached[1]
+    dates = set(dates)
+    hashes = {
+        d: (_doc_hash(day_data) if (d in dates or d not in old) else old[d])
+        for d, day_data in sessions.items()
+    }
+    st.session_state["_sessions_hash_cache"] = ((id(sessions), rev), hashes, _doc_hash(hashes))
+
+def sessions_date_hashes_current(sessions):
+    """(날짜별 hash, 전체 revision hash) — 마지막 sessions_rev_bump 이후 처음 한 번만 계산"""
+    key = (id(sessions), st.session_state.get("_sessions_rev", 0))
+    cached = st.session_state.get("_sessions_hash_cache")
+    if cached is None or cached[0] != key:
+        hashes = _sessions_date_hashes(sessions)
+        cached = (key, hashes, _doc_hash(hashes))
+        st.session_state["_sessions_hash_cache"] = cached
+    return cached[1], cached[2]
+
+def _json_compact_text(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+# ---------------------------------------------------------
+# ✅ sessions 저장 형식 (compact)
+#   - 들여쓰기 없는 JSON + 선수 이름표(names): 경기/사이드/조 정보에는 이름 대신 번호
+#       {"format": "msa-days", "version": 1, "names": ["황혜진", ...],
+#        "days": {"2025-12-22": {"schedule": [["복식", [0, 1], [2, 3], 1], ...],
+#                                "results": {"1": {"t1": 6, "t2": 3, "sides": [[0, "포(듀스)"], ...]}},
+#                                "groups_snapshot": [[0, "B조"], ...], ...}}}
+#   - drive 샤드 / sqlite 행은 gzip으로 한 번 더 압축 (STORAGE_COMPRESS = "none" 이면 생략)
+#   - 예전 형식(들여쓴 JSON, 이름 그대로)도 그대로 읽힘
+#   - 날짜 hash(_doc_hash)는 저장 형식과 상관없이 원래 JSON 기준
+#     → 형식이 바뀌어도 manifest hash / 점수 이벤트 base 가 그대로 맞음
+# ---------------------------------------------------------
+STORED_DAYS_FORMAT = "msa-days"
+STORED_DAYS_VERSION = 1
+GZIP_MAGIC = b"\x1f\x8b"
+
+def _compact_day(day_data, name_id):
+    """이름 → 번호로 바꾼 그날 데이터 (키 순서 유지). 모르는 모양이면 ValueError"""
+    out = {}
+    for k, v in day_data.items():
+        if k == "schedule":
+            out[k] = [
+                [g[0], [name_id(p) for p in g[1]], [name_id(p) for p in g[2]], *g[3:]]
+                for g in v
+            ]
+        elif k == "results":
+            res_out = {}
+            for idx, res in v.items():
+                if not isinstance(res, dict):
+                    raise ValueError("result")
+                sides = res.get("sides")
+                if sides is not None:
+                    res = dict(res)  # 키 순서 유지
+                    res["sides"] = [[name_id(p), side] for p, side in sides.items()]
+                res_out[idx] = res
+            out[k] = res_out
+        elif k == "groups_snapshot" and isinstance(v, dict):
+            out[k] = [[name_id(p), grp] for p, grp in v.items()]
+        else:
+            out[k] = v
+    return out
+
+def _expand_day(cd, names):
+    out = {}
+    for k, v in cd.items():
+        if k == "schedule":
+            out[k] = [
+                [g[0], [names[i] for i in g[1]], [names[i] for i in g[2]], *g[3:]]
+                for g in v
+            ]
+        elif k == "results":
+            res_out = {}
+            for idx, res in v.items():
+                sides = res.get("sides")
+                if sides is not None:
+                    res = dict(res)  # 키 순서 유지
+                    res["sides"] = {names[i]: side for i, side in sides}
+                res_out[idx] = res
+            out[k] = res_out
+        elif k == "groups_snapshot" and isinstance(v, list):
+            out[k] = {names[i]: grp for i, grp in v}
+        else:
+            out[k] = v
+    return out
+
+def encode_stored_days(days: dict, compress=None) -> bytes:
+    """{날짜: 그날 데이터} → 저장용 bytes
+    - 날짜마다 되돌려 본 결과가 원본과 같을 때만 번호로 바꾸고, 아니면 그날은 원본 그대로(raw)"""
+    names, ids = [], {}
+
+    def name_id(p):
+        if not isinstance(p, str):
+            raise ValueError("name")
+        i = ids.get(p)
+        if i is None:
+            i = ids[p] = len(names)
+            names.append(p)
+        return i
+
+    out_days, raw = {}, []
+    for d, day_data in days.items():
+        try:
+            cd = _compact_day(day_data, name_id)
+            ok = _json_compact_text(_expand_day(cd, names)) == _json_compact_text(day_data)
+        except (ValueError, TypeError, IndexError, AttributeError):
+            ok = False
+        if ok:
+            out_days[d] = cd
+        else:
+            out_days[d] = day_data
+            raw.append(d)
+
+    doc = {"format": STORED_DAYS_FORMAT, "version": STORED_DAYS_VERSION, "names": names, "days": out_days}
+    if raw:
+        doc["raw"] = raw
+    data = _json_compact_text(doc).encode("utf-8")
+    if (STORAGE_COMPRESS == "gzip") if compress is None else compress:
+        data = gzip.compress(data, mtime=0)  # mtime=0: 같은 내용이면 같은 bytes
+    return data
+
+def decode_stored(data):
+    """저장된 bytes/str → ("days", {날짜: 그날 데이터}) 또는 ("plain", 예전 형식 JSON)"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if data[:2] == GZIP_MAGIC:
+        data = gzip.decompress(data)
+    if not data.strip():
+        return "plain", None
+    doc = json.loads(data)
+    if not (isinstance(doc, dict) and doc.get("format") == STORED_DAYS_FORMAT):
+        return "plain", doc
+    names = doc.get("names", [])
+    raw = set(doc.get("raw", []))
+    return "days", {
+        d: (cd if d in raw else _expand_day(cd, names)) for d, cd in doc.get("days", {}).items()
+    }
+
+def _decode_stored_day(data, d):
+    kind, obj = decode_stored(data)
+    if kind == "days":
+        return obj.get(d, {})
+    return obj if obj is not None else {}
+
+def _is_sessions_manifest(doc) -> bool:
+    return isinstance(doc, dict) and doc.get("format") == SESSIONS_MANIFEST_FORMAT
+
+def _make_sessions_manifest(dates: dict, journal=None) -> dict:
+    manifest = {
+        "format": SESSIONS_MANIFEST_FORMAT,
+        "version": SESSIONS_MANIFEST_VERSION,
+        "dates": dates,
+    }
+    if journal:
+        manifest["journal"] = journal  # 점수 이벤트 저널 파일 {"file_id": ...}
+    return manifest
+
+def _shard_file_name(d: str) -> str:
+    return f"sessions_{d}.json"
+
+@st.cache_resource
+def _sessions_manifest_store():
+    # 프로세스 공용: 마지막으로 읽거나 쓴 manifest + 동시 저장 방지용 lock
+    # legacy: SESSIONS_FILE_ID 가 아직 예전 통짜 파일인지
+    return {"lock": threading.RLock(), "manifest": None, "folder_id": None, "legacy": False}
+
+def _current_sessions_manifest():
+    store = _sessions_manifest_store()
+    if store["manifest"] is None:
+        doc = load_json_drive(SESSIONS_FILE_ID, {})
+        if _is_sessions_manifest(doc):
+            store["manifest"] = doc
+        else:
+            # 아직 통짜 파일 → 빈 manifest에서 시작(첫 저장 때 전체가 샤드로 생성됨)
+            store["manifest"] = _make_sessions_manifest({})
+            store["legacy"] = True
+    return store["manifest"]
+
+def _sessions_shard_folder():
+    store = _sessions_manifest_store()
+    if store["folder_id"] is None:
+        store["folder_id"] = SESSIONS_FOLDER_ID or drive_parent_folder(SESSIONS_FILE_ID)
+    return store["folder_id"]
+
+def _pick_dates(sessions, dates):
+    if dates is None:
+        return sessions
+    wanted = set(dates)
+    return {d: v for d, v in sessions.items() if d in wanted}
+
+def _drive_list_session_dates():
+    doc = load_json_drive(SESSIONS_FILE_ID, {})
+    if _is_sessions_manifest(doc):
+        return list(doc.get("dates", {}))
+    return list(doc)
+
+def _drive_read_manifest_strict():
+    """SESSIONS_FILE_ID 내용 (manifest 또는 예전 통짜 파일). 못 읽으면 에러 — 빈 값으로 대신하지 않음"""
+    raw = drive_read_text_cached(SESSIONS_FILE_ID)
+    return json.loads(raw) if raw.strip() else {}
+
+def _drive_load_sessions(dates=None, doc=None):
+    """dates 를 주면 그 날짜 샤드만 읽음 (None 이면 전부)
+    - doc: 이미 읽어 둔 manifest (없으면 여기서 읽음)"""
+    if doc is None:
+        doc = load_json_drive(SESSIONS_FILE_ID, {})
+    store = _sessions_manifest_store()
+    if not _is_sessions_manifest(doc):
+        # 예전 통짜 형식: 아직 샤드가 없으므로 빈 manifest 기준으로 첫 저장 때 이전
+        if store["manifest"] is None:
+            store["manifest"] = _make_sessions_manifest({})
+            store["legacy"] = True
+        return _pick_dates(doc, dates)
+
+    store["manifest"] = doc
+    store["legacy"] = False
+
+    sessions = {}
+    for d, ent in _pick_dates(doc.get("dates", {}), dates).items():
+        # ⚠ 샤드 하나라도 못 읽으면 빈 값으로 대체하지 않고 에러
+        #    (빈 값으로 두면 다음 저장에서 그 날짜가 지워짐)
+        sessions[d] = _decode_stored_day(drive_read_bytes_by_hash(ent["file_id"], ent.get("hash")), d)
+
+    events = _parse_score_events(_drive_journal_text(doc))
+    if events:
+        replay_score_events(sessions, events, {d: ent.get("hash") for d, ent in doc.get("dates", {}).items()})
+    return sessions
+
+def _upload_sessions_shard(d, day_data, ent):
+    """날짜 하나를 샤드로 올리고 manifest 항목을 돌려준다 (hash 같으면 업로드 생략)"""
+    h = _doc_hash(day_data)
+
+    if ent and ent.get("hash") == h:
+        return ent
+
+    data = encode_stored_days({d: day_data})
+    mimetype = "application/gzip" if data[:2] == GZIP_MAGIC else "application/json"
+    if ent:
+        drive_upload_bytes(ent["file_id"], data, mimetype=mimetype, content_hash=h)
+        file_id = ent["file_id"]
+    else:
+        file_id = drive_create_bytes(
+            _shard_file_name(d), data, _sessions_shard_folder(), mimetype=mimetype, content_hash=h
+        )
+    return {"file_id": file_id, "hash": h}
+
+def _commit_sessions_manifest(new_dates, removed):
+    store = _sessions_manifest_store()
+    journal = (store["manifest"] or {}).get("journal")
+    new_manifest = _make_sessions_manifest(new_dates, journal=journal)
+    # manifest를 먼저 바꾸고 나서 지운 날짜 파일 삭제 (읽는 쪽이 없는 파일을 가리키지 않게)
+    save_json_drive(SESSIONS_FILE_ID, new_manifest)
+    store["manifest"] = new_manifest
+    store["legacy"] = False
+
+    for ent in removed:
+        try:
+            drive_delete_file(ent["file_id"])
+        except Exception:
+            pass  # 고아 파일은 남아도 manifest에서 빠졌으니 읽히지 않음
+
+def _drive_save_sessions(sessions, date_hashes=None):
+    """date_hashes: 이미 계산해 둔 _sessions_date_hashes(sessions) 가 있으면 재사용"""
+    store = _sessions_manifest_store()
+    with store["lock"]:
+        manifest = _current_sessions_manifest()
+        old_dates = manifest.get("dates", {})
+        new_dates = {}
+
+        for d, day_data in sessions.items():
+            ent = old_dates.get(d)
+            if date_hashes is not None and ent and ent.get("hash") == date_hashes.get(d):
+                new_dates[d] = ent
+                continue
+            new_dates[d] = _upload_sessions_shard(d, day_data, ent)
+
+        removed = [ent for d, ent in old_dates.items() if d not in new_dates]
+
+        if new_dates == old_dates and not store["legacy"]:
+            return
+
+        _commit_sessions_manifest(new_dates, removed)
+
+def _drive_legacy_doc():
+    """아직 통짜 파일이면 그 내용을, 그 사이 다른 곳에서 샤드로 이전됐으면 None
+    (여기선 못 읽으면 에러: 빈 값으로 이전하면 전체가 날아감)"""
+    store = _sessions_manifest_store()
+    doc = _drive_read_manifest_strict()
+    if _is_sessions_manifest(doc):
+        store["manifest"] = doc
+        store["legacy"] = False
+        return None
+    return doc
+
+def _drive_save_sessions_dates(changes: dict):
+    """바뀐 날짜만 반영: changes = {날짜: 그날 데이터, 지운 날짜: None}
+    - manifest의 나머지 날짜는 건드리지 않는다
+      (여러 명이 서로 다른 날짜를 고쳐도 서로의 저장을 덮어쓰지 않음)
+    """
+    store = _sessions_manifest_store()
+    with store["lock"]:
+        manifest = _current_sessions_manifest()
+
+        if store["legacy"]:
+            doc = _drive_legacy_doc()
+            if doc is not None:
+                # 아직 통짜 파일 → 변경분을 얹고 한 번에 샤드로 이전
+                for d, day_data in changes.items():
+                    if day_data is None:
+                        doc.pop(d, None)
+                    else:
+                        doc[d] = day_data
+                _drive_save_sessions(doc)
+                return
+            manifest = store["manifest"]
+
+        old_dates = manifest.get("dates", {})
+        new_dates = dict(old_dates)
+        removed = []
+
+        for d, day_data in changes.items():
+            ent = old_dates.get(d)
+            if day_data is None:
+                if ent:
+                    new_dates.pop(d, None)
+                    removed.append(ent)
+                continue
+            new_dates[d] = _upload_sessions_shard(d, day_data, ent)
+
+        if new_dates == old_dates:
+            return
+
+        _commit_sessions_manifest(new_dates, removed)
+
+# ---------------------------------------------------------
+# ✅ 점수 이벤트 저널 (append-only, 모든 저장소 공통 규칙)
+#   - 점수만 바뀐 날짜는 그날 전체를 다시 쓰지 않고 작은 이벤트만 덧붙임
+#       {"date", "idx", "t1", "t2", "sides", "ts", "client", "base"}
+#   - base = 이벤트를 쓸 때 저장돼 있던 그 날짜 스냅샷의 hash
+#     → 읽을 때 base가 지금 스냅샷 hash와 같은 이벤트만 순서대로 적용
+#       (그 뒤 그 날짜 전체가 다시 저장됐거나 compaction 됐으면 자동으로 무시됨)
+#   - 이벤트가 SCORE_JOURNAL_COMPACT_EVENTS 개 쌓이면 스냅샷에 접어 넣고(compaction)
+#     저널 내용은 보관본(누가 언제 어떤 점수를 바꿨는지)으로 옮긴 뒤 비움
+# ---------------------------------------------------------
+SCORE_JOURNAL_COMPACT_EVENTS = 40
+SCORE_RESULT_KEYS = {"t1", "t2", "sides"}
+SESSIONS_JOURNAL_NAME = "sessions_journal.jsonl"
+
+def _score_event_lines(events) -> str:
+    return "".join(json.dumps(ev, ensure_ascii=False, separators=(",", ":")) + "\n" for ev in events)
+
+def _parse_score_events(text) -> list:
+    events = []
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            continue  # 쓰다 끊긴 줄
+    return events
+
+def _apply_score_event(sessions, ev):
+    day_data = sessions.get(ev.get("date"))
+    if day_data is None:
+        return
+    day_data.setdefault("results", {})[str(ev["idx"])] = {
+        "t1": ev.get("t1"),
+        "t2": ev.get("t2"),
+        "sides": ev.get("sides", {}),
+    }
+
+def replay_score_events(sessions, events, date_hashes):
+    """스냅샷(sessions)에 저널 이벤트를 순서대로 적용. date_hashes: 스냅샷의 날짜별 hash"""
+    for ev in events:
+        base = ev.get("base")
+        if base is not None and base == date_hashes.get(ev.get("date")):
+            _apply_score_event(sessions, ev)
+    return sessions
+
+def _stamp_score_events(events, date_hashes) -> list:
+    """쓰기 직전에 base(지금 저장된 스냅샷 hash)를 붙임
+    - 저장소에 없는 날짜(그 사이 지워짐)의 이벤트는 버림"""
+    out = []
+    for ev in events:
+        base = date_hashes.get(ev["date"])
+        if base is not None:
+            out.append(dict(ev, base=base))
+    return out
+
+def _drive_journal_text(manifest) -> str:
+    ent = (manifest or {}).get("journal")
+    if not ent:
+        return ""
+    return drive_read_text_cached(ent["file_id"])
+
+def _drive_append_score_events(events):
+    store = _sessions_manifest_store()
+    with store["lock"]:
+        manifest = _current_sessions_manifest()
+        if store["legacy"]:
+            doc = _drive_legacy_doc()
+            if doc is not None:
+                # 아직 통짜 파일 → 이벤트를 얹어서 샤드로 이전 (저널은 이전 후부터)
+                for ev in events:
+                    _apply_score_event(doc, ev)
+                _drive_save_sessions(doc)
+                return
+            manifest = store["manifest"]
+
+        dates = manifest.get("dates", {})
+        stamped = _stamp_score_events(events, {d: ent.get("hash") for d, ent in dates.items()})
+        if not stamped:
+            return
+
+        ent = manifest.get("journal")
+        if ent:
+            text = _drive_journal_text(manifest) + _score_event_lines(stamped)
+            drive_upload_text(ent["file_id"], text)
+        else:
+            text = _score_event_lines(stamped)
+            file_id = drive_create_text(SESSIONS_JOURNAL_NAME, text, _sessions_shard_folder())
+            new_manifest = _make_sessions_manifest(dates, journal={"file_id": file_id})
+            save_json_drive(SESSIONS_FILE_ID, new_manifest)
+            store["manifest"] = new_manifest
+
+        if text.count("\n") >= SCORE_JOURNAL_COMPACT_EVENTS:
+            try:
+                _drive_compact_score_journal()
+            except Exception:
+                pass  # 이벤트는 이미 저널에 들어감 → 접기는 다음 저장 때 다시 시도
+
+def _drive_compact_score_journal():
+    store = _sessions_manifest_store()
+    with store["lock"]:
+        # ⚠ manifest 는 실패하면 에러나는 경로로 읽음
+        #    (load_json_drive 처럼 {} 로 삼키면 빈 manifest 를 저장하고 날짜 샤드를 전부 지움)
+        manifest = _drive_read_manifest_strict()
+        if not _is_sessions_manifest(manifest):
+            return
+        ent = manifest.get("journal")
+        if not ent:
+            return
+        text = _drive_journal_text(manifest)
+        if not text.strip():
+            return
+
+        # 스냅샷 + 저널 적용본을 다시 저장 → 바뀐 날짜 샤드만 업로드, 접힌 이벤트는 base가 달라져 무효
+        sessions = _drive_load_sessions(doc=manifest)
+        if set(sessions) != set(manifest.get("dates", {})):
+            raise RuntimeError("compaction: manifest 날짜를 다 읽지 못해 중단")  # 날짜를 지우는 저장은 안 함
+        _drive_save_sessions(sessions)
+
+        # 보관본을 남기고 저널 비우기
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        drive_create_text(f"sessions_journal_{stamp}.jsonl", text, _sessions_shard_folder())
+        drive_upload_text(ent["file_id"], "")
+
+
+# ---------------------------------------------------------
+# ✅ local 저장소: 폴더 안 JSON 파일 (네트워크 없이 실행/벤치마크용)
+#   - 형식은 예전 통짜 players.json / sessions.json 과 같음
+#   - 임시 파일에 쓰고 os.replace → 쓰다 죽어도 파일이 깨지지 않음
+# ---------------------------------------------------------
+@st.cache_resource
+def _local_store_lock():
+    return threading.RLock()
+
+def _local_dir() -> str:
+    return STORAGE_PATH or APP_DIR
+
+def _local_path(name: str) -> str:
+    return os.path.join(_local_dir(), name)
+
+def _read_json_file(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        raw = f.read()
+    return json.loads(raw) if raw.strip() else default
+
+def _local_read_json(name: str, default):
+    return _read_json_file(_local_path(name), default)
+
+def _local_read_text(name: str) -> str:
+    path = _local_path(name)
+    if not os.path.exists(path):
+        return ""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def _local_write_text(name: str, text: str):
+    path = _local_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def _local_write_json(name: str, data):
+    _local_write_text(name, _json_compact_text(data))
+
+def _local_read_sessions_file() -> dict:
+    path = _local_path(SESSIONS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "rb") as f:
+        _, obj = decode_stored(f.read())
+    return obj or {}
+
+def _local_write_sessions_file(sessions):
+    # 로컬 파일은 gzip 없이 compact JSON (그래도 열어 볼 수 있게)
+    _local_write_text(SESSIONS_FILE, encode_stored_days(sessions, compress=False).decode("utf-8"))
+
+def _local_load_players():
+    return _local_read_json(PLAYERS_FILE, [])
+
+def _local_save_players(players):
+    with _local_store_lock():
+        _local_write_json(PLAYERS_FILE, players)
+
+SESSIONS_JOURNAL_FILE = "sessions.journal.jsonl"
+SESSIONS_JOURNAL_ARCHIVE_FILE = "sessions.journal.archive.jsonl"
+
+def _local_list_session_dates():
+    return list(_local_read_sessions_file())
+
+def _local_load_sessions(dates=None):
+    sessions = _pick_dates(_local_read_sessions_file(), dates)
+    events = _parse_score_events(_local_read_text(SESSIONS_JOURNAL_FILE))
+    if events:
+        dates = {ev.get("date") for ev in events}
+        replay_score_events(
+            sessions, events, {d: _doc_hash(sessions[d]) for d in dates if d in sessions}
+        )
+    return sessions
+
+def _local_save_sessions(sessions, date_hashes=None):
+    with _local_store_lock():
+        _local_write_sessions_file(sessions)
+
+def _local_save_sessions_dates(changes: dict):
+    with _local_store_lock():
+        sessions = _local_read_sessions_file()
+        for d, day_data in changes.items():
+            if day_data is None:
+                sessions.pop(d, None)
+            else:
+                sessions[d] = day_data
+        _local_write_sessions_file(sessions)
+
+def _local_append_score_events(events):
+    with _local_store_lock():
+        sessions = _local_read_sessions_file()
+        dates = {ev["date"] for ev in events}
+        stamped = _stamp_score_events(
+            events, {d: _doc_hash(sessions[d]) for d in dates if d in sessions}
+        )
+        if not stamped:
+            return
+        path = _local_path(SESSIONS_JOURNAL_FILE)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(_score_event_lines(stamped))
+        if _local_read_text(SESSIONS_JOURNAL_FILE).count("\n") >= SCORE_JOURNAL_COMPACT_EVENTS:
+            _local_compact_score_journal()
+
+def _local_compact_score_journal():
+    with _local_store_lock():
+        text = _local_read_text(SESSIONS_JOURNAL_FILE)
+        if not text.strip():
+            return
+        _local_write_sessions_file(_local_load_sessions())
+        with open(_local_path(SESSIONS_JOURNAL_ARCHIVE_FILE), "a", encoding="utf-8") as f:
+            f.write(text)
+        _local_write_text(SESSIONS_JOURNAL_FILE, "")
+
+
+# ---------------------------------------------------------
+# ✅ sqlite 저장소: 파일 하나 (날짜 = 행 하나)
+#   - docs(name, body)            : players 문서
+#   - session_days(date, pos, body, hash) : 날짜별 세션 (pos = 원래 순서, body = compact 형식)
+#   - score_events : 점수 이벤트 저널 (compaction 후에도 compacted=1 로 남겨 둠)
+#   - 처음 만들 때 app.py 폴더의 players.json / sessions.json 이 있으면 그걸로 채움
+# ---------------------------------------------------------
+import sqlite3
+
+def _sqlite_path() -> str:
+    return STORAGE_PATH or os.path.join(APP_DIR, SQLITE_FILE)
+
+def _sqlite_connect():
+    conn = sqlite3.connect(_sqlite_path(), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+@st.cache_resource
+def _sqlite_store():
+    # 프로세스당 1번: 테이블 준비 + (비어 있으면) JSON으로 채우기
+    conn = _sqlite_connect()
+    try:
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS docs (name TEXT PRIMARY KEY, body TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_days ("
+                " date TEXT PRIMARY KEY, pos INTEGER NOT NULL, body TEXT NOT NULL, hash TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS score_events ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, idx INTEGER NOT NULL,"
+                " t1, t2, sides TEXT, ts REAL, client TEXT, base TEXT,"
+                " compacted INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_score_events_live ON score_events(compacted, id)")
+            empty = (
+                conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0] == 0
+                and conn.execute("SELECT COUNT(*) FROM session_days").fetchone()[0] == 0
+            )
+            if empty:
+                players = _read_json_file(os.path.join(APP_DIR, PLAYERS_FILE), None)
+                if players is not None:
+                    conn.execute("INSERT INTO docs VALUES ('players', ?)", (_json_compact_text(players),))
+                seed = _read_json_file(os.path.join(APP_DIR, SESSIONS_FILE), {})
+                for pos, (d, day_data) in enumerate(seed.items()):
+                    conn.execute(
+                        "INSERT INTO session_days VALUES (?, ?, ?, ?)",
+                        (d, pos, encode_stored_days({d: day_data}), _doc_hash(day_data)),
+                    )
+    finally:
+        conn.close()
+    return {"lock": threading.RLock()}
+
+def _sqlite_load_players():
+    _sqlite_store()
+    conn = _sqlite_connect()
+    try:
+        row = conn.execute("SELECT body FROM docs WHERE name = 'players'").fetchone()
+    finally:
+        conn.close()
+    return json.loads(row[0]) if row else []
+
+def _sqlite_save_players(players):
+    store = _sqlite_store()
+    with store["lock"]:
+        conn = _sqlite_connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO docs VALUES ('players', ?)", (_json_compact_text(players),)
+                )
+        finally:
+            conn.close()
+
+def _sqlite_read_sessions(conn, dates=None):
+    """스냅샷 + 아직 안 접힌 점수 이벤트 적용본, 날짜별 (pos, hash)"""
+    if dates is None:
+        rows = conn.execute("SELECT date, pos, body, hash FROM session_days ORDER BY pos").fetchall()
+    else:
+        dates = list(dates)
+        rows = []
+        for i in range(0, len(dates), 500):  # SQLite 변수 개수 제한
+            chunk = dates[i:i + 500]
+            rows += conn.execute(
+                f"SELECT date, pos, body, hash FROM session_days WHERE date IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+        rows.sort(key=lambda r: r[1])
+    sessions = {d: _decode_stored_day(body, d) for d, _, body, _ in rows}
+    meta = {d: (pos, h) for d, pos, _, h in rows}
+    events = [
+        {"date": d, "idx": idx, "t1": t1, "t2": t2, "sides": json.loads(sides or "{}"), "base": base}
+        for d, idx, t1, t2, sides, base in conn.execute(
+            "SELECT date, idx, t1, t2, sides, base FROM score_events WHERE compacted = 0 ORDER BY id"
+        )
+    ]
+    if events:
+        replay_score_events(sessions, events, {d: h for d, (_, h) in meta.items()})
+    return sessions, meta
+
+def _sqlite_list_session_dates():
+    _sqlite_store()
+    conn = _sqlite_connect()
+    try:
+        return [d for (d,) in conn.execute("SELECT date FROM session_days ORDER BY pos")]
+    finally:
+        conn.close()
+
+def _sqlite_load_sessions(dates=None):
+    _sqlite_store()
+    conn = _sqlite_connect()
+    try:
+        sessions, _ = _sqlite_read_sessions(conn, dates)
+    finally:
+        conn.close()
+    return sessions
+
+def _sqlite_upsert_day(conn, d, day_data, old_hash, pos):
+    h = _doc_hash(day_data)
+    if h == old_hash:
+        return
+    conn.execute(
+        "INSERT OR REPLACE INTO session_days VALUES (?, ?, ?, ?)",
+        (d, pos, encode_stored_days({d: day_data}), h),
+    )
+
+def _sqlite_save_sessions(sessions, date_hashes=None):
+    store = _sqlite_store()
+    with store["lock"]:
+        conn = _sqlite_connect()
+        try:
+            with conn:
+                old = {d: (pos, h) for d, pos, h in conn.execute("SELECT date, pos, hash FROM session_days")}
+                for pos, (d, day_data) in enumerate(sessions.items()):
+                    old_pos, old_hash = old.get(d, (None, None))
+                    if date_hashes is not None and old_hash == date_hashes.get(d) and old_pos == pos:
+                        continue
+                    _sqlite_upsert_day(conn, d, day_data, old_hash if old_pos == pos else None, pos)
+                gone = [(d,) for d in old if d not in sessions]
+                conn.executemany("DELETE FROM session_days WHERE date = ?", gone)
+        finally:
+            conn.close()
+
+def _sqlite_save_sessions_dates(changes: dict):
+    store = _sqlite_store()
+    with store["lock"]:
+        conn = _sqlite_connect()
+        try:
+            with conn:
+                old = {d: (pos, h) for d, pos, h in conn.execute("SELECT date, pos, hash FROM session_days")}
+                next_pos = max((pos for pos, _ in old.values()), default=-1) + 1
+                for d, day_data in changes.items():
+                    if day_data is None:
+                        conn.execute("DELETE FROM session_days WHERE date = ?", (d,))
+                        continue
+                    if d in old:
+                        pos, old_hash = old[d]
+                    else:
+                        pos, old_hash = next_pos, None
+                        next_pos += 1
+                    _sqlite_upsert_day(conn, d, day_data, old_hash, pos)
+        finally:
+            conn.close()
+
+def _sqlite_append_score_events(events):
+    store = _sqlite_store()
+    with store["lock"]:
+        conn = _sqlite_connect()
+        try:
+            with conn:
+                hashes = dict(conn.execute("SELECT date, hash FROM session_days"))
+                stamped = _stamp_score_events(events, hashes)
+                conn.executemany(
+                    "INSERT INTO score_events (date, idx, t1, t2, sides, ts, client, base)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (ev["date"], ev["idx"], ev.get("t1"), ev.get("t2"),
+                         json.dumps(ev.get("sides", {}), ensure_ascii=False),
+                         ev.get("ts"), ev.get("client"), ev["base"])
+                        for ev in stamped
+                    ],
+                )
+                live = conn.execute("SELECT COUNT(*) FROM score_events WHERE compacted = 0").fetchone()[0]
+        finally:
+            conn.close()
+    if live >= SCORE_JOURNAL_COMPACT_EVENTS:
+        _sqlite_compact_score_journal()
+
+def _sqlite_compact_score_journal():
+    store = _sqlite_store()
+    with store["lock"]:
+        conn = _sqlite_connect()
+        try:
+            with conn:  # 접기 + 표시를 한 트랜잭션으로
+                sessions, meta = _sqlite_read_sessions(conn)
+                for d, day_data in sessions.items():
+                    pos, old_hash = meta[d]
+                    _sqlite_upsert_day(conn, d, day_data, old_hash, pos)
+                conn.execute("UPDATE score_events SET compacted = 1 WHERE compacted = 0")
+        finally:
+            conn.close()
+
+
+# ---------------------------------------------------------
+# ✅ 저장소 인터페이스: 앱 코드는 아래 5개만 부름
+#   load_players / save_players / list_session_dates / load_sessions / save_sessions / save_sessions_dates
+#   append_score_events / compact_score_journal
+#   save_sessions_dates(changes): {날짜: 그날 데이터, 지운 날짜: None} 만 반영
+#   load_sessions 는 항상 저널까지 적용된 결과를 돌려줌
+# ---------------------------------------------------------
+STORAGE_BACKENDS = {
+    "drive": {
+        "load_players": _drive_load_players,
+        "save_players": _drive_save_players,
+        "list_session_dates": _drive_list_session_dates,
+        "load_sessions": _drive_load_sessions,
+        "save_sessions": _drive_save_sessions,
+        "save_sessions_dates": _drive_save_sessions_dates,
+        "append_score_events": _drive_append_score_events,
+        "compact_score_journal": _drive_compact_score_journal,
+    },
+    "local": {
+        "load_players": _local_load_players,
+        "save_players": _local_save_players,
+        "list_session_dates": _local_list_session_dates,
+        "load_sessions": _local_load_sessions,
+        "save_sessions": _local_save_sessions,
+        "save_sessions_dates": _local_save_sessions_dates,
+        "append_score_events": _local_append_score_events,
+        "compact_score_journal": _local_compact_score_journal,
+    },
+    "sqlite": {
+        "load_players": _sqlite_load_players,
+        "save_players": _sqlite_save_players,
+        "list_session_dates": _sqlite_list_session_dates,
+        "load_sessions": _sqlite_load_sessions,
+        "save_sessions": _sqlite_save_sessions,
+        "save_sessions_dates": _sqlite_save_sessions_dates,
+        "append_score_events": _sqlite_append_score_events,
+        "compact_score_journal": _sqlite_compact_score_journal,
+    },
+}
+
+def _storage():
+    return STORAGE_BACKENDS[STORAGE_BACKEND]
+
+def load_players():
+    return _storage()["load_players"]()
+
+def save_players(players):
+    _storage()["save_players"](players)
+
+def list_session_dates():
+    """저장된 날짜 목록 (내용은 안 읽음)"""
+    return _storage()["list_session_dates"]()
+
+def load_sessions(dates=None):
+    """dates 를 주면 그 날짜만 (시즌 단위 지연 로딩용)"""
+    return _storage()["load_sessions"](dates)
+
+def save_sessions(sessions, date_hashes=None):
+    _storage()["save_sessions"](sessions, date_hashes=date_hashes)
+
+def save_sessions_dates(changes: dict):
+    _storage()["save_sessions_dates"](changes)
+
+def append_score_events(events: list):
+    _storage()["append_score_events"](events)
+
+def compact_score_journal():
+    _storage()["compact_score_journal"]()
 
 # =========================================================
 # ✅ [PERSIST PATCH] save_* 난사 방지: "run당 1회만" 저장
@@ -92,18 +1176,219 @@ def save_sessions(sessions):
 #   - 이 아래 래퍼가 전부 가로채서 dirty만 찍고,
 #     파일 맨 아래 flush에서 딱 1번만 실제 저장함
 # =========================================================
-import time
 import streamlit as st
 
 # 1) 기존 구현을 백업(실제 저장하는 원래 함수)
 _save_players_impl = save_players
 _save_sessions_impl = save_sessions
+_save_sessions_dates_impl = save_sessions_dates
+_append_score_events_impl = append_score_events
+
+
+# ---------------------------------------------------------
+# ✅ 백그라운드 write-behind 업로더 (프로세스 공용 1개)
+#   - flush는 스냅샷만 넘기고 바로 리턴 → 화면이 Drive 업로드를 기다리지 않음
+#   - 짧은 시간에 들어온 여러 수정은 모아서 1번에 업로드
+#       players: 마지막 스냅샷만 / sessions: 날짜별 마지막 값만
+#       점수 이벤트: 순서대로 모아서 1번에 append (그 날짜 스냅샷이 새로 들어오면 그 앞 이벤트는 버림)
+#   - 실패하면 지수 backoff로 재시도 (그 사이 들어온 새 값이 우선)
+#   - 프로세스 종료 때 남은 것 마저 업로드
+# ---------------------------------------------------------
+PERSIST_DEBOUNCE_SEC = 1.5    # 마지막 수정 후 이만큼 조용하면 업로드
+PERSIST_MAX_DELAY_SEC = 6.0   # 수정이 계속 들어와도 이 이상은 미루지 않음
+PERSIST_RETRY_MAX_SEC = 60.0
+PERSIST_EXIT_TIMEOUT_SEC = 20.0
+
+def _persist_writer_has_pending(w) -> bool:
+    return w["players"] is not None or bool(w["session_dates"]) or bool(w["score_events"])
+
+def _persist_writer_loop(w):
+    cond = w["cond"]
+    while True:
+        with cond:
+            while True:
+                if _persist_writer_has_pending(w):
+                    wait = w["due"] - time.time()
+                    if wait <= 0:
+                        break
+                    cond.wait(wait)
+                else:
+                    cond.wait()
+            players, session_dates, score_events = w["players"], w["session_dates"], w["score_events"]
+            w["players"], w["session_dates"], w["score_events"] = None, {}, []
+            w["first_ts"] = 0.0
+            w["busy"] = True
+
+        try:
+            if players is not None:
+                _save_players_impl(players)
+                players = None
+            if session_dates:
+                _save_sessions_dates_impl(session_dates)
+                session_dates = {}
+            if score_events:
+                _append_score_events_impl(score_events)
+                score_events = []
+        except Exception as e:
+            with cond:
+                # 못 올린 것은 되돌려 넣되, 그 사이 들어온 더 새 값은 덮지 않음
+                newer_dates = set(w["session_dates"])
+                if players is not None and w["players"] is None:
+                    w["players"] = players
+                for d, day_data in session_dates.items():
+                    w["session_dates"].setdefault(d, day_data)
+                w["score_events"] = [
+                    ev for ev in score_events if ev["date"] not in newer_dates
+                ] + w["score_events"]
+                w["attempt"] += 1
+                w["last_error"] = f"{type(e).__name__}: {e}"
+                w["due"] = time.time() + min(PERSIST_RETRY_MAX_SEC, 2.0 ** w["attempt"])
+                w["busy"] = False
+                cond.notify_all()
+            continue
+
+        with cond:
+            w["attempt"] = 0
+            w["last_error"] = None
+            w["last_ok_ts"] = time.time()
+            w["ok_count"] += 1
+            w["busy"] = False
+            cond.notify_all()
+
+def _persist_writer_drain(w, timeout=PERSIST_EXIT_TIMEOUT_SEC):
+    """대기 중인 업로드를 바로 처리시키고 끝날 때까지(최대 timeout) 기다림"""
+    cond = w["cond"]
+    end = time.time() + timeout
+    with cond:
+        w["due"] = 0.0
+        cond.notify_all()
+        while _persist_writer_has_pending(w) or w["busy"]:
+            left = end - time.time()
+            if left <= 0:
+                return False
+            cond.wait(left)
+    return True
+
+@st.cache_resource
+def _persist_writer():
+    w = {
+        "cond": threading.Condition(),
+        "players": None,        # 올릴 players 스냅샷
+        "session_dates": {},    # {날짜: 그날 스냅샷, 지운 날짜: None}
+        "score_events": [],     # 점수 이벤트 (순서 유지)
+        "first_ts": 0.0,        # 지금 대기분 중 가장 먼저 들어온 시각
+        "due": 0.0,             # 이 시각 이후 업로드
+        "busy": False,
+        "attempt": 0,           # 연속 실패 횟수
+        "last_ok_ts": 0.0,
+        "last_error": None,
+        "ok_count": 0,
+    }
+    th = threading.Thread(target=_persist_writer_loop, args=(w,), name="msa-persist-writer", daemon=True)
+    th.start()
+    atexit.register(_persist_writer_drain, w)
+    return w
+
+def persist_enqueue(players=None, session_dates=None, score_events=None):
+    """스냅샷/이벤트를 업로더에 넘김 (호출한 쪽은 기다리지 않음)"""
+    w = _persist_writer()
+    cond = w["cond"]
+    now = time.time()
+    with cond:
+        if players is not None:
+            w["players"] = players
+        if session_dates:
+            w["session_dates"].update(session_dates)
+            # 그 날짜 전체 스냅샷이 앞선 점수 이벤트를 대신함
+            w["score_events"] = [ev for ev in w["score_events"] if ev["date"] not in session_dates]
+        if score_events:
+            w["score_events"].extend(score_events)
+        if not w["first_ts"]:
+            w["first_ts"] = now
+        if w["attempt"] == 0:
+            # 재시도 대기 중이면 backoff 시각은 그대로 둠
+            w["due"] = min(now + PERSIST_DEBOUNCE_SEC, w["first_ts"] + PERSIST_MAX_DELAY_SEC)
+        cond.notify_all()
+
+def persist_status() -> dict:
+    """마지막 업로드 성공 시각 / 대기 여부 / 마지막 에러"""
+    w = _persist_writer()
+    with w["cond"]:
+        return {
+            "last_ok_ts": w["last_ok_ts"],
+            "pending": _persist_writer_has_pending(w) or w["busy"],
+            "attempt": w["attempt"],
+            "last_error": w["last_error"],
+        }
 
 def _persist_init():
     st.session_state.setdefault("_persist_dirty_players", False)
     st.session_state.setdefault("_persist_dirty_sessions", False)
     st.session_state.setdefault("_persist_last_save_ts", 0.0)
     st.session_state.setdefault("_persist_save_count", 0)
+    st.session_state.setdefault("_persist_skip_count", 0)   # 바뀐 게 없어서 업로드를 건너뛴 횟수
+    # 마지막으로 읽었거나 저장한 내용의 hash (players: 문서 hash / sessions: 날짜별 hash)
+    st.session_state.setdefault("_persist_hash_players", None)
+    st.session_state.setdefault("_persist_hash_sessions", None)
+    st.session_state.setdefault("_persist_last_changed_dates", [])
+    # 점수 이벤트 판단용 기준: 날짜별 (results 뺀 나머지 hash) / results 사본
+    st.session_state.setdefault("_persist_meta_hashes", {})
+    st.session_state.setdefault("_persist_base_results", {})
+    st.session_state.setdefault("_persist_event_count", 0)
+    st.session_state.setdefault("_persist_client_id", uuid.uuid4().hex[:12])
+
+def _day_meta_hash(day_data) -> str:
+    return _doc_hash({k: v for k, v in day_data.items() if k != "results"})
+
+def _persist_remember_dates(sessions, dates):
+    meta_hashes = st.session_state["_persist_meta_hashes"]
+    base_results = st.session_state["_persist_base_results"]
+    for d in dates:
+        if d in sessions:
+            meta_hashes[d] = _day_meta_hash(sessions[d])
+            base_results[d] = copy.deepcopy(sessions[d].get("results", {}))
+        else:
+            meta_hashes.pop(d, None)
+            base_results.pop(d, None)
+
+def persist_remember_loaded(players=None, sessions=None):
+    """load 직후 호출: 지금 내용을 '이미 저장된 상태'로 기억해 둔다."""
+    _persist_init()
+    if players is not None:
+        st.session_state["_persist_hash_players"] = _doc_hash(players)
+    if sessions is not None:
+        sessions_rev_bump()
+        st.session_state["_persist_hash_sessions"] = sessions_date_hashes_current(sessions)[0]
+        _persist_remember_dates(sessions, list(sessions))
+
+def _persist_score_events(d, day_data):
+    """그 날짜가 '점수만' 바뀌었으면 점수 이벤트 목록, 아니면 None (→ 그날 전체 저장)"""
+    if day_data is None or st.session_state["_persist_meta_hashes"].get(d) != _day_meta_hash(day_data):
+        return None
+    old = st.session_state["_persist_base_results"].get(d, {})
+    new = day_data.get("results", {})
+    now = time.time()
+    client = st.session_state["_persist_client_id"]
+    events = []
+    for k in set(old) | set(new):
+        if old.get(k) == new.get(k):
+            continue
+        res = new.get(k)
+        # 지운 결과 / 숫자가 아닌 키 / 모르는 필드 → 이벤트로 표현 못 함
+        if res is None or not str(k).isdigit() or not set(res) <= SCORE_RESULT_KEYS:
+            return None
+        events.append({
+            "date": d,
+            "idx": int(k),
+            "t1": res.get("t1"),
+            "t2": res.get("t2"),
+            "sides": copy.deepcopy(res.get("sides", {})),
+            "ts": now,
+            "client": client,
+        })
+    if not events:
+        return None
+    return sorted(events, key=lambda ev: ev["idx"])
 
 def _mark_players_dirty(players):
     _persist_init()
@@ -114,9 +1399,11 @@ def _mark_sessions_dirty(sessions):
     _persist_init()
     st.session_state["sessions"] = sessions  # 최신값 보관
     st.session_state["_persist_dirty_sessions"] = True
+    sessions_rev_bump()
 
 # 2) 기존 이름으로 "재정의" (여기서부터는 어디서 호출해도 업로드 안함)
 def save_players(players):
+    roster_index_invalidate()
     _mark_players_dirty(players)
 
 def save_sessions(sessions):
@@ -130,19 +1417,125 @@ def persist_flush_once():
     if not (dirty_p or dirty_s):
         return
 
-    # ✅ 원래 구현으로 "딱 1번" 저장
+    saved = False
+
+    # ✅ 바뀐 것만 스냅샷으로 떠서 업로더에 넘김 (hash가 그대로면 생략)
+    #    스냅샷은 deepcopy: 업로드 전에 다음 run이 원본을 고쳐도 섞이지 않게
     if dirty_p and "players" in st.session_state:
-        _save_players_impl(st.session_state["players"])
+        players = st.session_state["players"]
+        h = _doc_hash(players)
+        if h != st.session_state.get("_persist_hash_players"):
+            persist_enqueue(players=copy.deepcopy(players))
+            st.session_state["_persist_hash_players"] = h
+            saved = True
         st.session_state["_persist_dirty_players"] = False
 
     if dirty_s and "sessions" in st.session_state:
-        _save_sessions_impl(st.session_state["sessions"])
+        sessions = st.session_state["sessions"]
+        date_hashes = sessions_date_hashes_current(sessions)[0]
+        prev = st.session_state.get("_persist_hash_sessions")
+        if date_hashes != prev:
+            prev = prev or {}
+            changed = sorted(
+                d for d in set(date_hashes) | set(prev) if date_hashes.get(d) != prev.get(d)
+            )
+            # 점수만 바뀐 날짜는 작은 이벤트로, 나머지는 그날 전체 스냅샷으로
+            snapshots, events = {}, []
+            for d in changed:
+                evs = _persist_score_events(d, sessions.get(d))
+                if evs:
+                    events += evs
+                else:
+                    snapshots[d] = copy.deepcopy(sessions[d]) if d in sessions else None
+            persist_enqueue(session_dates=snapshots, score_events=events)
+            _persist_remember_dates(sessions, changed)
+            st.session_state["_persist_event_count"] += len(events)
+            st.session_state["_persist_last_changed_dates"] = changed
+            st.session_state["_persist_hash_sessions"] = date_hashes
+            saved = True
         st.session_state["_persist_dirty_sessions"] = False
 
+    if not saved:
+        st.session_state["_persist_skip_count"] += 1
+        return
+
     st.session_state["_persist_last_save_ts"] = time.time()
     st.session_state["_persist_save_count"] += 1
 
 
+# ---------------------------------------------------------
+# ✅ 시즌(연도) 단위 지연 로딩
+#   - 시작할 때는 이번 시즌(가장 최근 기록의 연도 + 올해)만 읽음
+#   - 나머지 날짜는 목록만 들고 있다가 화면이 필요로 할 때 읽어서 합침
+#     (tab4 "전체 시즌", tab4/tab5 예전 달 선택, tab3 예전 날짜 선택)
+#   - 저장은 날짜 단위라서 안 읽은 날짜는 저장소에 그대로 남음
+# ---------------------------------------------------------
+def session_season(d):
+    """날짜 키의 시즌(연도). 날짜가 아닌 키("전체" 등)는 None"""
+    return d[:4] if isinstance(d, str) and d[:4].isdigit() else None
+
+def load_sessions_lazy():
+    """시작용: (이번 시즌만 읽은 sessions, 저장소의 전체 날짜 순서)"""
+    all_dates = list_session_dates()
+    seasons = {session_season(d) for d in all_dates} - {None}
+    eager = {str(date.today().year)}
+    if seasons:
+        eager.add(max(seasons))
+    first = [d for d in all_dates if session_season(d) is None or session_season(d) in eager]
+    return load_sessions(dates=first), all_dates
+
+def sessions_unloaded_dates() -> list:
+    return st.session_state.get("sessions_unloaded", [])
+
+def sessions_unloaded_before(day) -> list:
+    """아직 안 읽은 날짜 중 day 보다 앞선 것 (이어지는 값(레이팅/연승)이 덜 계산됐는지 표시용)"""
+    return [d for d in sessions_unloaded_dates() if session_season(d) is not None and d < day]
+
+def session_date_keys(sessions) -> list:
+    """읽은 날짜 + 아직 안 읽은 날짜 (날짜/월 선택 목록용)"""
+    return list(sessions.keys()) + [d for d in sessions_unloaded_dates() if d not in sessions]
+
+def persist_remember_loaded_dates(sessions, dates):
+    """나중에 읽어 합친 날짜를 '이미 저장된 상태'로 기억해 둔다."""
+    _persist_init()
+    hashes = dict(st.session_state.get("_persist_hash_sessions") or {})
+    for d in dates:
+        hashes[d] = _doc_hash(sessions[d])
+    st.session_state["_persist_hash_sessions"] = hashes
+    _persist_remember_dates(sessions, dates)
+
+def ensure_sessions_loaded(sessions, dates=None, seasons=None, everything=False):
+    """아직 안 읽은 날짜 중 필요한 것만 읽어서 sessions 에 (제자리에서) 합침"""
+    unloaded = sessions_unloaded_dates()
+    if not unloaded:
+        return sessions
+    dates = set(dates or [])
+    seasons = set(seasons or [])
+    want = [d for d in unloaded if everything or d in dates or session_season(d) in seasons]
+    if not want:
+        return sessions
+
+    loaded = load_sessions(dates=want)
+
+    # 저장소 순서대로 다시 줄 세움 (새로 만든 날짜는 뒤에)
+    merged = {}
+    for d in st.session_state.get("sessions_order", []):
+        if d in sessions:
+            merged[d] = sessions[d]
+        elif d in loaded:
+            merged[d] = loaded[d]
+    for d, day_data in sessions.items():
+        merged.setdefault(d, day_data)
+    sessions.clear()
+    sessions.update(merged)
+
+    want = set(want)
+    st.session_state["sessions_unloaded"] = [d for d in unloaded if d not in want]
+    sessions_rev_bump(sessions, dates=list(loaded))
+    persist_remember_loaded_dates(sessions, list(loaded))
+    return sessions
+
+
 
 # ---------------------------------------------------------
 # Streamlit 초기화 (✅ 딱 1번만 / 제일 위에서)
@@ -363,9 +1756,6 @@ st.markdown("""
 # ---------------------------------------------------------
 # 기본 상수
 # ---------------------------------------------------------
-PLAYERS_FILE = "players.json"
-SESSIONS_FILE = "sessions.json"
-
 AGE_OPTIONS = ["비밀", "20대", "30대", "40대", "50대", "60대", "70대"]
 RACKET_OPTIONS = ["모름", "기타", "윌슨", "요넥스", "헤드", "바볼랏", "던롭", "뵐클", "테크니파이버", "프린스"]
 GENDER_OPTIONS = ["남", "여"]
@@ -555,6 +1945,7 @@ def char_to_index(ch: str) -> int:
     - "B" -> 10
     - ...
     - "G" -> 15
+    - ... "W" -> 31 (패턴 라이브러리는 32명까지 이 규칙 그대로)
     """
     if ch.isdigit():
         return int(ch) - 1
@@ -586,13 +1977,14 @@ def parse_pattern(pattern: str, players: list[str]):
 def build_hanul_aa_schedule(players, court_count):
     """
     한울 AA 고정 패턴으로 복식 대진표 생성
-    - 5~16명에서만 동작
+    - 5~16명은 한울 AA 고정 패턴
+    - 그 밖의 인원(4~32명)은 패턴 라이브러리의 4게임 패턴 (선수 순서 그대로)
     - 각 인원은 정확히 4게임씩 배정됨
     - 코트 번호는 1 ~ court_count 순서로 라운드 로빈 분배
     """
     n = len(players)
     if n not in HANUL_AA_PATTERNS:
-        return []
+        return build_pattern_schedule(players, 4, court_count, shuffle=False)
 
     patterns = HANUL_AA_PATTERNS[n]
     schedule = []
@@ -608,6 +2000,58 @@ def build_hanul_aa_schedule(players, court_count):
     return schedule
 
 
+# ---------------------------------------------------------
+# ✅ 대진 패턴 라이브러리 (make_schedule_patterns.py 로 미리 생성)
+#   - (인원, 개인당 경기 수, 코트 수) → "12:34" 패턴 목록
+#     (한울 AA 와 같은 글자 규칙, 4~32명 / 1~10게임 / 1~6코트)
+#   - 파트너 중복 없음(인원상 가능할 때) + 상대 고르게 + 연속 출전/긴 휴식 최소로 미리 찾아 둔 것
+#   - 파일은 처음 필요할 때 한 번만 읽음 (없으면 기존 생성기로)
+#   - 대진 생성 = 표 찾기 + 선수 순서 섞기 → 바로 끝남
+# ---------------------------------------------------------
+SCHEDULE_PATTERN_FILE = os.path.join(APP_DIR, "schedule_patterns.json.gz")
+
+
+@st.cache_resource
+def load_schedule_patterns():
+    """{"n-g-c": {"games": "12:34,56:78,...", "partner_repeat": .., ...}}"""
+    try:
+        with gzip.open(SCHEDULE_PATTERN_FILE, "rt", encoding="utf-8") as f:
+            return json.load(f).get("patterns", {})
+    except Exception:
+        return {}
+
+
+def schedule_pattern_lookup(n, games, courts):
+    """패턴 찾기 → (패턴 목록, 실제 코트 수, 품질 지표) 또는 None
+    - 한 라운드에 n//4 코트까지만 쓸 수 있어서 코트 수는 그 안으로 줄여서 찾음
+    """
+    courts = min(int(courts), int(n) // 4)
+    if courts < 1:
+        return None
+    entry = load_schedule_patterns().get(f"{int(n)}-{int(games)}-{courts}")
+    if not entry:
+        return None
+    return entry["games"].split(","), courts, entry
+
+
+def build_pattern_schedule(players, games, court_count, shuffle=True):
+    """패턴 라이브러리로 복식 대진 생성 (패턴이 없으면 [])"""
+    found = schedule_pattern_lookup(len(players), games, court_count)
+    if not found:
+        return []
+    patterns, courts, _ = found
+
+    order = list(players)
+    if shuffle:
+        random.shuffle(order)
+
+    schedule = []
+    for i, p in enumerate(patterns):
+        t1, t2 = parse_pattern(p, order)
+        schedule.append(("복식", t1, t2, (i % courts) + 1))
+    return schedule
+
+
 def detect_score_warnings(day_data):
     """
     한 날짜(day_data)에 대해 점수 입력 실수 의심 목록을 만들어 준다.
@@ -646,82 +2090,29 @@ def build_daily_report(sel_date, day_data):
     - 상대를 0점으로 이긴 셧아웃 최다 선수
     """
     schedule = day_data.get("schedule", [])
-    results = day_data.get("results", {})
 
     if not schedule:
         return []
 
-    recs = defaultdict(
-        lambda: {
-            "G": 0,
-            "W": 0,
-            "D": 0,
-            "L": 0,
-            "points": 0,
-            "score_for": 0,
-            "score_against": 0,
-        }
-    )
-    attendees = set()
-    total_games = 0
-    baker_counter = Counter()
-
-    for idx, (gtype, t1, t2, court) in enumerate(schedule, start=1):
-        res = results.get(str(idx)) or results.get(idx) or {}
-        s1 = res.get("t1")
-        s2 = res.get("t2")
-
-        r = calc_result(s1, s2)
-        if r is None:
-            # 점수가 아직 없는 경기는 리포트 통계에서 제외
-            continue
-
-        total_games += 1
-        players_all = t1 + t2
-        attendees.update(players_all)
-
-        for p in players_all:
-            recs[p]["G"] += 1
-
-        s1_val = s1 or 0
-        s2_val = s2 or 0
-        for p in t1:
-            recs[p]["score_for"] += s1_val
-            recs[p]["score_against"] += s2_val
-        for p in t2:
-            recs[p]["score_for"] += s2_val
-            recs[p]["score_against"] += s1_val
-
-        # 승/무/패 + 승점
-        if r == "W":
-            winners = t1
-            losers = t2
-        elif r == "L":
-            winners = t2
-            losers = t1
-        else:
-            winners = []
-            losers = []
-
-        for p in winners:
-            recs[p]["W"] += 1
-            recs[p]["points"] += WIN_POINT
-        for p in losers:
-            recs[p]["L"] += 1
-            recs[p]["points"] += LOSE_POINT
-        if r == "D":
-            for p in players_all:
-                recs[p]["D"] += 1
-                recs[p]["points"] += DRAW_POINT
-
-        # 셧아웃(상대 0점 승리) 집계
-        if s1 is not None and s2 is not None:
-            if s1 > 0 and s2 == 0:
-                for p in t1:
-                    baker_counter[p] += 1
-            elif s2 > 0 and s1 == 0:
-                for p in t2:
-                    baker_counter[p] += 1
+    # 점수가 아직 없는 경기는 리포트 통계에서 제외 (합계는 컬럼형 테이블로 한 번에)
+    # (iter_games 가 "전체" 키를 건너뛰므로 날짜 대신 고정 키로 넣음)
+    table = build_game_table({"report": day_data})
+    totals = game_table_player_totals(table)
+    total_games = int((table["result"] != GT_NO_RESULT).sum())
+
+    # 이름 순서는 '점수 있는 경기에서 처음 나온 순서' (동률 표시 순서 유지)
+    names = table["names"]
+    order = [i for i in np.argsort(totals["first_scored"], kind="stable") if totals["G"][i] > 0]
+    recs = {
+        names[i]: {k: int(totals[k][i]) for k in ("G", "W", "D", "L", "points", "score_for", "score_against")}
+        for i in order
+    }
+    attendees = set(recs)
+    baker_counter = Counter({
+        names[i]: int(totals["shutouts"][i])
+        for i in np.argsort(totals["first_shutout"], kind="stable")
+        if totals["shutouts"][i] > 0
+    })
 
     if not attendees or total_games == 0:
         return []
@@ -1162,6 +2553,25 @@ from collections import defaultdict
 import random
 import math
 
+_DOUBLES_CANDIDATE_INDEX = {}
+
+def doubles_candidate_index(n):
+    """후보풀 n명에서 나올 수 있는 (4명, 팀 나누기) 전체의 인덱스 배열 (n별로 캐시)
+    - 순서: combinations(range(n), 4) 순서 × [ab|cd, ac|bd, ad|bc]
+    - 반환: (t1a, t1b, t2a, t2b, quad)  quad 는 (조합수, 4)
+    """
+    cached = _DOUBLES_CANDIDATE_INDEX.get(n)
+    if cached is None:
+        quad = np.array(list(combinations(range(n), 4)), dtype=np.intp).reshape(-1, 4)
+        a, b, c, d = quad.T
+        t1a = np.stack([a, a, a], axis=1).ravel()
+        t1b = np.stack([b, c, d], axis=1).ravel()
+        t2a = np.stack([c, b, b], axis=1).ravel()
+        t2b = np.stack([d, d, c], axis=1).ravel()
+        cached = (t1a, t1b, t2a, t2b, quad)
+        _DOUBLES_CANDIDATE_INDEX[n] = cached
+    return cached
+
 def build_doubles_schedule(players, max_games, court_count, mode,
                            use_ntrp, group_only, roster_by_name,
                            relaxed_mixed=False):
@@ -1208,14 +2618,6 @@ def build_doubles_schedule(players, max_games, court_count, mode,
     def pair_key(a, b):
         return tuple(sorted((a, b)))
 
-    def team_avg_ntrp(team):
-        vals = []
-        for p in team:
-            v = ntrp_of(p)
-            if v is not None:
-                vals.append(v)
-        return sum(vals) / len(vals) if vals else 0.0
-
     # 누적 상태
     games_played = {p: 0 for p in players}
     partner_counts  = defaultdict(int)
@@ -1245,19 +2647,6 @@ def build_doubles_schedule(players, max_games, court_count, mode,
     W_GAP_2     = 45.0   # 한 라운드 쉬고 또 출전(휴식 1) 중벌
     W_PACE      = 18.0   # 초반 과다/후반 몰빵(페이스) 제어
 
-    def can_use_four(four):
-        # 조별 제한
-        if group_only:
-            if len({groups[x] for x in four}) > 1:
-                return False
-
-        # 동성복식: 4명 모두 같은 성별
-        if mode == "동성복식":
-            if len({genders[x] for x in four}) > 1:
-                return False
-
-        return True
-
     # ✅ 총 라운드 "예상치" (페이스 계산용)
     total_slots_needed = len(players) * max_games  # 4인슬롯 기준
     matches_needed = math.ceil(total_slots_needed / 4)
@@ -1288,46 +2677,86 @@ def build_doubles_schedule(players, max_games, court_count, mode,
             return (diff - 0.6) * W_PACE
         return 0.0
 
-    def score_pairing(t1, t2, round_no):
-        a, b = t1
-        c, d = t2
-        s = 0.0
-
-        # 파트너 중복 (제곱 벌점)
-        p1 = pair_key(a, b)
-        p2 = pair_key(c, d)
-        s += (partner_counts[p1] ** 2) * W_PARTNER
-        s += (partner_counts[p2] ** 2) * W_PARTNER
-
-        # 최근 파트너 강벌
-        if last_partner.get(a) == b or last_partner.get(b) == a:
-            s += W_RECENT_P
-        if last_partner.get(c) == d or last_partner.get(d) == c:
-            s += W_RECENT_P
-
-        # 상대 중복(크로스 4개)
-        cross = [(a, c), (a, d), (b, c), (b, d)]
-        for x, y in cross:
-            s += (opponent_counts[pair_key(x, y)] ** 2) * W_OPP
-            if y in last_opps.get(x, set()):
-                s += W_RECENT_O
-
-        # ✅ 간격 균등(연속 출전/짧은 휴식 벌점 + 페이스 벌점)
-        for p in (a, b, c, d):
-            s += gap_penalty(p, round_no)
-            s += pace_penalty(p, round_no, will_play=True)
-
-        # 게임수 편차(이 4명이 1게임 더 했다고 가정했을 때 spread)
-        proj = dict(games_played)
-        for p in (a, b, c, d):
-            proj[p] += 1
-        s += (max(proj.values()) - min(proj.values())) * W_FAIR
-
-        # NTRP 밸런스(옵션)
+    # ✅ 후보(4명 × 팀 나누기 3가지) 전체를 한 번에 채점 (NumPy)
+    #   - 쌍 단위 벌점은 후보풀 크기의 행렬로, 선수 단위 벌점은 벡터로 미리 만들어 두고
+    #     후보마다 인덱싱해서 더하기만 함 → 후보 하나당 O(1)
+    #   - 게임수 편차는 전체 최댓값/최솟값(+개수) 집계로 바로 계산
+    #   - 더하는 순서/동점 처리(먼저 나온 후보 우선)는 예전 후보별 루프와 같음
+    def best_pairing(cands, round_no):
+        n = len(cands)
+        t1a, t1b, t2a, t2b, quad = doubles_candidate_index(n)
+        if len(quad) == 0:
+            return None
+
+        # 조별 제한 / 동성복식: 4명 모두 같은 조·같은 성별
+        ok = np.ones(len(quad), dtype=bool)
+        if group_only:
+            gid = np.array([groups[p] for p in cands])[quad]
+            ok &= (gid == gid[:, :1]).all(axis=1)
+        if mode == "동성복식":
+            sid = np.array([genders[p] for p in cands])[quad]
+            ok &= (sid == sid[:, :1]).all(axis=1)
+        if not ok.any():
+            return None
+
+        pos = {p: i for i, p in enumerate(cands)}
+        part = np.zeros((n, n))
+        opp = np.zeros((n, n))
+        recent_p = np.zeros((n, n))
+        recent_o = np.zeros((n, n))
+        for i, x in enumerate(cands):
+            for j in range(i + 1, n):
+                y = cands[j]
+                key = pair_key(x, y)
+                part[i, j] = part[j, i] = (partner_counts[key] ** 2) * W_PARTNER
+                opp[i, j] = opp[j, i] = (opponent_counts[key] ** 2) * W_OPP
+            lp = pos.get(last_partner.get(x))
+            if lp is not None:
+                recent_p[i, lp] = recent_p[lp, i] = W_RECENT_P
+            for y in last_opps.get(x, ()):
+                if y in pos:
+                    recent_o[i, pos[y]] = W_RECENT_O
+        gap = np.array([gap_penalty(p, round_no) for p in cands])
+        pace = np.array([pace_penalty(p, round_no, will_play=True) for p in cands])
+
+        s = part[t1a, t1b] + part[t2a, t2b]
+        s = s + recent_p[t1a, t1b]
+        s = s + recent_p[t2a, t2b]
+        for x, y in ((t1a, t2a), (t1a, t2b), (t1b, t2a), (t1b, t2b)):
+            s = s + opp[x, y]
+            s = s + recent_o[x, y]
+        for x in (t1a, t1b, t2a, t2b):
+            s = s + gap[x]
+            s = s + pace[x]
+
+        # 게임수 편차: 4명이 1게임씩 더 했다고 가정했을 때 전체 max - min
+        all_g = np.fromiter(games_played.values(), dtype=np.int64, count=len(games_played))
+        g = np.array([games_played[p] for p in cands])[quad]
+        g_max, g_min = all_g.max(), all_g.min()
+        # 최소인 사람이 4명 밖에도 남아 있으면 min 그대로, 아니면 4명의 min+1 이 곧 전체 min
+        at_min = (g == g_min).sum(axis=1)
+        rest_min = np.where(at_min < (all_g == g_min).sum(), g_min, np.inf)
+        proj_max = np.maximum(g_max, g.max(axis=1) + 1)
+        proj_min = np.minimum(rest_min, g.min(axis=1) + 1)
+        s = s + np.repeat((proj_max - proj_min) * W_FAIR, 3)
+
         if use_ntrp:
-            s += abs(team_avg_ntrp(t1) - team_avg_ntrp(t2)) * W_NTRP
+            vals = [ntrp_of(p) for p in cands]
+            has = np.array([v is not None for v in vals])
+            val = np.array([v if v is not None else 0.0 for v in vals])
 
-        return s
+            def team_avg(x, y):
+                cnt = has[x].astype(int) + has[y]
+                tot = np.where(has[x], val[x], 0.0) + np.where(has[y], val[y], 0.0)
+                return np.where(cnt > 0, tot / np.maximum(cnt, 1), 0.0)
+
+            s = s + np.abs(team_avg(t1a, t1b) - team_avg(t2a, t2b)) * W_NTRP
+
+        s = np.where(np.repeat(ok, 3), s, np.inf)
+        k = int(np.argmin(s))
+        if not np.isfinite(s[k]):
+            return None
+        return [cands[t1a[k]], cands[t1b[k]]], [cands[t2a[k]], cands[t2b[k]]]
 
     # -----------------------
     # ✅ 라운드 단위로 생성
@@ -1354,42 +2783,11 @@ def build_doubles_schedule(players, max_games, court_count, mode,
             POOL_N = min(len(avail), 18)
             pool = avail[:POOL_N]
 
-            best = None
-            best_score = float("inf")
-
-            for four in combinations(pool, 4):
-                if not can_use_four(four):
-                    continue
-
-                a, b, c, d = four
-                pairings = [
-                    ([a, b], [c, d]),
-                    ([a, c], [b, d]),
-                    ([a, d], [b, c]),
-                ]
-
-                for t1, t2 in pairings:
-                    sc = score_pairing(t1, t2, round_no)
-                    if sc < best_score:
-                        best_score = sc
-                        best = (t1, t2)
+            best = best_pairing(pool, round_no)
 
             # pool에서 못 찾으면 avail 전체로 확장(특히 동성)
             if best is None and len(avail) <= 22:
-                for four in combinations(avail, 4):
-                    if not can_use_four(four):
-                        continue
-                    a, b, c, d = four
-                    pairings = [
-                        ([a, b], [c, d]),
-                        ([a, c], [b, d]),
-                        ([a, d], [b, c]),
-                    ]
-                    for t1, t2 in pairings:
-                        sc = score_pairing(t1, t2, round_no)
-                        if sc < best_score:
-                            best_score = sc
-                            best = (t1, t2)
+                best = best_pairing(avail, round_no)
 
             if best is None:
                 continue
@@ -1496,6 +2894,191 @@ def build_singles_schedule(players, max_games, court_count, mode,
     return schedule
 
 
+# ---------------------------------------------------------
+# ✅ 총 게임 수(라운드 수) 기준 스케줄러 (복식/단식 공통)
+#   - total_rounds 라운드 × 라운드당 코트 수만큼 정확히 채움
+#     (인원/성별 때문에 한 라운드에 코트를 다 못 채우면 가능한 코트까지만)
+#   - 라운드마다
+#     1) 출전자 고르기: 경기수 적은 사람 → 직전 라운드 쉰 사람 → 랜덤
+#        (동성/혼합은 성별 인원이 경기 단위로 맞도록 나눔)
+#     2) 자리 배치: 무작위로 놓고 같은 종류 자리끼리 맞바꾸며 개선
+#        (파트너 중복 > 직전 파트너 > 상대 중복 > NTRP 밸런스)
+#   - 80라운드 × 6코트도 라운드당 수백 번 비교라 바로 끝남
+# ---------------------------------------------------------
+TOTAL_ROUNDS_SWAP_TRIES = 240
+
+def build_schedule_by_total_rounds(players, gtype, court_count, total_rounds, mode_name,
+                                   use_ntrp, roster_by_name):
+    players = list(dict.fromkeys(players))
+    doubles = gtype == "복식"
+    size = 4 if doubles else 2
+    court_count = int(court_count)
+    total_rounds = int(total_rounds)
+    if len(players) < size or court_count < 1 or total_rounds < 1:
+        return []
+
+    same_sex = mode_name in ("동성복식 (남+남 / 여+여)", "동성 단식")
+    mixed = mode_name in ("혼합복식 (남+여 짝)", "혼합 단식")
+
+    genders = {p: roster_by_name.get(p, {}).get("gender", "남") for p in players}
+    men = [p for p in players if genders[p] == "남"]
+    women = [p for p in players if genders[p] != "남"]
+
+    def ntrp_of(p):
+        v = roster_by_name.get(p, {}).get("ntrp", None)
+        try:
+            return None if v in (None, "", "모름") else float(v)
+        except Exception:
+            return None
+
+    ntrps = {p: ntrp_of(p) for p in players}
+
+    def team_avg_ntrp(team):
+        vals = [ntrps[p] for p in team if ntrps[p] is not None]
+        return sum(vals) / len(vals) if vals else 0.0
+
+    # 누적 상태
+    games_played = {p: 0 for p in players}
+    last_round_played = {p: -999 for p in players}
+    partner_counts = defaultdict(int)
+    opponent_counts = defaultdict(int)
+    last_partner = {}
+
+    W_PARTNER = 40.0     # 파트너 중복 (횟수 제곱)
+    W_RECENT_P = 60.0    # 직전 파트너
+    W_OPP = 8.0          # 상대 중복 (횟수 제곱)
+    W_NTRP = 6.0         # 팀 평균 NTRP 차이
+
+    def pair_key(a, b):
+        return (a, b) if a < b else (b, a)
+
+    def priority(p, round_no):
+        # 경기수 적은 사람 먼저, 같으면 직전 라운드에 안 뛴 사람 먼저
+        return (games_played[p], 1 if last_round_played[p] == round_no - 1 else 0, random.random())
+
+    def pick_round(round_no):
+        """(출전자 목록, 자리 종류 목록) — 자리 종류가 같은 자리끼리만 맞바꿀 수 있음"""
+        for courts in range(court_count, 0, -1):
+            if mixed:
+                per = courts * size // 2
+                if len(men) < per or len(women) < per:
+                    continue
+                ms = sorted(men, key=lambda p: priority(p, round_no))[:per]
+                ws = sorted(women, key=lambda p: priority(p, round_no))[:per]
+                # 자리: 복식 [남, 여 | 남, 여], 단식 [남 | 여]
+                seats, kinds = [], []
+                for g in range(courts):
+                    if doubles:
+                        seats += [ms[2 * g], ws[2 * g], ms[2 * g + 1], ws[2 * g + 1]]
+                        kinds += ["남", "여", "남", "여"]
+                    else:
+                        seats += [ms[g], ws[g]]
+                        kinds += ["남", "여"]
+                return courts, seats, kinds
+
+            need = courts * size
+            if same_sex:
+                ms = sorted(men, key=lambda p: priority(p, round_no))
+                ws = sorted(women, key=lambda p: priority(p, round_no))
+                best = None
+                for m_cnt in range(0, need + 1, size):
+                    w_cnt = need - m_cnt
+                    if m_cnt > len(ms) or w_cnt > len(ws):
+                        continue
+                    chosen = ms[:m_cnt] + ws[:w_cnt]
+                    key = sorted((priority(p, round_no)[:2] for p in chosen), reverse=True)
+                    if best is None or key < best[0]:
+                        best = (key, m_cnt, w_cnt)
+                if best is None:
+                    continue
+                _, m_cnt, w_cnt = best
+                seats = ms[:m_cnt] + ws[:w_cnt]
+                kinds = ["남"] * m_cnt + ["여"] * w_cnt
+                return courts, seats, kinds
+
+            if len(players) < need:
+                continue
+            seats = sorted(players, key=lambda p: priority(p, round_no))[:need]
+            return courts, seats, ["*"] * need
+        return 0, [], []
+
+    def game_cost(seats, g):
+        four = seats[g * size:(g + 1) * size]
+        half = size // 2
+        t1, t2 = four[:half], four[half:]
+        c = 0.0
+        for team in (t1, t2):
+            if len(team) == 2:
+                a, b = team
+                c += (partner_counts[pair_key(a, b)] ** 2) * W_PARTNER
+                if last_partner.get(a) == b:
+                    c += W_RECENT_P
+        for x in t1:
+            for y in t2:
+                c += (opponent_counts[pair_key(x, y)] ** 2) * W_OPP
+        if use_ntrp:
+            c += abs(team_avg_ntrp(t1) - team_avg_ntrp(t2)) * W_NTRP
+        return c
+
+    schedule = []
+    for round_no in range(1, total_rounds + 1):
+        courts, seats, kinds = pick_round(round_no)
+        if not courts:
+            break
+
+        # 같은 종류 자리끼리 섞어서 시작
+        by_kind = defaultdict(list)
+        for i, k in enumerate(kinds):
+            by_kind[k].append(i)
+        for idxs in by_kind.values():
+            vals = [seats[i] for i in idxs]
+            random.shuffle(vals)
+            for i, v in zip(idxs, vals):
+                seats[i] = v
+
+        # 자리 맞바꾸기로 개선 (바뀐 두 경기만 다시 계산)
+        costs = [game_cost(seats, g) for g in range(courts)]
+        swappable = [idxs for idxs in by_kind.values() if len(idxs) >= 2]
+        if swappable:
+            for _ in range(TOTAL_ROUNDS_SWAP_TRIES):
+                idxs = random.choice(swappable)
+                i, j = random.sample(idxs, 2)
+                gi, gj = i // size, j // size
+                if gi == gj and (i % size < size // 2) == (j % size < size // 2):
+                    continue  # 같은 팀 안에서 바꾸면 그대로
+                before = costs[gi] + (costs[gj] if gj != gi else 0.0)
+                seats[i], seats[j] = seats[j], seats[i]
+                ci = game_cost(seats, gi)
+                cj = game_cost(seats, gj) if gj != gi else 0.0
+                if ci + cj <= before:
+                    costs[gi] = ci
+                    if gj != gi:
+                        costs[gj] = cj
+                else:
+                    seats[i], seats[j] = seats[j], seats[i]
+
+        # 확정 + 상태 갱신
+        half = size // 2
+        for g in range(courts):
+            four = seats[g * size:(g + 1) * size]
+            t1, t2 = list(four[:half]), list(four[half:])
+            schedule.append((gtype, t1, t2, g + 1))
+
+            for p in four:
+                games_played[p] += 1
+                last_round_played[p] = round_no
+            for team in (t1, t2):
+                if len(team) == 2:
+                    a, b = team
+                    partner_counts[pair_key(a, b)] += 1
+                    last_partner[a], last_partner[b] = b, a
+            for x in t1:
+                for y in t2:
+                    opponent_counts[pair_key(x, y)] += 1
+
+    return schedule
+
+
 
 # -------------------------------------------
 # 🎾 오늘의 테니스 운세 함수
@@ -1583,19 +3166,1164 @@ def iter_games(sessions, include_special=True):
         results = day_data.get("results", {})
         court_type = day_data.get("court_type", COURT_TYPES[0])
 
-        for idx, (gtype, t1, t2, court) in enumerate(schedule, start=1):
-            res = results.get(str(idx)) or results.get(idx) or {}
-            yield d, idx, {
-                "type": gtype,
-                "t1": t1,
-                "t2": t2,
-                "court": court,
-                "court_type": court_type,
-                "score1": res.get("t1"),
-                "score2": res.get("t2"),
-                "sides": res.get("sides", {}),
-            }
+        for idx, (gtype, t1, t2, court) in enumerate(schedule, start=1):
+            res = results.get(str(idx)) or results.get(idx) or {}
+            yield d, idx, {
+                "type": gtype,
+                "t1": t1,
+                "t2": t2,
+                "court": court,
+                "court_type": court_type,
+                "score1": res.get("t1"),
+                "score2": res.get("t2"),
+                "sides": res.get("sides", {}),
+            }
+
+
+# ---------------------------------------------------------
+# ✅ SQLite 경기 저장소 (통계 조회용 인덱스)
+#   - sessions 문서에서 파생: 날짜별 hash가 바뀐 날짜만 다시 넣고, 지운 날짜는 뺌
+#     (언제 다시 맞출지는 경기 테이블/통계 인덱스와 같은 sessions revision 으로 판단)
+#   - 브라우저 세션마다 메모리 DB 1개 (세션마다 보고 있는 sessions가 다를 수 있음)
+#   - "선수 X의 2025-12 경기" 같은 조회가 전체 순회 대신 인덱스 조회
+#     (stats_query 의 선수/코트 종류 필터가 여기서 (날짜, 경기 번호) 를 받아 감)
+#   - 값(점수/코트)은 타입 없는 컬럼에 원래 값 그대로 보관
+# ---------------------------------------------------------
+GAME_STORE_SCHEMA = """
+CREATE TABLE games (
+    gid INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    gtype TEXT,
+    court,
+    court_type TEXT,
+    special INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX idx_games_date ON games(date, idx);
+CREATE INDEX idx_games_court_type ON games(court_type, date);
+
+CREATE TABLE game_players (
+    gid INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    team INTEGER NOT NULL,
+    slot INTEGER NOT NULL
+);
+CREATE INDEX idx_game_players_player ON game_players(player, gid);
+CREATE INDEX idx_game_players_gid ON game_players(gid);
+
+CREATE TABLE results (
+    gid INTEGER PRIMARY KEY,
+    score1,
+    score2
+);
+
+CREATE TABLE sides (
+    gid INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    side
+);
+CREATE INDEX idx_sides_gid ON sides(gid);
+
+CREATE TABLE groups_snapshot (
+    date TEXT NOT NULL,
+    player TEXT NOT NULL,
+    grp TEXT
+);
+CREATE INDEX idx_groups_snapshot_date ON groups_snapshot(date);
+CREATE INDEX idx_groups_snapshot_player ON groups_snapshot(player, date);
+"""
+
+def _game_store():
+    store = st.session_state.get("_game_store")
+    if store is None:
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        conn.executescript(GAME_STORE_SCHEMA)
+        store = {"conn": conn, "lock": threading.Lock(), "hashes": {}}
+        st.session_state["_game_store"] = store
+    return store
+
+def _game_store_delete_date(conn, d):
+    gids = [(gid,) for (gid,) in conn.execute("SELECT gid FROM games WHERE date = ?", (d,))]
+    conn.executemany("DELETE FROM game_players WHERE gid = ?", gids)
+    conn.executemany("DELETE FROM results WHERE gid = ?", gids)
+    conn.executemany("DELETE FROM sides WHERE gid = ?", gids)
+    conn.execute("DELETE FROM games WHERE date = ?", (d,))
+    conn.execute("DELETE FROM groups_snapshot WHERE date = ?", (d,))
+
+def _game_store_insert_date(conn, d, day_data):
+    results = day_data.get("results", {})
+    court_type = day_data.get("court_type", COURT_TYPES[0])
+    special = 1 if day_data.get("special_match", False) else 0
+
+    for idx, (gtype, t1, t2, court) in enumerate(day_data.get("schedule", []), start=1):
+        cur = conn.execute(
+            "INSERT INTO games (date, idx, gtype, court, court_type, special) VALUES (?, ?, ?, ?, ?, ?)",
+            (d, idx, gtype, court, court_type, special),
+        )
+        gid = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO game_players VALUES (?, ?, ?, ?)",
+            [(gid, p, 1, i) for i, p in enumerate(t1)] + [(gid, p, 2, i) for i, p in enumerate(t2)],
+        )
+        res = results.get(str(idx)) or results.get(idx) or {}
+        if res:
+            conn.execute("INSERT INTO results VALUES (?, ?, ?)", (gid, res.get("t1"), res.get("t2")))
+            conn.executemany(
+                "INSERT INTO sides VALUES (?, ?, ?)",
+                [(gid, p, side) for p, side in (res.get("sides") or {}).items()],
+            )
+
+    conn.executemany(
+        "INSERT INTO groups_snapshot VALUES (?, ?, ?)",
+        [(d, p, grp) for p, grp in (day_data.get("groups_snapshot") or {}).items()],
+    )
+
+def game_store_sync(sessions):
+    """sessions 와 맞춤: hash가 바뀐 날짜만 다시 넣음. 저장소 dict를 돌려줌
+    (sessions revision 이 그대로면 hash 비교도 없이 바로 반환)"""
+    store = _game_store()
+    date_hashes, rev = sessions_date_hashes_current(sessions)
+    if store.get("rev") == rev:
+        return store
+    hashes = {d: h for d, h in date_hashes.items() if d != "전체"}
+    with store["lock"]:
+        old = store["hashes"]
+        if hashes != old:
+            conn = store["conn"]
+            with conn:
+                for d in old:
+                    if hashes.get(d) != old[d]:
+                        _game_store_delete_date(conn, d)
+                for d, h in hashes.items():
+                    if old.get(d) != h:
+                        _game_store_insert_date(conn, d, sessions[d])
+            store["hashes"] = hashes
+        store["rev"] = rev
+    return store
+
+def _month_range(month_prefix):
+    # "2025-12" → ["2025-12", "2025-12\uffff") : 날짜 인덱스 범위 조회
+    return month_prefix, month_prefix + "\uffff"
+
+def game_store_keys(sessions, player=None, month_prefix=None, court_type=None, include_special=True):
+    """조건에 맞는 경기의 (날짜, 경기 번호) 목록 — 인덱스로만 거름 (순서 없음)
+    - player      : 이 선수가 뛴 경기만
+    - month_prefix: "YYYY-MM" (또는 "YYYY") 로 시작하는 날짜만
+    - court_type  : 이 코트 종류만
+    """
+    store = game_store_sync(sessions)
+
+    where, args = [], []
+    if player is not None:
+        where.append("g.gid IN (SELECT gid FROM game_players WHERE player = ?)")
+        args.append(player)
+    if month_prefix:
+        lo, hi = _month_range(month_prefix)
+        where.append("g.date >= ? AND g.date < ?")
+        args += [lo, hi]
+    if court_type is not None:
+        where.append("g.court_type = ?")
+        args.append(court_type)
+    if not include_special:
+        where.append("g.special = 0")
+    sql = "SELECT g.date, g.idx FROM games g" + (" WHERE " + " AND ".join(where) if where else "")
+
+    with store["lock"]:
+        return store["conn"].execute(sql, args).fetchall()
+
+
+# ---------------------------------------------------------
+# ✅ 개인별 통계 인덱스 (선수 × 월, 점수 바뀐 날짜만 다시 계산)
+#   - 날짜별로 "선수마다의 기여분"을 만들어 두고, 선수×월 합계는 그 날짜들을 더해 둠
+#   - tab3 에서 점수 하나를 바꾸면 그 날짜만 다시 계산 → 그 달 합계만 다시 더함
+#   - 라켓/NTRP/성별/주손/MBTI 는 상대별(vs_opponent) 합계에서 명단 정보로 바로 뽑음
+#     (명단을 고쳐도 인덱스를 다시 만들 필요 없음)
+#   - 스페셜 매치 날짜는 제외 (tab4 와 같음)
+# ---------------------------------------------------------
+PLAYER_STAT_GROUPS = ("vs_opponent", "with_partner", "by_court_type", "by_side")
+
+def _new_wdl():
+    return {"G": 0, "W": 0, "D": 0, "L": 0}
+
+def _new_player_stats():
+    stats = {
+        "rec": {"G": 0, "W": 0, "D": 0, "L": 0, "points": 0, "score_for": 0, "score_against": 0},
+        "days": {},
+    }
+    for grp in PLAYER_STAT_GROUPS:
+        stats[grp] = {}
+    return stats
+
+def _side_stat_key(side_raw):
+    """코트 사이드 값 → 통계 키 (모름/빈 값은 None)"""
+    if not side_raw:
+        return None
+    s = str(side_raw)
+    if "모름" in s:
+        return None
+    if ("포" in s) or ("듀스" in s):
+        return "포(듀스)"
+    if ("백" in s) or ("애드" in s):
+        return "백(애드)"
+    return s
+
+def _player_stats_for_day(d, day_data):
+    """그 날짜 하나의 {선수: 기여분}"""
+    out = {}
+    if day_data.get("special_match", False):
+        return out
+
+    for _, idx, g in iter_games({d: day_data}):
+        t1, t2 = g["t1"], g["t2"]
+        s1, s2 = g["score1"], g["score2"]
+        r = calc_result(s1, s2)
+        if r is None:
+            continue
+
+        for player in dict.fromkeys(list(t1) + list(t2)):
+            in_t1 = player in t1
+            stats = out.get(player)
+            if stats is None:
+                stats = out[player] = _new_player_stats()
+            stats["days"][d] = True
+
+            rec = stats["rec"]
+            rec["G"] += 1
+            my_score, opp_score = (s1, s2) if in_t1 else (s2, s1)
+            rec["score_for"] += my_score if my_score is not None else 0
+            rec["score_against"] += opp_score if opp_score is not None else 0
+
+            if r == "D":
+                res_self = "D"
+            elif (r == "W") == in_t1:
+                res_self = "W"
+            else:
+                res_self = "L"
+            rec[res_self] += 1
+            rec["points"] += {"W": WIN_POINT, "D": DRAW_POINT, "L": LOSE_POINT}[res_self]
+
+            keys = {
+                "by_court_type": [g.get("court_type", "모름")],
+                "by_side": [k for k in [_side_stat_key(g.get("sides", {}).get(player))] if k],
+                "vs_opponent": list(t2 if in_t1 else t1),
+                "with_partner": [x for x in (t1 if in_t1 else t2) if x != player],
+            }
+            for grp, names in keys.items():
+                for k in names:
+                    wdl = stats[grp].get(k)
+                    if wdl is None:
+                        wdl = stats[grp][k] = _new_wdl()
+                    wdl["G"] += 1
+                    wdl[res_self] += 1
+    return out
+
+def _player_stats_merge(dst, src):
+    for k, v in src["rec"].items():
+        dst["rec"][k] += v
+    dst["days"].update(src["days"])
+    for grp in PLAYER_STAT_GROUPS:
+        for k, wdl in src[grp].items():
+            tgt = dst[grp].get(k)
+            if tgt is None:
+                tgt = dst[grp][k] = _new_wdl()
+            for rk, v in wdl.items():
+                tgt[rk] += v
+
+def _new_pair_stats():
+    return {"partner": {}, "opponent": {}}
+
+def _pair_stats_for_day(d, day_data):
+    """그 날짜 하나의 선수×선수 기록
+    - partner[a][b]  : a 가 b 와 같은 팀 (met = 점수 없어도 만난 횟수, G/W/D/L = 점수 있는 경기, a 기준)
+    - opponent[a][b] : a 가 b 를 상대로
+    """
+    out = _new_pair_stats()
+    if day_data.get("special_match", False):
+        return out
+
+    def cell(kind, a, b):
+        row = out[kind].get(a)
+        if row is None:
+            row = out[kind][a] = {}
+        c = row.get(b)
+        if c is None:
+            c = row[b] = {"met": 0, "G": 0, "W": 0, "D": 0, "L": 0}
+        return c
+
+    for _, idx, g in iter_games({d: day_data}):
+        t1, t2 = g["t1"], g["t2"]
+        r = calc_result(g["score1"], g["score2"])
+        for team, other, team_res in ((t1, t2, r), (t2, t1, {"W": "L", "L": "W"}.get(r, r))):
+            for i, a in enumerate(team):
+                for j, b in enumerate(team):
+                    if i == j:
+                        continue
+                    c = cell("partner", a, b)
+                    c["met"] += 1
+                    if team_res is not None:
+                        c["G"] += 1
+                        c[team_res] += 1
+                for b in other:
+                    c = cell("opponent", a, b)
+                    c["met"] += 1
+                    if team_res is not None:
+                        c["G"] += 1
+                        c[team_res] += 1
+    return out
+
+def _pair_stats_merge(dst, src):
+    for kind in ("partner", "opponent"):
+        for a, row in src[kind].items():
+            tgt_row = dst[kind].get(a)
+            if tgt_row is None:
+                tgt_row = dst[kind][a] = {}
+            for b, c in row.items():
+                tgt = tgt_row.get(b)
+                if tgt is None:
+                    tgt = tgt_row[b] = {"met": 0, "G": 0, "W": 0, "D": 0, "L": 0}
+                for k, v in c.items():
+                    tgt[k] += v
+
+def player_stats_index_sync(sessions):
+    """sessions 와 맞춤: hash가 바뀐 날짜만 다시 계산하고, 그 날짜가 속한 선수×월만 다시 더함"""
+    index = st.session_state.get("_player_stats_index")
+    if index is None:
+        index = {"hashes": {}, "days": {}, "months": defaultdict(dict), "pair_days": {}, "pairs": {}}
+        st.session_state["_player_stats_index"] = index
+
+    # 날짜별 hash 는 경기 테이블/레이팅 등과 같은 캐시를 씀 (sessions 를 고쳤을 때만 다시 계산)
+    date_hashes, rev = sessions_date_hashes_current(sessions)
+    if index.get("rev") == rev:
+        return index
+
+    hashes = {d: h for d, h in date_hashes.items() if d != "전체"}
+    old = index["hashes"]
+    if hashes == old:
+        index["rev"] = rev
+        return index
+
+    touched = set()   # (선수, 월)
+    for d in set(old) | set(hashes):
+        if old.get(d) == hashes.get(d):
+            continue
+        prev = index["days"].pop(d, {})
+        cur = _player_stats_for_day(d, sessions[d]) if d in hashes else {}
+        if cur:
+            index["days"][d] = cur
+        touched |= {(player, d[:7]) for player in list(prev) + list(cur)}
+
+        index["pair_days"].pop(d, None)
+        pairs = _pair_stats_for_day(d, sessions[d]) if d in hashes else None
+        if pairs and (pairs["partner"] or pairs["opponent"]):
+            index["pair_days"][d] = pairs
+        touched.add((None, d[:7]))
+
+    # 월별 날짜 목록은 한 번만 (sessions 순서 유지 → 합치는 순서가 기존과 같음)
+    month_dates = defaultdict(list)
+    players_by_month = defaultdict(set)
+    for player, month in touched:
+        players_by_month[month].add(player)
+    for d in sessions:
+        if d[:7] in players_by_month:
+            month_dates[d[:7]].append(d)
+
+    for month, month_players in players_by_month.items():
+        agg = None
+        for d in month_dates[month]:
+            if d in index["pair_days"]:
+                agg = agg or _new_pair_stats()
+                _pair_stats_merge(agg, index["pair_days"][d])
+        if agg is None:
+            index["pairs"].pop(month, None)
+        else:
+            index["pairs"][month] = agg
+
+        # 그 달 날짜를 한 번씩만 훑으며 다시 더할 선수들 기여분을 한꺼번에
+        aggs = {}
+        for d in month_dates[month]:
+            for player, part in index["days"].get(d, {}).items():
+                if player not in month_players:
+                    continue
+                agg = aggs.get(player)
+                if agg is None:
+                    agg = aggs[player] = _new_player_stats()
+                _player_stats_merge(agg, part)
+        for player in month_players - {None}:
+            if player in aggs:
+                index["months"][player][month] = aggs[player]
+            else:
+                index["months"][player].pop(month, None)
+
+    index["hashes"] = hashes
+    index["rev"] = rev
+    return index
+
+def player_stats_lookup(sessions, player, month_prefix=None):
+    """선수 한 명의 누적 통계 (month_prefix=None 이면 전체 기간)"""
+    index = player_stats_index_sync(sessions)
+    months = index["months"].get(player, {})
+    out = _new_player_stats()
+    if month_prefix:
+        if month_prefix in months:
+            _player_stats_merge(out, months[month_prefix])
+        return out
+
+    # 전체 기간: 날짜별 기여분을 sessions 순서대로 (표의 동률 순서가 기존과 같도록)
+    if not months:
+        return out
+    for d in sessions:
+        part = index["days"].get(d, {}).get(player)
+        if part is not None:
+            _player_stats_merge(out, part)
+    return out
+
+def player_stats_by_opponent_meta(vs_opponent, roster_by_name):
+    """상대별 합계 → 상대의 라켓/NTRP/성별/주손/MBTI 별 합계"""
+    by_racket, by_ntrp, by_gender, by_hand, by_mbti = {}, {}, {}, {}, {}
+
+    def add(bucket, key, wdl):
+        tgt = bucket.get(key)
+        if tgt is None:
+            tgt = bucket[key] = _new_wdl()
+        for rk, v in wdl.items():
+            tgt[rk] += v
+
+    for person, wdl in vs_opponent.items():
+        m = roster_by_name.get(person, {})
+
+        # 라켓 / NTRP: "모름" 은 통계에서 제외
+        racket = m.get("racket", "모름")
+        if racket != "모름":
+            add(by_racket, racket, wdl)
+        if m.get("ntrp", "모름") != "모름":
+            add(by_ntrp, f"{get_ntrp_value(m):.1f}", wdl)
+
+        add(by_gender, m.get("gender", "남"), wdl)
+        add(by_hand, m.get("hand", "오른손"), wdl)
+
+        # MBTI: 빈 값 / "모름" 은 통계에서 제외
+        mbti = (m.get("mbti", "") or "").strip().upper()
+        if mbti and mbti not in ("모름",):
+            add(by_mbti, mbti, wdl)
+
+    return by_racket, by_ntrp, by_gender, by_hand, by_mbti
+
+
+# ---------------------------------------------------------
+# ✅ 통계 큐브 (날짜 × 선수 × 차원 × 값 → G/W/D/L, 위 인덱스의 칸을 더하기만 함)
+#   - 저장된 차원: player(선수 본인 합계), court_type, side, opponent, partner
+#   - attr 를 주면 이름(선수/상대/파트너)을 명단 정보로 바꿔서 묶음
+#     (예: 상대 라켓별, 선수 주손별) → 명단을 고쳐도 큐브는 그대로
+#   - attr(meta) 가 None 을 돌려주면 그 칸은 뺌 (게스트/“모름” 제외 등)
+#   - 합치는 순서는 sessions 날짜 순서 → 그날 처음 나온 순서 (표 동률 순서 유지)
+# ---------------------------------------------------------
+STATS_CUBE_DIMS = {
+    "player": None,
+    "court_type": "by_court_type",
+    "side": "by_side",
+    "opponent": "vs_opponent",
+    "partner": "with_partner",
+}
+
+def stats_cube(sessions, dim, month=None, player=None, attr=None, roster_by_name=None):
+    """칸을 더한 {값: {"G","W","D","L"}}
+    - month : "YYYY-MM" (None 이면 전체 기간)
+    - player: 한 선수만 (None 이면 모든 선수)
+    """
+    index = player_stats_index_sync(sessions)
+    if player is not None and month:
+        part = index["months"].get(player, {}).get(month)
+        parts = [(player, part)] if part else []
+    else:
+        parts = []
+        for d in sessions:
+            if month and d[:7] != month:
+                continue
+            day = index["days"].get(d)
+            if not day:
+                continue
+            if player is None:
+                parts += list(day.items())
+            elif player in day:
+                parts.append((player, day[player]))
+
+    grp = STATS_CUBE_DIMS[dim]
+    out = {}
+    for name, part in parts:
+        cells = {name: part["rec"]} if grp is None else part[grp]
+        for key, wdl in cells.items():
+            if attr is not None:
+                key = attr((roster_by_name or {}).get(key))
+                if key is None:
+                    continue
+            tgt = out.get(key)
+            if tgt is None:
+                tgt = out[key] = _new_wdl()
+            for rk in ("G", "W", "D", "L"):
+                tgt[rk] += wdl[rk]
+    return out
+
+
+# ---------------------------------------------------------
+# ✅ 파트너/상대 조회 (선수×선수 기록, 위 인덱스의 월별 pairs 에서)
+#   - month=None 이면 전체 기간 (월별 기록을 더함)
+#   - 기록: {"met": 만난 횟수(점수 없어도), "G","W","D","L": 점수 있는 경기, a 기준}
+# ---------------------------------------------------------
+def _pair_months(sessions, month=None):
+    pairs = player_stats_index_sync(sessions)["pairs"]
+    if month:
+        return [pairs[month]] if month in pairs else []
+    order = {m: i for i, m in enumerate(dict.fromkeys(d[:7] for d in sessions))}
+    return [pairs[m] for m in sorted(pairs, key=lambda m: order.get(m, len(order)))]
+
+def pair_stats(sessions, month=None):
+    """{"partner": {a: {b: 기록}}, "opponent": {...}} (월별 합계를 합친 사본)"""
+    out = _new_pair_stats()
+    for part in _pair_months(sessions, month):
+        _pair_stats_merge(out, part)
+    return out
+
+def _pair_record(sessions, kind, a, b, month=None):
+    rec = {"met": 0, "G": 0, "W": 0, "D": 0, "L": 0}
+    for part in _pair_months(sessions, month):
+        for k, v in part[kind].get(a, {}).get(b, {}).items():
+            rec[k] += v
+    return rec
+
+def partner_record(sessions, a, b, month=None):
+    """a 가 b 와 같은 팀일 때 기록 (a 기준)"""
+    return _pair_record(sessions, "partner", a, b, month)
+
+def opponent_record(sessions, a, b, month=None):
+    """a 가 b 를 상대했을 때 기록 (a 기준)"""
+    return _pair_record(sessions, "opponent", a, b, month)
+
+def top_partners(sessions, a, k=5, month=None, min_games=1):
+    """a 의 파트너 중 승률 높은 순 k명 [(이름, 기록), ...] (동률이면 경기수 많은 순)"""
+    row = {}
+    for part in _pair_months(sessions, month):
+        for b, c in part["partner"].get(a, {}).items():
+            tgt = row.setdefault(b, {"met": 0, "G": 0, "W": 0, "D": 0, "L": 0})
+            for key, v in c.items():
+                tgt[key] += v
+    ranked = [(b, c) for b, c in row.items() if c["G"] >= max(min_games, 1)]
+    ranked.sort(key=lambda x: (-x[1]["W"] / x[1]["G"], -x[1]["G"]))
+    return ranked[:k]
+
+def pair_matrix(sessions, kind="partner", month=None, names=None):
+    """히트맵 등에 쓰는 조밀 행렬: (이름 목록, {"met","G","W","D","L": (n, n) 배열})"""
+    stats = pair_stats(sessions, month)[kind]
+    if names is None:
+        names = list(dict.fromkeys(list(stats) + [b for row in stats.values() for b in row]))
+    ids = {name: i for i, name in enumerate(names)}
+    mats = {key: np.zeros((len(names), len(names)), dtype=np.int64) for key in ("met", "G", "W", "D", "L")}
+    for a, row in stats.items():
+        if a not in ids:
+            continue
+        for b, c in row.items():
+            if b in ids:
+                for key, v in c.items():
+                    mats[key][ids[a], ids[b]] = v
+    return names, mats
+
+
+# ---------------------------------------------------------
+# ✅ 컬럼형 경기 테이블 (NumPy 배열, sessions 내용이 바뀔 때만 다시 만듦)
+#   - 1행 = 1경기, iter_games 와 같은 순서 (sessions 날짜 순서 → 경기 번호)
+#   - players: (경기수, 2*팀최대인원) 선수 번호, 앞 절반이 t1 / 뒤 절반이 t2, 빈 칸은 -1
+#   - result : t1 기준 1=승, 0=무, -1=패, GT_NO_RESULT=점수 없음
+#   - 선수별 합계는 game_table_player_totals 에서 bincount 로 한 번에
+#   - 날짜 파티션: 날짜마다 행 구간 [start, stop) + 정렬된 날짜 목록
+#     → 월/기간 조회는 game_table_rows 로 그 구간의 행만 (전체 비교 X)
+# ---------------------------------------------------------
+GT_NO_RESULT = -2
+
+def build_game_table(sessions):
+    """sessions → 컬럼형 경기 테이블 (캐시 없이 새로 만듦)"""
+    names, name_ids = [], {}
+    dates, date_ids = [], {}
+    rows = []
+    for d, idx, g in iter_games(sessions):
+        if d not in date_ids:
+            date_ids[d] = len(dates)
+            dates.append(d)
+        pids = []
+        for team in (g["t1"], g["t2"]):
+            ids = []
+            for p in team:
+                if p not in name_ids:
+                    name_ids[p] = len(names)
+                    names.append(p)
+                ids.append(name_ids[p])
+            pids.append(ids)
+        rows.append((d, idx, g, pids))
+
+    width = max([len(t) for _, _, _, pids in rows for t in pids] + [1])
+    n = len(rows)
+    players = np.full((n, 2 * width), -1, dtype=np.int32)
+    sides = np.full((n, 2 * width), None, dtype=object)
+    score1 = np.full(n, np.nan)
+    score2 = np.full(n, np.nan)
+    result = np.full(n, GT_NO_RESULT, dtype=np.int8)
+    special = np.zeros(n, dtype=bool)
+
+    for i, (d, idx, g, pids) in enumerate(rows):
+        for t, ids in enumerate(pids):
+            players[i, t * width:t * width + len(ids)] = ids
+            for k, p in enumerate(g["t1"] if t == 0 else g["t2"]):
+                sides[i, t * width + k] = g["sides"].get(p)
+        r = calc_result(g["score1"], g["score2"])
+        if r is not None:
+            score1[i], score2[i] = g["score1"], g["score2"]
+            result[i] = {"W": 1, "D": 0, "L": -1}[r]
+        special[i] = bool(sessions[d].get("special_match", False))
+
+    date_col = np.array([date_ids[d] for d, _, _, _ in rows], dtype=np.int32)
+
+    # 날짜 파티션 (iter_games 가 날짜별로 이어서 내보내므로 날짜마다 연속 구간)
+    date_start = np.searchsorted(date_col, np.arange(len(dates)), side="left")
+    date_stop = np.searchsorted(date_col, np.arange(len(dates)), side="right")
+    sorted_date_ids = sorted(range(len(dates)), key=lambda i: dates[i])
+
+    return {
+        "names": names,
+        "name_ids": name_ids,
+        "dates": dates,
+        "date_ids": date_ids,
+        "date": date_col,
+        "date_start": date_start,
+        "date_stop": date_stop,
+        "sorted_dates": [dates[i] for i in sorted_date_ids],
+        "sorted_date_ids": sorted_date_ids,
+        "month": np.array([d[:7] for d in dates], dtype=object)[date_col] if n else np.array([], dtype=object),
+        "idx": np.array([idx for _, idx, _, _ in rows], dtype=np.int32),
+        "type": np.array([g["type"] for _, _, g, _ in rows], dtype=object),
+        "court": np.array([g["court"] for _, _, g, _ in rows], dtype=object),
+        "court_type": np.array([g["court_type"] for _, _, g, _ in rows], dtype=object),
+        "special": special,
+        "players": players,
+        "sides": sides,
+        "score1": score1,
+        "score2": score2,
+        "result": result,
+    }
+
+def game_table(sessions):
+    """sessions 의 컬럼형 테이블. 내용(날짜별 hash)이 그대로면 캐시 재사용"""
+    date_hashes, rev = sessions_date_hashes_current(sessions)
+    cached = st.session_state.get("_game_table")
+    if cached is None or cached[0] != rev:
+        table = build_game_table(sessions)
+        table["date_hashes"] = date_hashes
+        table["rev"] = rev
+        cached = (rev, table)
+        st.session_state["_game_table"] = cached
+    return cached[1]
+
+def game_table_rows(table, month=None, start=None, end=None, include_special=True):
+    """날짜 파티션으로 고른 행 번호 배열 (iter_games 순서)
+    - month     : "YYYY-MM" (또는 "YYYY") 로 시작하는 날짜
+    - start/end : "YYYY-MM-DD" 구간 (양끝 포함, 한쪽만 줘도 됨) — 최근 30일 등
+    """
+    sorted_dates = table["sorted_dates"]
+    if month:
+        lo, hi = _month_range(month)
+        i, j = bisect.bisect_left(sorted_dates, lo), bisect.bisect_left(sorted_dates, hi)
+    else:
+        i = bisect.bisect_left(sorted_dates, start) if start else 0
+        j = bisect.bisect_right(sorted_dates, end) if end else len(sorted_dates)
+
+    picked = sorted(table["sorted_date_ids"][i:j])
+    if not picked:
+        return np.array([], dtype=np.int64)
+    rows = np.concatenate([
+        np.arange(table["date_start"][di], table["date_stop"][di]) for di in picked
+    ])
+    if not include_special:
+        rows = rows[~table["special"][rows]]
+    return rows
+
+def game_table_player_totals(table, mask=None):
+    """mask(불리언 배열 또는 행 번호 배열) 로 고른 경기들의 선수 번호별 합계 (배열 길이 = len(names))
+    - played       : 참여 경기수 (점수 없어도)
+    - G/W/D/L/points/score_for/score_against : 점수 있는 경기만
+    - shutouts     : 상대 0점 승리 수
+    - first_played / first_scored / first_shutout : 처음 나온 위치 (iter_games 순서 정렬용, 없으면 큰 값)
+    """
+    n_names = len(table["names"])
+    players = table["players"] if mask is None else table["players"][mask]
+    result = table["result"] if mask is None else table["result"][mask]
+    s1 = np.nan_to_num(table["score1"] if mask is None else table["score1"][mask])
+    s2 = np.nan_to_num(table["score2"] if mask is None else table["score2"][mask])
+
+    rows, slots = players.shape
+    half = slots // 2
+    on_t1 = np.arange(slots) < half
+    filled = players >= 0
+    ids = players[filled]
+
+    scored = np.broadcast_to((result != GT_NO_RESULT)[:, None], players.shape)
+    my_res = result[:, None] * np.where(on_t1, 1, -1)
+    my_for = np.where(on_t1, s1[:, None], s2[:, None])
+    my_against = np.where(on_t1, s2[:, None], s1[:, None])
+
+    def total(values):
+        return np.bincount(ids, weights=values[filled], minlength=n_names).astype(np.int64)
+
+    won = scored & (my_res == 1)
+    out = {
+        "played": np.bincount(ids, minlength=n_names),
+        "G": total(scored),
+        "W": total(won),
+        "D": total(scored & (my_res == 0)),
+        "L": total(scored & (my_res == -1)),
+        "score_for": total(np.where(scored, my_for, 0)),
+        "score_against": total(np.where(scored, my_against, 0)),
+        "shutouts": total(won & (my_for > 0) & (my_against == 0)),
+    }
+    out["points"] = out["W"] * WIN_POINT + out["D"] * DRAW_POINT + out["L"] * LOSE_POINT
+
+    pos = np.arange(rows * slots).reshape(rows, slots)
+    never = rows * slots
+    shutout = won & (my_for > 0) & (my_against == 0)
+    firsts = (("first_played", filled), ("first_scored", filled & scored), ("first_shutout", filled & shutout))
+    for key, sel in firsts:
+        first = np.full(n_names, never, dtype=np.int64)
+        np.minimum.at(first, players[sel], pos[sel])
+        out[key] = first
+    return out
+
+def game_table_player_dates(table, mask=None):
+    """선수 번호 → 참여한 날짜 set"""
+    players = table["players"] if mask is None else table["players"][mask]
+    date_col = table["date"] if mask is None else table["date"][mask]
+    filled = players >= 0
+    pairs = np.unique(np.stack([players[filled], np.broadcast_to(date_col[:, None], players.shape)[filled]], axis=1), axis=0)
+    out = defaultdict(set)
+    for pid, di in pairs:
+        out[int(pid)].add(table["dates"][di])
+    return out
+
+# ---------------------------------------------------------
+# ✅ 통계 조회 (필터 + 집계 + 결과 캐시)
+#   - 필터: 기간(month 또는 start/end), 선수, 조(A/B, 그날 groups_snapshot 우선),
+#           코트 종류, 스페셜 포함 여부, 회원만
+#   - 집계: games(iter_games 형식), record(선수별 기록), partner/opponent(선수×선수),
+#           category(선수 속성별 기록, by="hand" 등)
+#   - 결과는 (조회 조건, 경기 테이블 revision, 명단 인덱스) 로 캐시 → 같은 조회는 리런해도 공짜
+# ---------------------------------------------------------
+STATS_QUERY_ATTR_DEFAULTS = {
+    "hand": "오른손",
+    "racket": "모름",
+    "age_group": "비밀",
+    "gender": "남",
+    "mbti": "모름",
+    "group": "미배정",
+}
+
+def stats_query_rows(sessions, table, month=None, start=None, end=None, player=None, group=None,
+                     court_type=None, include_special=False, roster_by_name=None):
+    """필터를 만족하는 경기 테이블 행 번호 (iter_games 순서)"""
+    rows = game_table_rows(table, month=month, start=start, end=end, include_special=include_special)
+    if player is not None:
+        if player not in table["name_ids"]:
+            return rows[:0]
+        # 선수(+코트 종류) 필터는 SQLite 경기 저장소의 인덱스 조회 → (날짜, 경기 번호) 를 행 번호로
+        hits = [
+            int(table["date_start"][table["date_ids"][d]]) + idx - 1
+            for d, idx in game_store_keys(sessions, player=player, court_type=court_type)
+        ]
+        rows = rows[np.isin(rows, np.array(hits, dtype=np.int64))]
+    elif court_type is not None:
+        rows = rows[table["court_type"][rows] == court_type]
+    if group is not None:
+        names = table["names"]
+        keep = []
+        for row in rows:
+            d = table["dates"][table["date"][row]]
+            players = [names[pid] for pid in table["players"][row] if pid >= 0]
+            snapshot = sessions.get(d, {}).get("groups_snapshot")
+            keep.append(classify_game_group(players, roster_by_name or {}, snapshot) == group)
+        rows = rows[np.array(keep, dtype=bool)] if keep else rows
+    return rows
+
+def _stats_query_games(sessions, table, rows):
+    out = []
+    for row in rows:
+        d = table["dates"][table["date"][row]]
+        idx = int(table["idx"][row])
+        day_data = sessions[d]
+        res = day_data.get("results", {})
+        res = res.get(str(idx)) or res.get(idx) or {}
+        gtype, t1, t2, court = day_data["schedule"][idx - 1]
+        out.append((d, idx, {
+            "type": gtype,
+            "t1": t1,
+            "t2": t2,
+            "court": court,
+            "court_type": day_data.get("court_type", COURT_TYPES[0]),
+            "score1": res.get("t1"),
+            "score2": res.get("t2"),
+            "sides": res.get("sides", {}),
+        }))
+    return out
+
+def _stats_query_record(table, rows, members):
+    totals = game_table_player_totals(table, rows)
+    player_dates = game_table_player_dates(table, rows)
+    out = {}
+    for i in np.argsort(totals["first_played"], kind="stable"):
+        name = table["names"][i]
+        if totals["played"][i] == 0 or (members is not None and name not in members):
+            continue
+        rec = {k: int(totals[k][i]) for k in ("played", "G", "W", "D", "L", "points", "score_for", "score_against")}
+        rec["days"] = player_dates[int(i)]
+        out[name] = rec
+    return out
+
+def _stats_query_pairs(table, rows, kind, members):
+    names = table["names"]
+    half = table["players"].shape[1] // 2
+    out = {}
+    for row in rows:
+        res = int(table["result"][row])
+        ids = table["players"][row]
+        teams = ([names[p] for p in ids[:half] if p >= 0], [names[p] for p in ids[half:] if p >= 0])
+        for t, (mine, other) in enumerate((teams, teams[::-1])):
+            my_res = None if res == GT_NO_RESULT else {1: "W", 0: "D", -1: "L"}[res if t == 0 else -res]
+            for i, a in enumerate(mine):
+                if members is not None and a not in members:
+                    continue
+                targets = [b for j, b in enumerate(mine) if j != i] if kind == "partner" else other
+                row_out = out.setdefault(a, {})
+                for b in targets:
+                    c = row_out.setdefault(b, {"met": 0, "G": 0, "W": 0, "D": 0, "L": 0})
+                    c["met"] += 1
+                    if my_res is not None:
+                        c["G"] += 1
+                        c[my_res] += 1
+    return out
+
+def stats_query(sessions, agg, month=None, start=None, end=None, player=None, group=None,
+                court_type=None, include_special=False, members_only=False, roster=None, by=None):
+    """통계 조회 한 번 (결과는 사본이라 고쳐 써도 캐시에 영향 없음)
+    - group/members_only/category 에는 roster 가 필요
+    """
+    table = game_table(sessions)
+    ridx = roster_index(roster) if roster is not None else None
+    rev = (table["rev"], id(ridx))
+    key = (agg, month, start, end, player, group, court_type, include_special, members_only, by)
+
+    cache = st.session_state.get("_stats_query_cache")
+    if cache is None or cache["rev"] != rev:
+        cache = {"rev": rev, "results": {}}
+        st.session_state["_stats_query_cache"] = cache
+    if key in cache["results"]:
+        return copy.deepcopy(cache["results"][key])
+
+    by_name = ridx["by_name"] if ridx else {}
+    members = ridx["members"] if (ridx and members_only) else None
+    rows = stats_query_rows(
+        sessions, table, month=month, start=start, end=end, player=player, group=group,
+        court_type=court_type, include_special=include_special, roster_by_name=by_name,
+    )
+
+    if agg == "games":
+        result = _stats_query_games(sessions, table, rows)
+    elif agg == "record":
+        result = _stats_query_record(table, rows, members)
+    elif agg in ("partner", "opponent"):
+        result = _stats_query_pairs(table, rows, agg, members)
+    elif agg == "category":
+        # 선수 속성(by)별로 점수 있는 경기 G/W/D/L 합계 (명단에 없는 사람은 제외)
+        result = {}
+        default = STATS_QUERY_ATTR_DEFAULTS.get(by)
+        for name, rec in _stats_query_record(table, rows, members).items():
+            meta = by_name.get(name)
+            if meta is None:
+                continue
+            tgt = result.setdefault(meta.get(by, default), _new_wdl())
+            for k in ("G", "W", "D", "L"):
+                tgt[k] += rec[k]
+    else:
+        raise ValueError(f"unknown stats query: {agg}")
+
+    cache["results"][key] = result
+    return copy.deepcopy(result)
+
+
+# ---------------------------------------------------------
+# ✅ 기간 순위 (누적합)
+#   - 날짜 축(스페셜 매치만 있는 날 제외) × 선수 로 날짜별 합계를 만들고 누적합
+#   - 어떤 기간이든 합계 = 누적[끝] - 누적[시작] → 선수 수만큼의 계산
+#   - 컬럼형 테이블과 같이 만들어지고 같이 버려짐 (sessions 가 바뀔 때만 새로)
+# ---------------------------------------------------------
+ROLLING_KEYS = ("played", "W", "D", "L", "points", "score_for", "score_against", "days")
+ROLLING_WINDOWS = {
+    "최근 4주": "4w",
+    "최근 10회": "10s",
+    "올 시즌": "season",
+}
+
+def game_table_prefix(table):
+    """{"dates": 날짜 축, "sums": {키: (날짜수+1, 선수수) 누적합}}"""
+    prefix = table.get("_prefix")
+    if prefix is not None:
+        return prefix
+
+    date_ids = {d: i for i, d in enumerate(table["dates"])}
+    axis, per_day = [], {k: [] for k in ROLLING_KEYS}
+    for d in table["sorted_dates"]:
+        di = date_ids[d]
+        rows = np.arange(table["date_start"][di], table["date_stop"][di])
+        rows = rows[~table["special"][rows]]
+        if not len(rows):
+            continue
+        totals = game_table_player_totals(table, rows)
+        totals["days"] = (totals["played"] > 0).astype(np.int64)
+        axis.append(d)
+        for k in ROLLING_KEYS:
+            per_day[k].append(totals[k])
+
+    n_names = len(table["names"])
+    sums = {}
+    for k in ROLLING_KEYS:
+        day_rows = np.array(per_day[k], dtype=np.int64).reshape(len(axis), n_names)
+        sums[k] = np.vstack([np.zeros((1, n_names), dtype=np.int64), np.cumsum(day_rows, axis=0)])
+    prefix = {"dates": axis, "sums": sums}
+    table["_prefix"] = prefix
+    return prefix
+
+def rolling_window_span(dates, window):
+    """날짜 축에서 기간 [i, j) (기준 = 마지막 기록 날짜)"""
+    j = len(dates)
+    if not j:
+        return 0, 0
+    last = dates[-1]
+    if window == "4w":
+        try:
+            since = (date.fromisoformat(last) - timedelta(days=27)).isoformat()
+        except ValueError:
+            since = ""
+        return bisect.bisect_left(dates, since), j
+    if window == "10s":
+        return max(j - 10, 0), j
+    if window == "season":
+        return bisect.bisect_left(dates, last[:4]), j
+    return 0, j
+
+def rolling_window_partial(window_dates, window):
+    """아직 안 읽은 날짜가 이 기간에 들어갈 수 있으면 True ("불러온 시즌 기준" 표시용)"""
+    unloaded = [d for d in sessions_unloaded_dates() if session_season(d) is not None]
+    if not unloaded or not window_dates:
+        return bool(unloaded)
+    last = window_dates[-1]
+    lo = window_dates[0]
+    if window == "4w":
+        try:
+            lo = (date.fromisoformat(last) - timedelta(days=27)).isoformat()
+        except ValueError:
+            lo = ""
+    elif window == "10s" and len(window_dates) < 10:
+        lo = ""  # 10회가 안 차면 더 이른 날짜도 들어옴
+    elif window == "season":
+        lo = last[:4]
+    return any(lo <= d <= last for d in unloaded)
+
+def rolling_totals(sessions, window):
+    """(기간 날짜들, {이름: 합계}) — 그 기간에 뛴 선수만"""
+    table = game_table(sessions)
+    prefix = game_table_prefix(table)
+    i, j = rolling_window_span(prefix["dates"], window)
+    diff = {k: prefix["sums"][k][j] - prefix["sums"][k][i] for k in ROLLING_KEYS}
+    out = {}
+    for pid in np.flatnonzero(diff["played"]):
+        out[table["names"][pid]] = {k: int(diff[k][pid]) for k in ROLLING_KEYS}
+    return prefix["dates"][i:j], out
+
+
+# ---------------------------------------------------------
+# ✅ 레이팅 (Elo 방식, 복식/단식 공통)
+#   - 날짜 순서대로, 하루 = 1 레이팅 구간 (그날 경기는 모두 '그날 아침' 레이팅 기준)
+#     → 하루치를 배열 연산 한 번으로 처리 (전체 재계산도 날짜 수만큼만 반복)
+#   - 팀 레이팅 = 팀원 평균, 기대 승률 = 1 / (1 + 10^((상대-우리)/400))
+#   - 승 1 / 무 0.5 / 패 0, 팀원 모두 같은 만큼 오르내림
+#   - 점수가 바뀌면 그 날짜부터만 다시 계산 (오늘 점수 입력은 오늘 하루만)
+#   - 스페셜 매치 날짜와 점수 없는 경기는 제외
+# ---------------------------------------------------------
+RATING_BASE = 1500.0
+RATING_K = 24.0
+RATING_SCALE = 400.0
+
+def _rating_day_delta(table, rows, ratings):
+    """하루치 경기 → {이름: 변화량}, 그날 뛴 이름 목록"""
+    players = table["players"][rows]
+    result = table["result"][rows]
+    scored = (result != GT_NO_RESULT) & ~table["special"][rows]
+    players, result = players[scored], result[scored]
+    if not len(players):
+        return {}, []
+
+    names = table["names"]
+    half = players.shape[1] // 2
+    filled = players >= 0
+    vec = np.array([ratings.get(n, RATING_BASE) for n in names])
+    r = np.where(filled, vec[np.where(filled, players, 0)], 0.0)
+
+    def team_mean(sl):
+        return r[:, sl].sum(axis=1) / np.maximum(filled[:, sl].sum(axis=1), 1)
+
+    t1, t2 = team_mean(slice(0, half)), team_mean(slice(half, None))
+    expected = 1.0 / (1.0 + 10 ** ((t2 - t1) / RATING_SCALE))
+    actual = (result + 1) / 2.0
+    d1 = RATING_K * (actual - expected)
+    slot_delta = np.where(np.arange(players.shape[1]) < half, d1[:, None], -d1[:, None])
+
+    delta = np.zeros(len(names))
+    np.add.at(delta, players[filled], slot_delta[filled])
+    played = np.unique(players[filled])
+    return {names[i]: float(delta[i]) for i in played}, [names[i] for i in played]
+
+def rating_state_sync(sessions):
+    """레이팅 상태를 sessions 와 맞춤 (바뀐 가장 이른 날짜부터 다시)"""
+    table = game_table(sessions)
+    hashes = table["date_hashes"]
+    dates = table["sorted_dates"]
+
+    state = st.session_state.get("_rating_state")
+    if state is None:
+        state = {"dates": [], "hashes": {}, "after": {}, "played": {}}
+        st.session_state["_rating_state"] = state
+    if state.get("rev") == table["rev"]:
+        return state
+
+    # 앞에서부터 같은 날짜(내용 포함)는 그대로 둠
+    keep = 0
+    while (
+        keep < min(len(dates), len(state["dates"]))
+        and dates[keep] == state["dates"][keep]
+        and hashes.get(dates[keep]) == state["hashes"].get(dates[keep])
+    ):
+        keep += 1
+    if keep == len(dates) == len(state["dates"]):
+        state["rev"] = table["rev"]
+        return state
+
+    for d in state["dates"][keep:]:
+        state["after"].pop(d, None)
+        state["played"].pop(d, None)
+        state["hashes"].pop(d, None)
+
+    ratings = dict(state["after"][dates[keep - 1]]) if keep else {}
+    date_ids = {d: i for i, d in enumerate(table["dates"])}
+    for d in dates[keep:]:
+        di = date_ids[d]
+        rows = np.arange(table["date_start"][di], table["date_stop"][di])
+        delta, played = _rating_day_delta(table, rows, ratings)
+        for name, v in delta.items():
+            ratings[name] = ratings.get(name, RATING_BASE) + v
+        state["after"][d] = dict(ratings)
+        state["played"][d] = played
+        state["hashes"][d] = hashes.get(d)
+
+    state["dates"] = list(dates)
+    state["rev"] = table["rev"]
+    return state
+
+def player_ratings(sessions, until=None):
+    """{이름: 레이팅} (until="YYYY-MM-DD" 를 주면 그 날짜까지 반영한 값)"""
+    state = rating_state_sync(sessions)
+    dates = state["dates"]
+    if until is not None:
+        dates = dates[:bisect.bisect_right(dates, until)]
+    return dict(state["after"][dates[-1]]) if dates else {}
+
+def rating_history(sessions, name):
+    """선수의 레이팅 변화 [(날짜, 그날 끝난 뒤 레이팅), ...] (뛴 날짜만)"""
+    state = rating_state_sync(sessions)
+    return [(d, state["after"][d][name]) for d in state["dates"] if name in state["played"][d]]
 
+# ---------------------------------------------------------
+# ✅ 연승 / 무패 기록 (전체 기록을 이어서, 월이 바뀌어도 끊기지 않음)
+#   - 선수마다 [현재 연승, 현재 무패, 최다 연승, 최다 무패] 를 들고 (날짜, 경기 번호) 순서로 갱신
+#     승: 연승+1, 무패+1 / 무: 연승 0, 무패+1 / 패: 둘 다 0
+#   - 결과 하나 = 그 경기 선수 수만큼만 갱신, 점수가 바뀌면 그 날짜부터만 다시
+#   - 날짜별로 "그날 도달한 최고 연승/무패" 를 남겨서 월별 최고는 그 날짜들의 최대값
+#   - 스페셜 매치 날짜와 점수 없는 경기는 제외
+# ---------------------------------------------------------
+def streak_state_sync(sessions):
+    table = game_table(sessions)
+    hashes = table["date_hashes"]
+    dates = table["sorted_dates"]
+
+    state = st.session_state.get("_streak_state")
+    if state is None:
+        state = {"dates": [], "hashes": {}, "after": {}, "day_best": {}}
+        st.session_state["_streak_state"] = state
+    if state.get("rev") == table["rev"]:
+        return state
+
+    keep = 0
+    while (
+        keep < min(len(dates), len(state["dates"]))
+        and dates[keep] == state["dates"][keep]
+        and hashes.get(dates[keep]) == state["hashes"].get(dates[keep])
+    ):
+        keep += 1
+    if keep == len(dates) == len(state["dates"]):
+        state["rev"] = table["rev"]
+        return state
+
+    for d in state["dates"][keep:]:
+        state["after"].pop(d, None)
+        state["day_best"].pop(d, None)
+        state["hashes"].pop(d, None)
+
+    cur = {name: list(v) for name, v in state["after"][dates[keep - 1]].items()} if keep else {}
+    names = table["names"]
+    half = table["players"].shape[1] // 2
+    date_ids = {d: i for i, d in enumerate(table["dates"])}
+    for d in dates[keep:]:
+        di = date_ids[d]
+        day_best = {}
+        for row in range(table["date_start"][di], table["date_stop"][di]):
+            res = int(table["result"][row])
+            if res == GT_NO_RESULT or table["special"][row]:
+                continue
+            for slot, pid in enumerate(table["players"][row]):
+                if pid < 0:
+                    continue
+                my_res = res if slot < half else -res
+                v = cur.setdefault(names[pid], [0, 0, 0, 0])
+                v[0] = v[0] + 1 if my_res == 1 else 0
+                v[1] = v[1] + 1 if my_res >= 0 else 0
+                v[2], v[3] = max(v[2], v[0]), max(v[3], v[1])
+                b = day_best.setdefault(names[pid], [0, 0])
+                b[0], b[1] = max(b[0], v[0]), max(b[1], v[1])
+        state["after"][d] = {name: list(v) for name, v in cur.items()}
+        state["day_best"][d] = day_best
+        state["hashes"][d] = hashes.get(d)
+
+    state["dates"] = list(dates)
+    state["rev"] = table["rev"]
+    return state
+
+def player_streaks(sessions, name):
+    """{"current", "best", "current_unbeaten", "best_unbeaten"} (전체 기록 기준)"""
+    state = streak_state_sync(sessions)
+    v = state["after"][state["dates"][-1]].get(name, [0, 0, 0, 0]) if state["dates"] else [0, 0, 0, 0]
+    return {"current": v[0], "current_unbeaten": v[1], "best": v[2], "best_unbeaten": v[3]}
+
+def month_best_streaks(sessions, month, unbeaten=False):
+    """{이름: 그 달 경기 중 도달한 최고 연승(또는 무패)} — 지난달에서 이어진 연승 포함"""
+    state = streak_state_sync(sessions)
+    lo, hi = _month_range(month)
+    out = {}
+    k = 1 if unbeaten else 0
+    for d in state["dates"][bisect.bisect_left(state["dates"], lo):bisect.bisect_left(state["dates"], hi)]:
+        for name, b in state["day_best"][d].items():
+            out[name] = max(out.get(name, 0), b[k])
+    return out
 
 def count_player_games(schedule):
     cnt = Counter()
@@ -1916,12 +4644,44 @@ def build_schedule_from_manual(total_rounds: int, court_count: int, gtype: str):
 
 
 
+# ---------------------------------------------------------
+# ✅ 명단 인덱스 (명단이 바뀔 때만 1번 만듦)
+#   - 회원/게스트 판별, 이름 → 번호, 속성 배열(성별/조/NTRP/주손/라켓/MBTI/나이대)
+#   - 같은 명단 객체 + 같은 길이 + 같은 revision 이면 재사용
+#   - tab1 에서 수정/삭제/추가하면 save_players 가 roster_index_invalidate 를 부름
+# ---------------------------------------------------------
+ROSTER_INDEX_ATTRS = ("gender", "group", "hand", "racket", "mbti", "age_group")
+
+def roster_index_invalidate():
+    st.session_state["_roster_rev"] = st.session_state.get("_roster_rev", 0) + 1
+
+def build_roster_index(roster):
+    names = [p.get("name") for p in roster]
+    index = {
+        "names": names,
+        "ids": {name: i for i, name in enumerate(names)},
+        "members": frozenset(names),
+        "by_name": {p.get("name"): p for p in roster},
+        "ntrp": np.array([get_ntrp_value(p) for p in roster], dtype=float),
+    }
+    for attr in ROSTER_INDEX_ATTRS:
+        index[attr] = np.array([p.get(attr) for p in roster], dtype=object)
+    return index
+
+def roster_index(roster):
+    key = (len(roster), st.session_state.get("_roster_rev", 0))
+    cached = st.session_state.get("_roster_index")
+    if cached is None or cached[0] is not roster or cached[1] != key:
+        cached = (roster, key, build_roster_index(roster))
+        st.session_state["_roster_index"] = cached
+    return cached[2]
+
+
 # ---------------------------------------------------------
 # 게스트 판별 / 통계용 게스트 묶음 이름
 # ---------------------------------------------------------
 def is_guest_name(name, roster):
-    member_set = {p.get("name") for p in roster}
-    return name not in member_set
+    return name not in roster_index(roster)["members"]
 
 
 def guest_bucket(name, roster):
@@ -2518,8 +5278,14 @@ st.markdown(MOBILE_CSS, unsafe_allow_html=True)
 
 if "roster" not in st.session_state:
     st.session_state.roster = load_players()
+    persist_remember_loaded(players=st.session_state.roster)
 if "sessions" not in st.session_state:
-    st.session_state.sessions = load_sessions()
+    # 이번 시즌만 먼저 읽고, 예전 시즌은 필요할 때 ensure_sessions_loaded 로
+    st.session_state.sessions, st.session_state.sessions_order = load_sessions_lazy()
+    st.session_state.sessions_unloaded = [
+        d for d in st.session_state.sessions_order if d not in st.session_state.sessions
+    ]
+    persist_remember_loaded(sessions=st.session_state.sessions)
 
 if "current_order" not in st.session_state:
     st.session_state.current_order = []
@@ -3295,220 +6061,195 @@ def is_mixed_team(team, meta):
     return ("남" in genders) and ("여" in genders) and (genders.count("남") == 1) and (genders.count("여") == 1)
 
 
-def mixed_violation_count(schedule, meta):
-    bad = 0
-    for gt, t1, t2, court in schedule:
-        # 복식에서만 의미 있음
-        if len(t1) == 2 and len(t2) == 2:
-            if not is_mixed_team(t1, meta):
-                bad += 1
-            if not is_mixed_team(t2, meta):
-                bad += 1
-    return bad
-
-
 # ---------------------------------------------------------
-# ✅ 핵심 스코어 함수
+# ✅ 대진 다듬기 (로컬 서치 / 담금질) → schedule_opt.py
+#   - 프로세스 풀 작업자가 앱 스크립트 없이 import 할 수 있게 별도 모듈로 둠
 # ---------------------------------------------------------
-def score_schedule(
-    schedule,
-    players,
-    target_games,
-    min_guard,
-    meta,
-    mode_label=None,
-):
-    """
-    점수는 '클수록 좋음'
-    """
-
-    if not schedule:
-        return -10**9
-
-    counts = count_games_by_player(schedule)
+from schedule_opt import SCHEDULE_OPT_BUDGET_SEC, optimize_schedule
 
-    # 참가자 중 누락된 사람이 있으면 0으로 처리
-    for p in players:
-        counts.setdefault(p, 0)
 
-    values = [counts[p] for p in players]
-    min_cnt = min(values)
-    max_cnt = max(values)
-    spread = max_cnt - min_cnt
+# ---------------------------------------------------------
+# ✅ 대진 다듬기 병렬 멀티 스타트 (프로세스 풀)
+#   - 같은 그리디 대진에서 시드만 다르게 여러 코어가 동시에 담금질
+#     (시드 = 기준 시드 × 1000 + 작업 번호 → 같은 기준 시드면 같은 출발)
+#   - 0번 작업은 스크립트 스레드에서 직접 돌림 → 풀이 없거나 깨져도 결과는 나옴
+#   - 각 작업은 스스로 시간 예산에서 멈추고, 예산 + 여유 시간 안에 안 끝난 작업은 버림
+#   - 풀은 forkserver(없으면 spawn)로 만듦 (서버 프로세스 공용 1개)
+#     · 스레드 많은 서버 프로세스를 fork 하면 잠긴 락째로 복사돼 멈출 수 있음
+#     · 작업자는 schedule_opt 모듈만 import (앱 스크립트는 다시 안 돌림)
+# ---------------------------------------------------------
+SCHEDULE_OPT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+SCHEDULE_OPT_GRACE_SEC = 0.5
 
-    # ---------------------------
-    # 1) ✅ 최소 보장 점수
-    # ---------------------------
-    below = sum(1 for v in values if v < min_guard)
-    # 최소 보장 미달은 아주 강하게 패널티
-    guard_score = -1000 * below
 
-    # ---------------------------
-    # 2) ✅ 저게임 수 우선 가중치
-    #    - 최소값이 높을수록 보너스
-    #    - 편차가 커질수록 패널티
-    # ---------------------------
-    low_games_priority = (min_cnt * 60) - (spread * 25)
+@st.cache_resource
+def _schedule_opt_pool():
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
 
-    # ---------------------------
-    # 3) ✅ 목표치 근접도(부드러운 보정)
-    # ---------------------------
-    # target에 가까울수록 좋게. (너무 과한 벌점은 금지)
-    dist_sum = sum(abs(v - target_games) for v in values)
-    target_score = -6 * dist_sum
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    if ctx.get_start_method() == "forkserver":
+        ctx.set_forkserver_preload(["schedule_opt"])
+    return ProcessPoolExecutor(max_workers=SCHEDULE_OPT_WORKERS, mp_context=ctx)
 
-    # ---------------------------
-    # 4) ✅ 혼합복식 위반 패널티
-    # ---------------------------
-    mixed_score = 0
-    if mode_label == "혼합복식 (남+여 짝)":
-        bad = mixed_violation_count(schedule, meta)
-        # 팀 단위 위반이므로 상당히 크게 때림
-        mixed_score = -180 * bad
 
-    # ---------------------------
-    # ✅ 전체 합
-    # ---------------------------
-    total = guard_score + low_games_priority + target_score + mixed_score
-    return total
+def _schedule_opt_pool_reset(pool):
+    """깨진 풀은 작업자를 정리하고 버림 → 다음 호출 때 새로 만듦"""
+    try:
+        pool.shutdown(wait=False, cancel_futures=True)
+    except Exception:
+        pass
+    _schedule_opt_pool.clear()
 
 
-# ---------------------------------------------------------
-# ✅ 단일 풀 탐색 버전
-# ---------------------------------------------------------
-def try_build_best_schedule(
+def optimize_schedule_parallel(
+    schedule,
     players,
-    build_fn,
-    target_games,
-    min_guard,
-    tries=80,
+    court_count,
     meta=None,
     mode_label=None,
+    use_ntrp=False,
+    group_only=False,
+    time_budget=SCHEDULE_OPT_BUDGET_SEC,
+    seed=None,
+    workers=None,
 ):
-    """
-    build_fn은 'schedule을 반환하는 함수'
-    - 이 함수 내부에서 '각 try마다 후보를 만들고'
-      score_schedule로 최고점을 고름
-    """
-    meta = meta or {}
-
-    best_schedule = []
-    best_score = -10**9
-    best_ok = False
-
-    for _ in range(tries):
-        cand = build_fn()
-        sc = score_schedule(
-            cand,
-            players=players,
-            target_games=target_games,
-            min_guard=min_guard,
-            meta=meta,
-            mode_label=mode_label,
-        )
+    """optimize_schedule 를 여러 시드로 동시에 돌려 비용이 가장 낮은 대진을 반환"""
+    from concurrent.futures import wait
+
+    workers = SCHEDULE_OPT_WORKERS if workers is None else max(1, int(workers))
+    if seed is None:
+        seed = random.randrange(1 << 30)
+    kwargs = dict(
+        players=list(players),
+        court_count=court_count,
+        meta={p: meta.get(p, {}) for t in ([players] + [g[1] + g[2] for g in schedule]) for p in t} if meta else {},
+        mode_label=mode_label,
+        use_ntrp=use_ntrp,
+        group_only=group_only,
+        time_budget=time_budget,
+        with_cost=True,
+    )
 
-        if sc > best_score:
-            best_score = sc
-            best_schedule = cand
-            best_ok = True
+    futures = []
+    pool = _schedule_opt_pool() if (workers > 1 and schedule) else None
+    if pool is not None:
+        try:
+            for k in range(1, workers):
+                futures.append(pool.submit(optimize_schedule, schedule, seed=seed * 1000 + k, **kwargs))
+        except Exception:
+            _schedule_opt_pool_reset(pool)
+            futures = []
 
-    # 최소 보장 만족 여부 재확인(표시용)
-    ok_min_guard = True
-    if best_schedule:
-        counts = count_games_by_player(best_schedule)
-        for p in players:
-            if counts.get(p, 0) < min_guard:
-                ok_min_guard = False
-                break
-    else:
-        ok_min_guard = False
+    best, best_cost = optimize_schedule(schedule, seed=seed * 1000, **kwargs)
 
-    return best_schedule, ok_min_guard
+    if futures:
+        done, not_done = wait(futures, timeout=SCHEDULE_OPT_GRACE_SEC)
+        for f in not_done:
+            f.cancel()
+        broken = False
+        for f in done:
+            try:
+                cand, cost = f.result()
+            except Exception:
+                broken = True
+                continue
+            if cost < best_cost:
+                best, best_cost = cand, cost
+        if broken:
+            _schedule_opt_pool_reset(pool)  # 깨진 풀은 다음에 새로 만듦
+    return best
 
 
 # ---------------------------------------------------------
-# ✅ A/B조 분리 + "한쪽만 손해" 완화 버전
+# ✅ 애니타임 대진 다듬기 (백그라운드 스레드)
+#   - 생성 직후의 그리디 대진을 백그라운드에서 계속 다듬고
+#     지금까지 최고 대진/지표를 job 에 주기적으로 올려둠
+#   - 화면은 job 스냅샷만 읽음 → 중간에 "채택"하면 stop 신호로 바로 멈춤
+#   - job 은 세션마다 1개 (st.session_state["_schedule_job"])
 # ---------------------------------------------------------
-def try_build_best_schedule_grouped(
-    group_players,
-    build_fn_by_group,
-    target_games,
-    min_guard,
-    tries=60,
-    meta=None,
-    mode_label=None,
-):
-    """
-    group_players = {"A조":[...], "B조":[...]}
-    build_fn_by_group = {"A조": fnA, "B조": fnB}
-
-    - 매 try마다 A/B 각각 후보를 만들고
-    - 조별 점수 + '조 간 불균형 패널티' 로 최종 선택
-    """
-    meta = meta or {}
+SCHEDULE_ANYTIME_BUDGET_SEC = 10.0
+SCHEDULE_ANYTIME_PUBLISH_SEC = 0.3
 
-    best_schedule = []
-    best_score = -10**9
-
-    for _ in range(tries):
-        schedules_each = {}
-        scores_each = {}
-        ok_each = {}
-
-        # 1) 조별 후보 생성 + 조별 점수
-        for grp_label, plist in group_players.items():
-            fn = build_fn_by_group.get(grp_label)
-            if not fn or not plist:
-                schedules_each[grp_label] = []
-                scores_each[grp_label] = -10**9
-                ok_each[grp_label] = False
-                continue
 
-            cand = fn()
-            sc = score_schedule(
-                cand,
-                players=plist,
-                target_games=target_games,
-                min_guard=min_guard,
-                meta=meta,
-                mode_label=mode_label,
-            )
+def schedule_metrics(schedule, players, court_count):
+    """대진 품질 지표: 경기수 편차, 파트너/상대 중복, 연속 라운드 출전"""
+    court_count = max(1, int(court_count))
+    counts = count_games_by_player(schedule)
+    values = [counts.get(p, 0) for p in players] or [0]
+    partner = defaultdict(int)
+    opponent = defaultdict(int)
+    rounds = defaultdict(set)
+    for i, (_, t1, t2, _) in enumerate(schedule):
+        for team in (t1, t2):
+            if len(team) == 2:
+                partner[tuple(sorted(team))] += 1
+        for x in t1:
+            for y in t2:
+                opponent[tuple(sorted((x, y)))] += 1
+        rounds[i // court_count].update(list(t1) + list(t2))
+    back2back = sum(len(rounds[r] & rounds.get(r + 1, set())) for r in list(rounds))
+    return {
+        "spread": max(values) - min(values),
+        "partner_repeat": sum(c - 1 for c in partner.values() if c > 1),
+        "opponent_repeat": sum(c - 1 for c in opponent.values() if c > 1),
+        "back2back": back2back,
+    }
 
-            schedules_each[grp_label] = cand
-            scores_each[grp_label] = sc
 
-            # 최소 보장 만족 빠른 체크
-            counts = count_games_by_player(cand) if cand else {}
-            ok_each[grp_label] = all(counts.get(p, 0) >= min_guard for p in plist)
+def schedule_job_start(schedule, players, court_count, time_budget=SCHEDULE_ANYTIME_BUDGET_SEC, **opt_kwargs):
+    """백그라운드 다듬기 시작 → job(dict) 반환"""
+    job = {
+        "lock": threading.Lock(),
+        "stop": threading.Event(),
+        "players": list(players),
+        "court_count": int(court_count),
+        "budget": float(time_budget),
+        "best": schedule,
+        "cost": float("inf"),
+        "iters": 0,
+        "elapsed": 0.0,
+        "done": False,
+        "error": None,
+    }
 
-        # 2) 조 점수 합산 + "한쪽만 크게 손해" 패널티
-        score_A = scores_each.get("A조", 0)
-        score_B = scores_each.get("B조", 0)
+    def publish(best, cost, iters, elapsed):
+        with job["lock"]:
+            job.update(best=best, cost=cost, iters=iters, elapsed=elapsed)
 
-        imbalance_penalty = -0.25 * abs(score_A - score_B)
+    def run():
+        try:
+            optimize_schedule(
+                schedule,
+                players,
+                court_count,
+                time_budget=time_budget,
+                progress=publish,
+                should_stop=job["stop"].is_set,
+                progress_every=SCHEDULE_ANYTIME_PUBLISH_SEC,
+                **opt_kwargs,
+            )
+        except Exception as e:
+            job["error"] = str(e)
+        finally:
+            with job["lock"]:
+                job["done"] = True
 
-        combined_score = score_A + score_B + imbalance_penalty
+    th = threading.Thread(target=run, name="msa-schedule-anytime", daemon=True)
+    job["thread"] = th
+    th.start()
+    return job
 
-        # 3) 합쳐서 선택
-        combined_schedule = []
-        for grp_label in ["A조", "B조"]:
-            combined_schedule.extend(schedules_each.get(grp_label, []))
 
-        if combined_score > best_score:
-            best_score = combined_score
-            best_schedule = combined_schedule
+def schedule_job_snapshot(job):
+    """job 의 지금까지 최고 대진/진행 상황 사본"""
+    with job["lock"]:
+        return {k: job[k] for k in ("best", "cost", "iters", "elapsed", "done", "error")}
 
-    # 최종 최소 보장 만족 여부(표시용)
-    ok_min_guard = True
-    for grp_label, plist in group_players.items():
-        if not plist:
-            continue
-        counts = count_games_by_player(best_schedule)
-        if any(counts.get(p, 0) < min_guard for p in plist):
-            ok_min_guard = False
-            break
 
-    return best_schedule, ok_min_guard
+def schedule_job_stop(job):
+    job["stop"].set()
 
 
 def _ui_to_doubles_mode(mode_label: str) -> str:
@@ -4603,7 +7344,7 @@ with tab2:
 
     if (gtype == "복식") and is_aa_mode and (not is_manual_mode):
         st.info(
-            "한울 AA 방식은 5~16명에서 사용하는 고정 패턴입니다.\n"
+            "한울 AA 방식은 5~16명에서 사용하는 고정 패턴입니다. (그 밖의 4~32명은 패턴 라이브러리 사용)\n"
             "- 항상 복식 전용, 개인당 4게임 고정입니다.\n"
             "- NTRP / 조별 매칭 / 혼복 옵션은 적용되지 않습니다.\n"
             "- 사용 코트 수는 현재 값으로 고정됩니다."
@@ -4798,6 +7539,13 @@ with tab2:
     st.markdown("---")
     st.subheader("5. 대진표 생성 / 미리보기")
 
+    anytime_on = st.checkbox(
+        "⏱️ 생성 후 계속 다듬기 (진행 상황을 보면서 마음에 들면 바로 채택)",
+        key="anytime_mode",
+        disabled=is_manual_mode,
+        help=f"최대 {int(SCHEDULE_ANYTIME_BUDGET_SEC)}초 동안 파트너/상대 중복·경기수 편차·연속 출전을 줄여 나가. 팀별/한울 AA 방식에서는 사용되지 않습니다.",
+    )
+
     col_gen, col_save = st.columns(2)
     with col_gen:
         st.markdown('<div class="main-primary-btn">', unsafe_allow_html=True)
@@ -4808,7 +7556,11 @@ with tab2:
         save_clicked = st.button("저장하기", use_container_width=True, key="save_btn")
         st.markdown("</div>", unsafe_allow_html=True)
 
+    # ✅ 마지막으로 만든 대진이 (전부) 패턴 라이브러리 대진인지 (애니타임 다듬기 건너뛰기용)
+    schedule_from_pattern = {"on": False}
+
     def build_best_auto_schedule():
+        schedule_from_pattern["on"] = False
 
         if not players_selected:
             return []
@@ -4842,6 +7594,40 @@ with tab2:
 
         mode_name = mode_label if gtype == "복식" else singles_mode
 
+        # ✅ 조건 없는 랜덤 복식 + 개인당 경기 수 기준이면 패턴 라이브러리 우선 (표 찾기 + 순서 섞기)
+        #    - 모두가 정확히 같은 경기 수가 되는 경우(인원×경기수가 4의 배수)만
+        use_pattern = (
+            gtype == "복식"
+            and mode_name == "랜덤 복식"
+            and not use_ntrp
+            and not group_only
+            and auto_basis == "개인당 경기 수 기준"
+        )
+
+        def pattern_ready(players_group, cc):
+            return (
+                use_pattern
+                and (len(players_group) * int(target_games)) % 4 == 0
+                and schedule_pattern_lookup(len(players_group), target_games, cc) is not None
+            )
+
+        def polish(sched, players_group, cc, budget=SCHEDULE_OPT_BUDGET_SEC):
+            # 그리디 결과를 로컬 서치로 다듬기 (파트너/상대 중복, 경기수 편차, 연속 출전)
+            #   - 여유 코어가 있으면 시드만 바꿔 동시에 돌리고 제일 좋은 것 채택
+            #   - 패턴 라이브러리 대진은 이미 다듬어진 것이라 그대로
+            if pattern_ready(players_group, cc):
+                return sched
+            return optimize_schedule_parallel(
+                sched,
+                players_group,
+                int(cc),
+                meta=roster_by_name,
+                mode_label=mode_name,
+                use_ntrp=bool(use_ntrp),
+                group_only=bool(group_only),
+                time_budget=budget,
+            )
+
         def build_group(players_group, cc):
             if len(players_group) < (4 if gtype == "복식" else 2):
                 return []
@@ -4864,6 +7650,9 @@ with tab2:
                         roster_by_name=roster_by_name,
                     )
 
+                if pattern_ready(players_group, cc):
+                    return build_pattern_schedule(players_group, int(target_games), int(cc))
+
                 return build_doubles_schedule(
                     players=players_group,
                     max_games=int(target_games),
@@ -4911,42 +7700,28 @@ with tab2:
             if ca > 0 and cb > 0:
                 players_A, players_B, _ = _split_players_ab(players_selected, roster_by_name)
 
-                tries = 80
-                for _ in range(tries):
-                    sched_A = build_group(players_A, ca)
-                    sched_B = build_group(players_B, cb)
+                sched_A = build_group(players_A, ca)
+                sched_B = build_group(players_B, cb)
 
-                    if sched_A and sched_B:
-                        sched_A = _remap_courts(sched_A, courts_A)
-                        sched_B = _remap_courts(sched_B, courts_B)
+                if sched_A and sched_B:
+                    sched_A = _remap_courts(polish(sched_A, players_A, ca, SCHEDULE_OPT_BUDGET_SEC / 2), courts_A)
+                    sched_B = _remap_courts(polish(sched_B, players_B, cb, SCHEDULE_OPT_BUDGET_SEC / 2), courts_B)
 
-                        if auto_basis == "총 게임 수(라운드 수) 기준":
-                            merged = _interleave_by_round(sched_A, sched_B, ca, cb, total_rounds=int(total_rounds))
-                        else:
-                            merged = _interleave_by_round(sched_A, sched_B, ca, cb, total_rounds=None)
-
-                        if merged:
-                            return merged
-
-            # 폴백: 조별 분리인데 한쪽 코트가 없거나 생성 실패하면 전체 생성
-            tries = 80
-            best = []
-            for _ in range(tries):
-                cand = build_group(players_selected, int(court_count))
-                if cand:
-                    best = cand
-                    break
-            return best
+                    if auto_basis == "총 게임 수(라운드 수) 기준":
+                        merged = _interleave_by_round(sched_A, sched_B, ca, cb, total_rounds=int(total_rounds))
+                    else:
+                        merged = _interleave_by_round(sched_A, sched_B, ca, cb, total_rounds=None)
+
+                    if merged:
+                        schedule_from_pattern["on"] = pattern_ready(players_A, ca) and pattern_ready(players_B, cb)
+                        return merged
+
+            # 폴백: 조별 분리인데 한쪽 코트가 없거나 생성 실패하면 아래 전체 생성으로
 
         # ✅ 전체 모드면: 기존처럼 전체 생성
-        tries = 80
-        best = []
-        for _ in range(tries):
-            cand = build_group(players_selected, int(court_count))
-            if cand:
-                best = cand
-                break
-        return best
+        cand = build_group(players_selected, int(court_count))
+        schedule_from_pattern["on"] = bool(cand) and pattern_ready(players_selected, court_count)
+        return polish(cand, players_selected, court_count) if cand else []
 
     # 생성
     if gen_clicked:
@@ -4956,17 +7731,113 @@ with tab2:
             if is_manual_mode:
                 st.success("수동 입력 대진을 미리보기로 반영했어요.")
             else:
+                prev_job = st.session_state.pop("_schedule_job", None)
+                if prev_job:
+                    schedule_job_stop(prev_job)
+
                 sched = build_best_auto_schedule()
                 st.session_state.today_schedule = sched
                 if not sched:
                     st.warning("대진 생성에 실패했어요. 옵션을 완화하거나(코트/라운드/혼복/NTRP/조별) 인원을 확인해줘.")
+                elif (
+                    anytime_on
+                    and not is_team_auto_mode
+                    and not ((gtype == "복식") and ("한울 AA" in str(mode_label)))
+                    and not schedule_from_pattern["on"]
+                ):
+                    # ✅ 애니타임: 방금 만든 대진을 출발점으로 백그라운드에서 계속 다듬기
+                    #    (조별 분리면 A/B 선수가 섞이지 않도록 조 제한을 켜고,
+                    #     홀수(A조)/짝수(B조) 코트 경기끼리만 맞바꿈, 교체도 같은 조 선수로만)
+                    #    패턴 라이브러리 대진은 이미 다듬어진 것이라 건너뜀
+                    split_ab = view_mode_for_schedule == "조별 분리 (A/B조)"
+                    lane_players = None
+                    if split_ab:
+                        players_A, players_B, _ = _split_players_ab(players_selected, roster_by_name)
+                        lane_players = {1: players_A, 0: players_B}
+                    st.session_state["_schedule_job"] = schedule_job_start(
+                        sched,
+                        players_selected,
+                        int(court_count),
+                        meta=roster_by_name,
+                        mode_label=mode_label if gtype == "복식" else singles_mode,
+                        use_ntrp=bool(use_ntrp),
+                        group_only=bool(group_only) or split_ab,
+                        court_lanes={c: c % 2 for c in range(1, int(court_count) + 1)} if split_ab else None,
+                        lane_players=lane_players,
+                    )
+
+    def _render_schedule_row(i, gt, t1, t2, court):
+        t1_badges = "".join(render_name_badge(n, roster_by_name) for n in t1)
+        t2_badges = "".join(render_name_badge(n, roster_by_name) for n in t2)
+        st.markdown(
+            f"""
+            <div class="msa-game-row">
+              <div class="msa-game-meta">#{i} · 코트 {court} · {gt}</div>
+              <div class="msa-game-line">
+                <b>{t1_badges}</b> <span style="margin:0 6px;font-weight:800;">vs</span> <b>{t2_badges}</b>
+              </div>
+            </div>
+            """,
+            unsafe_allow_html=True,
+        )
+
+    def _accept_schedule_job(best):
+        st.session_state.today_schedule = best
+        st.session_state.pop("_schedule_job", None)
+
+    def _render_schedule_job_panel():
+        """애니타임 진행 패널: 지금까지 최고 대진 + 지표 + 채택 버튼 (fragment 로 주기적 갱신)"""
+        job = st.session_state.get("_schedule_job")
+        if not job:
+            return
+        snap = schedule_job_snapshot(job)
+        best = snap["best"]
+
+        if snap["done"]:
+            # 예산을 다 썼으면 자동 채택 → 전체 화면 새로 그림
+            _accept_schedule_job(best)
+            st.rerun()
+
+        st.markdown("### ⏱️ 대진 다듬는 중 (실시간 미리보기)")
+        st.progress(min(1.0, snap["elapsed"] / max(0.1, job["budget"])))
+        m = schedule_metrics(best, job["players"], job["court_count"])
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("경기수 편차", m["spread"])
+        c2.metric("파트너 중복", m["partner_repeat"])
+        c3.metric("상대 중복", m["opponent_repeat"])
+        c4.metric("연속 출전", m["back2back"])
+        st.caption(f"{snap['iters']:,}번 시도 · {snap['elapsed']:.1f}초 / 최대 {job['budget']:.0f}초")
+
+        if st.button("👍 지금 대진으로 채택", use_container_width=True, key="schedule_job_accept"):
+            schedule_job_stop(job)
+            _accept_schedule_job(schedule_job_snapshot(job)["best"])
+            st.rerun()
+
+        for i, (gt, t1, t2, court) in enumerate(best, start=1):
+            _render_schedule_row(i, gt, t1, t2, court)
+
+    # 진행 중에 저장하면: 지금까지 최고 대진으로 채택 후 저장
+    if save_clicked and st.session_state.get("_schedule_job"):
+        schedule_job = st.session_state["_schedule_job"]
+        schedule_job_stop(schedule_job)
+        _accept_schedule_job(schedule_job_snapshot(schedule_job)["best"])
+
+    schedule_job = st.session_state.get("_schedule_job")
+    if schedule_job:
+        _fragment = getattr(st, "fragment", None)
+        if _fragment is not None:
+            _fragment(run_every=SCHEDULE_ANYTIME_PUBLISH_SEC * 2)(_render_schedule_job_panel)()
+        else:
+            # 오래된 streamlit: 자동 갱신이 없으니 아무 버튼이나 누르면 최신 결과로 다시 그림
+            _render_schedule_job_panel()
+            st.button("🔄 진행 상황 새로고침", key="schedule_job_refresh")
 
     schedule = st.session_state.get("today_schedule", [])
 
     # =========================================================
     # ✅ 미리보기
     # =========================================================
-    if schedule:
+    if schedule and not st.session_state.get("_schedule_job"):
         st.markdown("### ✅ 오늘 대진표 미리보기")
 
         if view_mode_for_schedule == "조별 분리 (A/B조)":
@@ -4976,51 +7847,15 @@ with tab2:
             if sched_A:
                 st.markdown("#### 🅰️ A조 (홀수 코트)")
                 for i, (gt, t1, t2, court) in enumerate(sched_A, start=1):
-                    t1_badges = "".join(render_name_badge(n, roster_by_name) for n in t1)
-                    t2_badges = "".join(render_name_badge(n, roster_by_name) for n in t2)
-                    st.markdown(
-                        f"""
-                        <div class="msa-game-row">
-                          <div class="msa-game-meta">#{i} · 코트 {court} · {gt}</div>
-                          <div class="msa-game-line">
-                            <b>{t1_badges}</b> <span style="margin:0 6px;font-weight:800;">vs</span> <b>{t2_badges}</b>
-                          </div>
-                        </div>
-                        """,
-                        unsafe_allow_html=True,
-                    )
+                    _render_schedule_row(i, gt, t1, t2, court)
 
             if sched_B:
                 st.markdown("#### 🅱️ B조 (짝수 코트)")
                 for i, (gt, t1, t2, court) in enumerate(sched_B, start=1):
-                    t1_badges = "".join(render_name_badge(n, roster_by_name) for n in t1)
-                    t2_badges = "".join(render_name_badge(n, roster_by_name) for n in t2)
-                    st.markdown(
-                        f"""
-                        <div class="msa-game-row">
-                          <div class="msa-game-meta">#{i} · 코트 {court} · {gt}</div>
-                          <div class="msa-game-line">
-                            <b>{t1_badges}</b> <span style="margin:0 6px;font-weight:800;">vs</span> <b>{t2_badges}</b>
-                          </div>
-                        </div>
-                        """,
-                        unsafe_allow_html=True,
-                    )
+                    _render_schedule_row(i, gt, t1, t2, court)
         else:
             for i, (gt, t1, t2, court) in enumerate(schedule, start=1):
-                t1_badges = "".join(render_name_badge(n, roster_by_name) for n in t1)
-                t2_badges = "".join(render_name_badge(n, roster_by_name) for n in t2)
-                st.markdown(
-                    f"""
-                    <div class="msa-game-row">
-                      <div class="msa-game-meta">#{i} · 코트 {court} · {gt}</div>
-                      <div class="msa-game-line">
-                        <b>{t1_badges}</b> <span style="margin:0 6px;font-weight:800;">vs</span> <b>{t2_badges}</b>
-                      </div>
-                    </div>
-                    """,
-                    unsafe_allow_html=True,
-                )
+                _render_schedule_row(i, gt, t1, t2, court)
 
         st.markdown("### 👤 인당 경기수")
         cnt = count_player_games(schedule)
@@ -5039,6 +7874,7 @@ with tab2:
             st.warning("저장할 대진이 없습니다. 먼저 대진표를 생성해 주세요.")
         else:
             sessions = st.session_state.sessions
+            ensure_sessions_loaded(sessions, dates=[save_date_str])  # 예전 시즌 날짜면 먼저 읽어 옴
             day_data = sessions.get(save_date_str, {})
 
             if "results" not in day_data or not isinstance(day_data.get("results"), dict):
@@ -5072,7 +7908,7 @@ with tab3:
         st.info("저장된 경기 기록이 없습니다.")
     else:
         # 날짜 선택 (최근 날짜가 위로 오도록 정렬)
-        all_keys = list(sessions.keys())
+        all_keys = session_date_keys(sessions)
 
         # "전체" 키가 있을 수도 있으니 분리
         has_total = "전체" in all_keys
@@ -5091,6 +7927,7 @@ with tab3:
             default_index = 0 if date_keys else 0
 
         sel_date = st.selectbox("날짜 선택", dates, index=default_index)
+        ensure_sessions_loaded(sessions, dates=[sel_date])  # 예전 시즌 날짜면 이때 읽음
 
 
         day_data = sessions.get(sel_date, {})
@@ -5670,6 +8507,15 @@ with tab3:
             st.session_state.sessions = sessions
             save_sessions(sessions)
 
+            # ☁️ 업로드 상태 (실제 Drive 업로드는 백그라운드에서 모아서 처리)
+            _ps = persist_status()
+            if _ps["last_error"]:
+                st.caption(f"⚠️ 저장 재시도 중 ({_ps['attempt']}회 실패) · {_ps['last_error']}")
+            elif _ps["pending"]:
+                st.caption("⏳ 저장 대기 중…")
+            elif _ps["last_ok_ts"]:
+                st.caption(f"☁️ 마지막 저장 {time.strftime('%H:%M:%S', time.localtime(_ps['last_ok_ts']))}")
+
             # -----------------------------
             # 3) 실수 방지 체크 (5:5 무승부는 제외)
             # -----------------------------
@@ -6471,7 +9317,7 @@ with tab4:
             range_mode = st.radio("기간 선택", ["전체 시즌", "월별"], horizontal=True)
             month_key = None
             if range_mode == "월별":
-                months = sorted({d[:7] for d in sessions.keys()})
+                months = sorted({d[:7] for d in session_date_keys(sessions)})
                 if months:
                     sel_month = st.selectbox(
                         "월 선택 (YYYY-MM)",
@@ -6480,150 +9326,43 @@ with tab4:
                         key="player_stats_month_select",
                     )
                     month_key = sel_month
+                    ensure_sessions_loaded(sessions, seasons=[session_season(sel_month)])
+            elif sessions_unloaded_dates():
+                # 탭은 매번 다 그려지므로 예전 시즌은 버튼을 눌렀을 때만 읽음
+                old_seasons = sorted({session_season(d) for d in sessions_unloaded_dates()} - {None})
+                st.caption(f"📂 지난 시즌({', '.join(old_seasons)}) 기록은 아직 불러오지 않았습니다.")
+                if st.button("지난 시즌 기록 불러오기", key="load_old_seasons_btn"):
+                    ensure_sessions_loaded(sessions, everything=True)
+                    st.rerun()
+
+            # ✅ 지난 시즌을 아직 안 읽었으면 "전체" 값(요약/연승/레이팅)은 읽은 시즌만의 값
+            #    → 다 불러오기 전까지는 불러온 시즌 기준이라고 표시
+            partial_scope = month_key is None and bool(sessions_unloaded_dates())
+            scope_label = "불러온 시즌" if partial_scope else "전체"
 
             # -------------------------------
-            # 통계 누적용 변수
+            # 통계: 선수×월 인덱스에서 조회 (전체 경기 순회 X)
             # -------------------------------
-            rec = {
-                "G": 0, "W": 0, "D": 0, "L": 0, "points": 0,
-                "score_for": 0, "score_against": 0
-            }
+            stats = player_stats_lookup(sessions, sel_player, month_key)
+            rec = stats["rec"]
 
             # ✅ 이 선수가 경기를 한 날짜(점수 있는 경기 기준)
-            player_days = set()
-
-            vs_opponent = defaultdict(lambda: {"G": 0, "W": 0, "D": 0, "L": 0})
-            with_partner = defaultdict(lambda: {"G": 0, "W": 0, "D": 0, "L": 0})
-            by_court_type = defaultdict(lambda: {"G": 0, "W": 0, "D": 0, "L": 0})
-            by_side = defaultdict(lambda: {"G": 0, "W": 0, "D": 0, "L": 0})
-            by_racket = defaultdict(lambda: {"G": 0, "W": 0, "D": 0, "L": 0})
-            by_ntrp = defaultdict(lambda: {"G": 0, "W": 0, "D": 0, "L": 0})
-            by_gender = defaultdict(lambda: {"G": 0, "W": 0, "D": 0, "L": 0})
-            by_hand = defaultdict(lambda: {"G": 0, "W": 0, "D": 0, "L": 0})
-            by_mbti = defaultdict(lambda: {"G": 0, "W": 0, "D": 0, "L": 0})
-
-            # -------------------------------
-            # 경기 순회
-            # -------------------------------
-            for d, idx, g in iter_games(sessions, include_special=False):
-                if month_key and not d.startswith(month_key):
-                    continue
-
-                t1, t2 = g["t1"], g["t2"]
-                s1, s2 = g["score1"], g["score2"]
-                r = calc_result(s1, s2)
-                if r is None:
-                    continue
-
-                in_t1 = sel_player in t1
-                in_t2 = sel_player in t2
-                if not (in_t1 or in_t2):
-                    continue
-
-                # ✅ 점수 있는 경기에서만 '출석일'로 카운트
-                player_days.add(d)
+            player_days = stats["days"]
 
-                rec["G"] += 1
-                if in_t1:
-                    my_score, opp_score = s1, s2
-                else:
-                    my_score, opp_score = s2, s1
-
-                rec["score_for"] += my_score if my_score is not None else 0
-                rec["score_against"] += opp_score if opp_score is not None else 0
-
-                # 결과(내 기준)
-                if (in_t1 and r == "W") or (in_t2 and r == "L"):
-                    rec["W"] += 1
-                    rec["points"] += WIN_POINT
-                    res_self = "W"
-                elif (in_t1 and r == "L") or (in_t2 and r == "W"):
-                    rec["L"] += 1
-                    rec["points"] += LOSE_POINT
-                    res_self = "L"
-                else:
-                    rec["D"] += 1
-                    rec["points"] += DRAW_POINT
-                    res_self = "D"
-
-                # 코트 타입별
-                court_type = g.get("court_type", "모름")
-                by_court_type[court_type]["G"] += 1
-                by_court_type[court_type][res_self] += 1
-
-                # 코트 사이드(포/백) 통계
-                sides = g.get("sides", {})
-                side_raw = sides.get(sel_player)
-
-                if side_raw:
-                    s = str(side_raw)
-
-                    # 모름이면 통계에서 제외
-                    if "모름" in s:
-                        pass
-                    else:
-                        if ("포" in s) or ("듀스" in s):
-                            side_key = "포(듀스)"
-                        elif ("백" in s) or ("애드" in s):
-                            side_key = "백(애드)"
-                        else:
-                            side_key = s
-
-                        by_side[side_key]["G"] += 1
-                        by_side[side_key][res_self] += 1
+            vs_opponent = stats["vs_opponent"]
+            with_partner = stats["with_partner"]
+            by_court_type = stats["by_court_type"]
+            by_side = stats["by_side"]
 
-                # 파트너/상대
-                if in_t1:
-                    partners = [x for x in t1 if x != sel_player]
-                    opponents = t2
-                else:
-                    partners = [x for x in t2 if x != sel_player]
-                    opponents = t1
-
-                for op in opponents:
-                    vs_opponent[op]["G"] += 1
-                    vs_opponent[op][res_self] += 1
-                for pt in partners:
-                    with_partner[pt]["G"] += 1
-                    with_partner[pt][res_self] += 1
-
-                # 상대의 메타(라켓/NTRP/성별/주손/MBTI)로 분류
-                for person in opponents:
-                    m = roster_by_name.get(person, {})
-
-                    # 라켓: "모름" 은 통계에서 제외
-                    racket = m.get("racket", "모름")
-                    if racket != "모름":
-                        by_racket[racket]["G"] += 1
-                        by_racket[racket][res_self] += 1
-
-                    # NTRP: "모름" 은 통계에서 제외
-                    ntrp_str = m.get("ntrp", "모름")
-                    if ntrp_str != "모름":
-                        ntrp_val = get_ntrp_value(m)
-                        ntrp_key = f"{ntrp_val:.1f}"
-                        by_ntrp[ntrp_key]["G"] += 1
-                        by_ntrp[ntrp_key][res_self] += 1
-
-                    # 성별 / 주손은 그대로 집계
-                    gender = m.get("gender", "남")
-                    by_gender[gender]["G"] += 1
-                    by_gender[gender][res_self] += 1
-
-                    hand = m.get("hand", "오른손")
-                    by_hand[hand]["G"] += 1
-                    by_hand[hand][res_self] += 1
-
-                    # MBTI: 빈 값 / "모름" 은 통계에서 제외
-                    mbti = (m.get("mbti", "") or "").strip().upper()
-                    if mbti and mbti not in ("모름",):
-                        by_mbti[mbti]["G"] += 1
-                        by_mbti[mbti][res_self] += 1
+            # 상대의 메타(라켓/NTRP/성별/주손/MBTI)로 분류
+            by_racket, by_ntrp, by_gender, by_hand, by_mbti = player_stats_by_opponent_meta(
+                vs_opponent, roster_by_name
+            )
 
             # -------------------------------
             # 요약 출력
             # -------------------------------
-            st.subheader(f"{sel_player} 요약 ({'전체' if not month_key else month_key})")
+            st.subheader(f"{sel_player} 요약 ({month_key or scope_label})")
             if rec["G"] == 0:
                 st.info("해당 기간에 경기 기록이 없습니다.")
             else:
@@ -6648,6 +9387,29 @@ with tab4:
                         f"- 하루 평균 승/무/패: {avg_w:.1f}승 / {avg_d:.1f}무 / {avg_l:.1f}패 (총 {days_cnt}일 기준)"
                     )
 
+            # 🔥 연승 / 무패 (전체 기록 기준, 월이 바뀌어도 이어짐)
+            streaks = player_streaks(sessions, sel_player)
+            if streaks["best"] or streaks["best_unbeaten"]:
+                st.write(
+                    f"- 연승: 현재 {streaks['current']}연승 (최다 {streaks['best']}연승) · "
+                    f"무패: 현재 {streaks['current_unbeaten']}경기 (최다 {streaks['best_unbeaten']}경기)"
+                    + (" · 불러온 시즌 기준" if sessions_unloaded_dates() else "")
+                )
+
+            # 📈 레이팅 변화 (전체 기록 기준, 저장된 레이팅 상태에서 조회)
+            history = rating_history(sessions, sel_player)
+            if history:
+                best = max(r for _, r in history)
+                st.write(
+                    f"- 레이팅: {history[-1][1]:.0f} (최고 {best:.0f}, 기준 {RATING_BASE:.0f})"
+                    + (" · 불러온 시즌 기준" if sessions_unloaded_dates() else "")
+                )
+                if len(history) >= 2:
+                    df_rating = pd.DataFrame(history, columns=["날짜", "레이팅"])
+                    fig = px.line(df_rating, x="날짜", y="레이팅", markers=True)
+                    fig.update_layout(margin=dict(t=10, b=10, l=10, r=10), height=260)
+                    st.plotly_chart(fig, use_container_width=True)
+
             st.markdown("---")
             cL, cR = st.columns(2)
 
@@ -6795,20 +9557,30 @@ with tab5:
         # ---------------------------------------------------------
         # 0) 월 선택
         # ---------------------------------------------------------
-        months = sorted({d[:7] for d in sessions.keys() if d != "전체"})
+        months = sorted({d[:7] for d in session_date_keys(sessions) if d != "전체"})
         if not months:
             st.info("월별로 표시할 기록이 없습니다.")
         else:
             sel_month = st.selectbox("월 선택 (YYYY-MM)", months, index=len(months) - 1)
+            ensure_sessions_loaded(sessions, seasons=[session_season(sel_month)])  # 예전 시즌 달이면 이때 읽음
+
+            # ✅ 레이팅/연승왕/최근 기간 순위는 앞선 기록에 이어지는 값
+            #    → 지난 시즌을 안 읽었으면 "불러온 시즌 기준" 이라고 표시 (탭은 매번 다 그려지므로 읽기는 버튼으로)
+            earlier_unloaded = sessions_unloaded_before(sel_month)
+            if earlier_unloaded:
+                old_seasons = sorted({session_season(d) for d in earlier_unloaded})
+                st.caption(
+                    f"📂 지난 시즌({', '.join(old_seasons)}) 기록은 아직 불러오지 않았습니다. "
+                    "레이팅/연승왕/최근 기간 순위는 불러온 시즌 기준입니다."
+                )
+                if st.button("지난 시즌 기록 불러오기", key="load_old_seasons_btn_tab5"):
+                    ensure_sessions_loaded(sessions, everything=True)
+                    st.rerun()
 
             # ---------------------------------------------------------
             # 1) 이 달의 게임 모으기 (스페셜 매치 제외)
             # ---------------------------------------------------------
-            month_games = []
-            for d, idx, g in iter_games(sessions, include_special=False):
-                if not d.startswith(sel_month):
-                    continue
-                month_games.append((d, idx, g))
+            month_games = stats_query(sessions, "games", month=sel_month)
 
             if not month_games:
                 st.info("이 달에 경기 기록이 없습니다.")
@@ -6847,89 +9619,24 @@ with tab5:
                 recs_all = make_recs()
                 partners_by_player = defaultdict(set)
 
-                def update_recs(target_recs, d, t1, t2, s1, s2, r):
-                    players_all = t1 + t2
-
-                    # 1) 출석/경기수(참여) — 점수 없어도 카운트
-                    for p in players_all:
-                        if is_guest_name(p, roster):
-                            continue
-                        target_recs[p]["days"].add(d)
-                        target_recs[p]["G"] += 1
-
-                    # 2) 점수 없으면 여기서 종료 (승/무/패/득실은 미반영)
-                    if r is None:
-                        return
-
-                    # 3) 득/실 (점수 있을 때만)
-                    s1_val = s1 if (s1 is not None) else 0
-                    s2_val = s2 if (s2 is not None) else 0
-
-                    for p in t1:
-                        if is_guest_name(p, roster):
-                            continue
-                        target_recs[p]["score_for"] += s1_val
-                        target_recs[p]["score_against"] += s2_val
-
-                    for p in t2:
-                        if is_guest_name(p, roster):
-                            continue
-                        target_recs[p]["score_for"] += s2_val
-                        target_recs[p]["score_against"] += s1_val
-
-                    # 4) 승/무/패 + 점수
-                    if r == "W":
-                        for p in t1:
-                            if is_guest_name(p, roster):
-                                continue
-                            target_recs[p]["W"] += 1
-                            target_recs[p]["points"] += WIN_POINT
-                        for p in t2:
-                            if is_guest_name(p, roster):
-                                continue
-                            target_recs[p]["L"] += 1
-                            target_recs[p]["points"] += LOSE_POINT
-
-                    elif r == "L":
-                        for p in t1:
-                            if is_guest_name(p, roster):
-                                continue
-                            target_recs[p]["L"] += 1
-                            target_recs[p]["points"] += LOSE_POINT
-                        for p in t2:
-                            if is_guest_name(p, roster):
-                                continue
-                            target_recs[p]["W"] += 1
-                            target_recs[p]["points"] += WIN_POINT
-
-                    else:  # "D"
-                        for p in players_all:
-                            if is_guest_name(p, roster):
-                                continue
-                            target_recs[p]["D"] += 1
-                            target_recs[p]["points"] += DRAW_POINT
-
                 # ---------------------------------------------------------
-                # 1-1) 월간 데이터 집계 (전체 기준 1회)
+                # 1-1) 월간 데이터 집계 (전체 기준 1회, 컬럼형 테이블에서 한 번에)
+                #     - 출석/경기수(참여)는 점수 없어도, 승/무/패/득실은 점수 있을 때만
+                #     - 게스트는 제외, 선수 순서는 이 달 경기에 처음 나온 순서
                 # ---------------------------------------------------------
-                for d, idx, g in month_games:
-                    t1, t2 = g["t1"], g["t2"]
-                    s1, s2 = g["score1"], g["score2"]
-                    r = calc_result(s1, s2)  # 점수 없으면 None
-
-                    # 전체 기록(참여는 항상, 결과는 점수 있을 때만)
-                    update_recs(recs_all, d, t1, t2, s1, s2, r)
-
-                    # 🤝 파트너 집계 (점수 없어도 복식이면 파트너는 만난 걸로)
-                    for team in (t1, t2):
-                        if len(team) >= 2:
-                            for i, p in enumerate(team):
-                                if is_guest_name(p, roster):
-                                    continue
-                                for j, q in enumerate(team):
-                                    if i == j:
-                                        continue
-                                    partners_by_player[p].add(guest_bucket(q, roster))
+                month_record = stats_query(sessions, "record", month=sel_month, members_only=True, roster=roster)
+                for name, r in month_record.items():
+                    rr = recs_all[name]
+                    rr["days"] = r["days"]
+                    rr["G"] = r["played"]
+                    for k in ("W", "D", "L", "points", "score_for", "score_against"):
+                        rr[k] = r[k]
+
+                # 🤝 파트너 집계 (점수 없어도 복식이면 파트너는 만난 걸로) — 파트너 행렬에서 조회
+                for p, row in pair_stats(sessions, month=sel_month)["partner"].items():
+                    if is_guest_name(p, roster):
+                        continue
+                    partners_by_player[p] = {guest_bucket(q, roster) for q, c in row.items() if c["met"] > 0}
 
                 # ---------------------------------------------------------
                 # ✅ "조별 보기"는 선수만 A/B로 분리 (집계는 동일 recs_all)
@@ -7056,12 +9763,86 @@ with tab5:
                     if not has_any:
                         st.info("A조 / B조로 나눠서 표시할 데이터가 없습니다.")
 
+                # 🏃 최근 기간 순위 (마지막 기록 날짜 기준, 누적합에서 바로)
+                with st.expander("🏃 최근 기간 순위", expanded=False):
+                    window_label = st.radio(
+                        "기간",
+                        list(ROLLING_WINDOWS),
+                        horizontal=True,
+                        key="rolling_rank_window",
+                    )
+                    window_dates, window_totals = rolling_totals(sessions, ROLLING_WINDOWS[window_label])
+                    window_rows = []
+                    for name, r in window_totals.items():
+                        if is_guest_name(name, roster):
+                            continue
+                        decided = r["W"] + r["D"] + r["L"]
+                        window_rows.append(
+                            {
+                                "이름": name,
+                                "출석일수": r["days"],
+                                "경기수": r["played"],
+                                "승": r["W"],
+                                "무": r["D"],
+                                "패": r["L"],
+                                "점수": r["points"],
+                                "승률": (r["W"] / decided * 100) if decided > 0 else 0.0,
+                            }
+                        )
+                    if not window_rows:
+                        st.info("표시할 데이터가 없습니다.")
+                    else:
+                        st.caption(
+                            f"{window_dates[0]} ~ {window_dates[-1]} · {len(window_dates)}회"
+                            + (" · 불러온 시즌 기준" if rolling_window_partial(window_dates, ROLLING_WINDOWS[window_label]) else "")
+                        )
+                        df_window = (
+                            pd.DataFrame(window_rows)
+                            .sort_values(["점수", "승률"], ascending=False)
+                            .reset_index(drop=True)
+                        )
+                        df_window.index = df_window.index + 1
+                        df_window.index.name = "순위"
+                        df_window["승률"] = df_window["승률"].map(lambda x: f"{x:.1f}%")
+                        sty_window = colorize_df_names(df_window, roster_by_name, ["이름"])
+                        st.dataframe(sty_window, use_container_width=True)
+
+                # 📈 레이팅 (월말 기준 + 이 달 변화) — 저장된 레이팅 상태에서 조회
+                rating_start = player_ratings(sessions, until=sel_month)  # 이 달 시작 전까지
+                rating_end = player_ratings(sessions, until=_month_range(sel_month)[1])
+                rating_rows = [
+                    {
+                        "이름": name,
+                        "레이팅": round(rating_end[name]),
+                        "이 달 변화": round(rating_end[name] - rating_start.get(name, RATING_BASE)),
+                    }
+                    for name, rr in recs_all.items()
+                    if rr["G"] > 0 and name in rating_end
+                ]
+                if rating_rows:
+                    rating_title = "📈 레이팅 (월말 기준" + (" · 불러온 시즌 기준)" if earlier_unloaded else ")")
+                    with st.expander(rating_title, expanded=False):
+                        df_rating = (
+                            pd.DataFrame(rating_rows)
+                            .sort_values(["레이팅", "이 달 변화"], ascending=False)
+                            .reset_index(drop=True)
+                        )
+                        df_rating.index = df_rating.index + 1
+                        df_rating.index.name = "순위"
+                        sty_rating = colorize_df_names(df_rating, roster_by_name, ["이름"])
+                        st.dataframe(sty_rating, use_container_width=True)
+
                 # =========================================================
                 # 2. 월 전체 경기 요약 (일별)
                 # =========================================================
                 st.subheader("2. 월 전체 경기 요약 (일별)")
 
-                days_sorted = sorted({d for d, idx, g in month_games})
+                # 날짜별로 한 번 묶어 두고, 날짜마다 그날 경기만 봄
+                games_by_day = defaultdict(list)
+                for d, idx, g in month_games:
+                    games_by_day[d].append((d, idx, g))
+
+                days_sorted = sorted(games_by_day)
                 for d in days_sorted:
                     st.markdown("<hr style='margin: 0.6rem 0 0.9rem 0;'>", unsafe_allow_html=True)
                     st.markdown(f"**📅 {d}**")
@@ -7069,9 +9850,7 @@ with tab5:
                     rows_all = []
                     rows_A, rows_B, rows_other = [], [], []
 
-                    for d2, idx, g in month_games:
-                        if d2 != d:
-                            continue
+                    for d2, idx, g in games_by_day[d]:
 
                         row = {
                             "게임": idx,
@@ -7124,35 +9903,16 @@ with tab5:
                     if exclude_values is None:
                         exclude_values = set()
 
-                    stats = defaultdict(lambda: {"G": 0, "W": 0})
-
-                    for d, idx, g in month_games:
-                        t1, t2 = g["t1"], g["t2"]
-                        s1, s2 = g["score1"], g["score2"]
-                        r = calc_result(s1, s2)
-                        if r is None:
-                            continue
+                    # 선수 본인 칸(점수 있는 경기)을 그 선수의 속성값으로 묶어서 더함 (게스트 제외)
+                    def attr(meta):
+                        if meta is None:
+                            return None
+                        grp = key_func(meta)
+                        return None if grp in exclude_values else grp
 
-                        players_all = t1 + t2
-
-                        for p in players_all:
-                            if is_guest_name(p, roster):
-                                continue
-                            meta = roster_by_name.get(p, {})
-                            grp = key_func(meta)
-                            if grp in exclude_values:
-                                continue
-                            stats[grp]["G"] += 1
-
-                        winners = t1 if r == "W" else (t2 if r == "L" else [])
-                        for p in winners:
-                            if is_guest_name(p, roster):
-                                continue
-                            meta = roster_by_name.get(p, {})
-                            grp = key_func(meta)
-                            if grp in exclude_values:
-                                continue
-                            stats[grp]["W"] += 1
+                    stats = stats_cube(
+                        sessions, "player", month=sel_month, attr=attr, roster_by_name=roster_by_name
+                    )
 
                     best_grps = []
                     best_rate = -1.0
@@ -7243,43 +10003,11 @@ with tab5:
                 else:
                     attendance_line = "데이터 부족"
 
-                # 🔥 연승왕 – 점수 있는 경기만으로 계산
-                streak_now = defaultdict(int)
-                streak_best = defaultdict(int)
-
-                for d, idx, g in sorted(month_games, key=lambda x: (x[0], x[1])):
-                    t1, t2 = g["t1"], g["t2"]
-                    s1, s2 = g["score1"], g["score2"]
-                    r = calc_result(s1, s2)
-                    if r is None:
-                        continue
-
-                    if r == "D":
-                        for p in t1 + t2:
-                            if is_guest_name(p, roster):
-                                continue
-                            streak_best[p] = max(streak_best[p], streak_now[p])
-                            streak_now[p] = 0
-                        continue
-
-                    winners, losers = (t1, t2) if r == "W" else (t2, t1)
-
-                    for p in winners:
-                        if is_guest_name(p, roster):
-                            continue
-                        streak_now[p] += 1
-                        streak_best[p] = max(streak_best[p], streak_now[p])
-
-                    for p in losers:
-                        if is_guest_name(p, roster):
-                            continue
-                        streak_best[p] = max(streak_best[p], streak_now[p])
-                        streak_now[p] = 0
-
-                for p, cur in streak_now.items():
-                    if is_guest_name(p, roster):
-                        continue
-                    streak_best[p] = max(streak_best[p], cur)
+                # 🔥 연승왕 – 점수 있는 경기만으로 계산 (지난달에서 이어진 연승도 포함)
+                streak_best = {
+                    p: v for p, v in month_best_streaks(sessions, sel_month).items()
+                    if not is_guest_name(p, roster)
+                }
 
                 streak_line = "데이터 부족"
                 if streak_best:
@@ -7287,6 +10015,8 @@ with tab5:
                     if max_streak >= 2:
                         winners_streak = sorted([p for p, v in streak_best.items() if v == max_streak])
                         streak_line = f"{', '.join(winners_streak)} (최대 {max_streak}연승)"
+                        if earlier_unloaded:
+                            streak_line += " · 불러온 시즌 기준"
 
                 # 🥖 제빵왕 – 상대 0점 만든 경기 수 (점수 있는 경기만)
                 baker_counter = Counter()
@@ -0,0 +1,274 @@
+# ---------------------------------------------------------
+# 복식 대진 패턴 라이브러리 생성기 (오프라인 전용)
+#   - 한울 AA 패턴(HANUL_AA_PATTERNS)을 일반화:
+#     (인원 n, 개인당 경기 수 g, 코트 수 c) 마다 "12:34" 형식 패턴을 미리 찾아 둠
+#   - 목표: 파트너 중복 없음 > 상대 고르게 > 연속 출전/긴 휴식 최소
+#   - 결과는 schedule_patterns.json.gz (app.py 가 필요할 때 읽음)
+#
+#   사용: python make_schedule_patterns.py [--max-players 32] [--max-games 10] [--max-courts 6]
+#
+#   - 라운드 = 연속한 c 경기 (앱 미리보기와 같은 기준), 라운드 안 선수 중복 없음
+#   - 경기 수 = ceil(n*g/4) → 모두 g게임 이상, 많아도 g+1게임
+#   - 코트 수는 n//4 를 넘을 수 없어서 c = min(c, n//4) 만 저장
+#   - 파트너 중복이 피할 수 있는 만큼보다 많으면 시드를 바꿔 다시 찾음 (최대 PATTERN_RETRIES 번)
+#     · 경기 수 × 2 > 가능한 짝 수 n(n-1)/2 이면 중복은 피할 수 없음 (partner_floor)
+#       예) 6명 5게임: 8경기 = 짝 16번 > 15쌍 → 최소 1번 중복
+#   - 시드가 (기준 시드, n, g, c) 로 정해져 있고 gzip 시간 기록도 0 이라
+#     다시 돌려도 바이트까지 같은 파일이 나옴
+# ---------------------------------------------------------
+import argparse
+import gzip
+import io
+import json
+import math
+import os
+import random
+import time
+
+PATTERN_CHARS = "123456789ABCDEFGHIJKLMNOPQRSTUVW"  # 1~9, A=10번째 … W=32번째
+PATTERN_VERSION = 1
+PATTERN_RETRIES = 8  # 피할 수 있는 파트너 중복이 남으면 다른 시드로 다시 찾는 횟수
+
+W_PARTNER = 100.0  # 파트너 중복 (횟수 제곱)
+W_OPP = 6.0        # 상대 중복 (횟수 제곱)
+W_B2B = 10.0       # 연속 라운드 출전
+W_IDLE = 6.0       # 너무 긴 휴식 (연속으로 쉬는 라운드 창)
+
+
+def pattern_key(n, games, courts):
+    return f"{n}-{games}-{courts}"
+
+
+def partner_floor(n, g):
+    """피할 수 없는 파트너 중복 수: 경기마다 짝 2개, 가능한 짝은 n(n-1)/2 쌍"""
+    return max(0, 2 * math.ceil(n * g / 4) - n * (n - 1) // 2)
+
+
+def initial_games(n, g, c, rng):
+    """경기수 적은 사람 → 직전 라운드 쉰 사람 순으로 라운드를 채운 출발 대진"""
+    total = math.ceil(n * g / 4)
+    counts = [0] * n
+    last = [-9] * n
+    games = []
+    r = 0
+    while len(games) < total:
+        k = min(c, total - len(games))
+        order = sorted(range(n), key=lambda p: (counts[p], last[p] == r - 1, rng.random()))
+        chosen = order[:4 * k]
+        rng.shuffle(chosen)
+        for j in range(k):
+            a, b, x, y = chosen[4 * j:4 * j + 4]
+            games.append(([a, b], [x, y]))
+        for p in chosen:
+            counts[p] += 1
+            last[p] = r
+        r += 1
+    return games
+
+
+def search_pattern(n, g, c, seed=0, iters=None):
+    """담금질로 패턴 하나 찾기 → (경기 목록, 지표)"""
+    rng = random.Random(f"{seed}-{n}-{g}-{c}")
+    games = initial_games(n, g, c, rng)
+    n_games = len(games)
+    round_of = [i // c for i in range(n_games)]
+    n_rounds = round_of[-1] + 1
+    idle_len = math.ceil(n / (4 * c)) + 1  # 이만큼 연속으로 쉬면 벌점
+
+    part = {}
+    opp = {}
+    rounds_in = [set() for _ in range(n)]
+    members = [set() for _ in range(n_rounds)]
+
+    def empty_windows(p, r):
+        """라운드 r 을 포함하는 길이 idle_len 창 중 p 가 한 번도 안 뛴 창 수"""
+        rs = rounds_in[p]
+        cnt = 0
+        for s in range(max(0, r - idle_len + 1), min(r, n_rounds - idle_len) + 1):
+            if not any((s + k) in rs for k in range(idle_len)):
+                cnt += 1
+        return cnt
+
+    def key(a, b):
+        return a * n + b if a < b else b * n + a
+
+    def take(i, sign):
+        t1, t2 = games[i]
+        r = round_of[i]
+        d = 0.0
+        for p in t1 + t2:
+            rs = rounds_in[p]
+            near = ((r - 1) in rs) + ((r + 1) in rs)
+            if sign > 0:
+                d += W_B2B * near - W_IDLE * empty_windows(p, r)
+                rs.add(r)
+                members[r].add(p)
+            else:
+                rs.discard(r)
+                members[r].discard(p)
+                d += W_IDLE * empty_windows(p, r) - W_B2B * near
+        for a, b in (t1, t2):
+            k = key(a, b)
+            v = part.get(k, 0)
+            d += W_PARTNER * ((2 * v + 1) if sign > 0 else (1 - 2 * v))
+            part[k] = v + sign
+        for x in t1:
+            for y in t2:
+                k = key(x, y)
+                v = opp.get(k, 0)
+                d += W_OPP * ((2 * v + 1) if sign > 0 else (1 - 2 * v))
+                opp[k] = v + sign
+        return d
+
+    cur = sum(take(i, +1) for i in range(n_games))
+    best = cur
+    best_games = [(list(t1), list(t2)) for t1, t2 in games]
+
+    if iters is None:
+        iters = 4000 + 800 * n_games
+    t0, t_end = 30.0, 0.05
+
+    def accept(d, temp):
+        return d <= 0 or rng.random() < math.exp(-d / temp)
+
+    for it in range(iters):
+        temp = t0 * (t_end / t0) ** (it / iters)
+        move = rng.random()
+        i = rng.randrange(n_games)
+        r = round_of[i]
+
+        if move < 0.6:
+            # 두 경기 사이 선수 맞바꾸기 (경기수는 그대로)
+            j = rng.randrange(n_games)
+            if j == i:
+                continue
+            s = round_of[j]
+            ki, kj = rng.randrange(4), rng.randrange(4)
+            ti = games[i][ki // 2]
+            tj = games[j][kj // 2]
+            x, y = ti[ki % 2], tj[kj % 2]
+            if s != r and (y in members[r] or x in members[s]):
+                continue
+            d = take(i, -1) + take(j, -1)
+            ti[ki % 2], tj[kj % 2] = y, x
+            d += take(i, +1) + take(j, +1)
+            if accept(d, temp):
+                cur += d
+            else:
+                take(i, -1)
+                take(j, -1)
+                ti[ki % 2], tj[kj % 2] = x, y
+                take(i, +1)
+                take(j, +1)
+
+        elif move < 0.8:
+            # 한 경기 안에서 파트너 바꾸기
+            old = games[i]
+            (a, b), (x, y) = old
+            new = ([a, x], [b, y]) if rng.random() < 0.5 else ([a, y], [b, x])
+            d = take(i, -1)
+            games[i] = new
+            d += take(i, +1)
+            if accept(d, temp):
+                cur += d
+            else:
+                take(i, -1)
+                games[i] = old
+                take(i, +1)
+
+        else:
+            # 다른 라운드의 두 경기 자리 교환
+            j = rng.randrange(n_games)
+            s = round_of[j]
+            if s == r:
+                continue
+            gi = set(games[i][0] + games[i][1])
+            gj = set(games[j][0] + games[j][1])
+            if (members[s] - gj) & gi or (members[r] - gi) & gj:
+                continue
+            d = take(i, -1) + take(j, -1)
+            games[i], games[j] = games[j], games[i]
+            d += take(i, +1) + take(j, +1)
+            if accept(d, temp):
+                cur += d
+            else:
+                take(i, -1)
+                take(j, -1)
+                games[i], games[j] = games[j], games[i]
+                take(i, +1)
+                take(j, +1)
+
+        if cur < best - 1e-9:
+            best = cur
+            best_games = [(list(t1), list(t2)) for t1, t2 in games]
+
+    return best_games, pattern_metrics(best_games, n, c)
+
+
+def pattern_metrics(games, n, c):
+    """파트너 중복 수 / 상대 최대 횟수 / 연속 출전 수 / 경기수 범위"""
+    part, opp, counts = {}, {}, [0] * n
+    rounds = {}
+    for i, (t1, t2) in enumerate(games):
+        for a, b in (t1, t2):
+            k = (min(a, b), max(a, b))
+            part[k] = part.get(k, 0) + 1
+        for x in t1:
+            for y in t2:
+                k = (min(x, y), max(x, y))
+                opp[k] = opp.get(k, 0) + 1
+        for p in t1 + t2:
+            counts[p] += 1
+        rounds.setdefault(i // c, set()).update(t1 + t2)
+    return {
+        "partner_repeat": sum(v - 1 for v in part.values() if v > 1),
+        "opponent_max": max(opp.values()) if opp else 0,
+        "back2back": sum(len(rounds[r] & rounds.get(r + 1, set())) for r in rounds),
+        "min_games": min(counts),
+        "max_games": max(counts),
+    }
+
+
+def encode_games(games):
+    return ",".join(
+        PATTERN_CHARS[a] + PATTERN_CHARS[b] + ":" + PATTERN_CHARS[x] + PATTERN_CHARS[y]
+        for (a, b), (x, y) in games
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description="복식 대진 패턴 라이브러리 생성")
+    ap.add_argument("--out", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedule_patterns.json.gz"))
+    ap.add_argument("--min-players", type=int, default=4)
+    ap.add_argument("--max-players", type=int, default=32)
+    ap.add_argument("--max-games", type=int, default=10)
+    ap.add_argument("--max-courts", type=int, default=6)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    max_players = min(args.max_players, len(PATTERN_CHARS))
+    patterns = {}
+    started = time.time()
+    for n in range(max(4, args.min_players), max_players + 1):
+        for courts in range(1, min(args.max_courts, n // 4) + 1):
+            for g in range(1, args.max_games + 1):
+                floor = partner_floor(n, g)
+                games, metrics = search_pattern(n, g, courts, seed=args.seed)
+                for k in range(1, PATTERN_RETRIES + 1):
+                    if metrics["partner_repeat"] <= floor:
+                        break
+                    cand, cand_metrics = search_pattern(n, g, courts, seed=f"{args.seed}r{k}")
+                    if cand_metrics["partner_repeat"] < metrics["partner_repeat"]:
+                        games, metrics = cand, cand_metrics
+                patterns[pattern_key(n, g, courts)] = dict(games=encode_games(games), **metrics)
+                print(f"{n:2d}명 {g:2d}게임 {courts}코트: {metrics}", flush=True)
+
+    data = {"version": PATTERN_VERSION, "seed": args.seed, "patterns": patterns}
+    # mtime=0: 만든 시각을 헤더에 안 남겨서 같은 입력이면 같은 파일
+    with gzip.GzipFile(args.out, "wb", mtime=0) as gz, io.TextIOWrapper(gz, encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    print(f"{len(patterns)}개 패턴 → {args.out} ({time.time() - started:.0f}초)")
+
+
+if __name__ == "__main__":
+    main()
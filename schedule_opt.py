@@ -0,0 +1,304 @@
+# ---------------------------------------------------------
+# 대진 다듬기 (로컬 서치 / 담금질)
+#   - app.py 에서 씀. streamlit 없이 import 되는 순수 파이썬 모듈이라
+#     프로세스 풀 작업자(forkserver/spawn)가 앱 스크립트 없이 이 함수만 불러 씀
+#   - 그리디로 한 번 만든 대진을 시간 예산 안에서 조금씩 고쳐 나감
+#     (처음부터 여러 번 다시 만드는 것보다 훨씬 빠르고 결과도 좋음)
+#   - 라운드 = 대진에 적힌 그대로: 앞에서부터 코트 번호가 다시 나오거나 (같은 구역에서) 작아지거나
+#     court_count 경기가 차면 다음 라운드
+#     (생성기가 중간/마지막에 코트가 모자란 짧은 라운드를 만들어도 어긋나지 않게)
+#   - 움직임:
+#     1) 교체: 경기 중 한 명을 그 라운드에 쉬는 사람으로 바꿈 (경기수 균등)
+#     2) 맞바꾸기: 두 경기 사이에서 선수 한 명씩 교환
+#     3) 파트너 바꾸기: 한 경기 안에서 팀 나누기 변경 (복식)
+#     4) 라운드 이동: 다른 라운드의 두 경기를 통째로 자리 교환
+#   - 비용(작을수록 좋음): 경기수 제곱합, 파트너/상대 중복(횟수 제곱),
+#     연속 라운드 출전, 모드 위반(혼복/동성/조별), NTRP 밸런스(옵션)
+#   - 바뀐 경기만 빼고 다시 더해서 비용 변화를 계산 → 한 번 시도가 O(경기 인원)
+# ---------------------------------------------------------
+import math
+import random
+import time
+from collections import defaultdict
+
+SCHEDULE_OPT_BUDGET_SEC = 0.5
+
+SCHEDULE_OPT_WEIGHTS = {
+    "fair": 20.0,       # 경기수 제곱합 (편차)
+    "partner": 30.0,    # 파트너 중복 (횟수 제곱)
+    "opponent": 10.0,   # 상대 중복 (횟수 제곱)
+    "back2back": 25.0,  # 연속 라운드 출전
+    "ntrp": 6.0,        # 팀 평균 NTRP 차이
+    "rule": 1000.0,     # 모드 위반 경기
+}
+
+
+def optimize_schedule(
+    schedule,
+    players,
+    court_count,
+    meta=None,
+    mode_label=None,
+    use_ntrp=False,
+    group_only=False,
+    time_budget=SCHEDULE_OPT_BUDGET_SEC,
+    seed=None,
+    with_cost=False,
+    progress=None,
+    should_stop=None,
+    progress_every=0.3,
+    court_lanes=None,
+    lane_players=None,
+):
+    """
+    대진을 시간 예산 안에서 다듬어 가장 좋은 대진을 반환 (형식/길이/코트 번호 그대로)
+    - 라운드 안 선수 중복이 이미 있는 대진(코트를 줄인 라운드 등)은 손대지 않음
+    - with_cost=True 면 (대진, 비용) 반환 (손대지 않은 대진은 비용 inf)
+    - progress(대진, 비용, 시도 수, 경과초) 를 progress_every 초마다 호출 (지금까지 최고 대진)
+    - should_stop() 이 True 면 예산 전이라도 그 자리에서 멈추고 최고 대진 반환
+    - court_lanes={코트: 구역} 을 주면 선수/경기 맞바꾸기는 같은 구역 코트끼리만
+      (조별 분리: 홀수 코트=A조, 짝수 코트=B조 가 섞이지 않게)
+    - 교체는 그 구역 선수(lane_players={구역: 선수들} + 원래 그 구역 경기에 나온 사람)만
+      (구역이 없으면 players + 대진에 나온 사람 전체)
+    """
+    meta = meta or {}
+    court_count = max(1, int(court_count))
+    if not schedule or time_budget <= 0:
+        return (schedule, float("inf")) if with_cost else schedule
+
+    W = SCHEDULE_OPT_WEIGHTS
+    rng = random.Random(seed)
+    games = [(list(t1), list(t2)) for _, t1, t2, _ in schedule]
+    lane_of = [(court_lanes or {}).get(court) for _, _, _, court in schedule]
+    round_of = []
+    r, used, last = 0, set(), {}
+    for (_, _, _, court), lane in zip(schedule, lane_of):
+        if court in used or len(used) >= court_count or court < last.get(lane, court):
+            r, used, last = r + 1, set(), {}
+        used.add(court)
+        last[lane] = court
+        round_of.append(r)
+    n_rounds = r + 1
+
+    members = [set() for _ in range(n_rounds + 2)]  # 앞뒤로 빈 라운드 1개씩(경계 처리용)
+    for i, (t1, t2) in enumerate(games):
+        for p in t1 + t2:
+            if p in members[round_of[i] + 1]:
+                return (schedule, float("inf")) if with_cost else schedule
+            members[round_of[i] + 1].add(p)
+
+    pool = list(dict.fromkeys(list(players) + [p for t1, t2 in games for p in t1 + t2]))
+    lane_pool = None
+    if court_lanes:
+        lane_pool = {lane: list((lane_players or {}).get(lane, [])) for lane in set(lane_of)}
+        for (t1, t2), lane in zip(games, lane_of):
+            lane_pool[lane].extend(t1 + t2)
+        lane_pool = {lane: list(dict.fromkeys(ps)) for lane, ps in lane_pool.items()}
+        pool = list(dict.fromkeys(p for ps in lane_pool.values() for p in ps))
+    genders = {p: meta.get(p, {}).get("gender", "남") for p in pool}
+    groups = {p: meta.get(p, {}).get("group", "미배정") for p in pool}
+    mixed = mode_label in ("혼합복식 (남+여 짝)", "혼합 단식")
+    same_sex = mode_label in ("동성복식 (남+남 / 여+여)", "동성 단식")
+
+    def ntrp_of(p):
+        v = meta.get(p, {}).get("ntrp", None)
+        try:
+            return None if v in (None, "", "모름") else float(v)
+        except Exception:
+            return None
+
+    ntrps = {p: ntrp_of(p) for p in pool}
+
+    def team_avg_ntrp(team):
+        vals = [ntrps[p] for p in team if ntrps[p] is not None]
+        return sum(vals) / len(vals) if vals else 0.0
+
+    def local_cost(t1, t2):
+        c = 0.0
+        four = t1 + t2
+        if group_only and len({groups[p] for p in four}) > 1:
+            c += W["rule"]
+        if same_sex and len({genders[p] for p in four}) > 1:
+            c += W["rule"]
+        if mixed:
+            if len(t1) == 2:
+                c += W["rule"] * sum(1 for t in (t1, t2) if genders[t[0]] == genders[t[1]])
+            elif genders[t1[0]] == genders[t2[0]]:
+                c += W["rule"]
+        if use_ntrp:
+            c += abs(team_avg_ntrp(t1) - team_avg_ntrp(t2)) * W["ntrp"]
+        return c
+
+    def pair_key(a, b):
+        return (a, b) if a < b else (b, a)
+
+    cnt = defaultdict(int)
+    part = defaultdict(int)
+    opp = defaultdict(int)
+    rounds_in = defaultdict(set)  # 선수별 출전 라운드 (members 와 같은 정보, 빠른 이웃 확인용)
+
+    def take(i, sign):
+        """경기 i 를 상태에 더하거나(+1) 빼고(-1) 비용 변화를 반환"""
+        t1, t2 = games[i]
+        r = round_of[i] + 1
+        d = 0.0
+        for p in t1 + t2:
+            c = cnt[p]
+            rs = rounds_in[p]
+            near = ((r - 1) in rs) + ((r + 1) in rs)
+            if sign > 0:
+                d += W["fair"] * (2 * c + 1) + W["back2back"] * near
+                cnt[p] = c + 1
+                rs.add(r)
+                members[r].add(p)
+            else:
+                d += W["fair"] * (1 - 2 * c) - W["back2back"] * near
+                cnt[p] = c - 1
+                rs.discard(r)
+                members[r].discard(p)
+        for team in (t1, t2):
+            if len(team) == 2:
+                k = pair_key(team[0], team[1])
+                c = part[k]
+                d += W["partner"] * ((2 * c + 1) if sign > 0 else (1 - 2 * c))
+                part[k] = c + sign
+        for x in t1:
+            for y in t2:
+                k = pair_key(x, y)
+                c = opp[k]
+                d += W["opponent"] * ((2 * c + 1) if sign > 0 else (1 - 2 * c))
+                opp[k] = c + sign
+        d += sign * local_cost(t1, t2)
+        return d
+
+    for ms in members:
+        ms.clear()
+    cur = sum(take(i, +1) for i in range(len(games)))
+    best = cur
+    best_games = [(list(t1), list(t2)) for t1, t2 in games]
+
+    doubles = len(games[0][0]) == 2
+    n_games = len(games)
+    t0, t_end = 40.0, 0.5
+    start = time.time()
+    temp = t0
+    it = 0
+
+    last_publish = start
+
+    def slot(i, k):
+        t1, t2 = games[i]
+        half = len(t1)
+        return (t1, k) if k < half else (t2, k - half)
+
+    def as_schedule(gs):
+        return [
+            (gt, list(t1), list(t2), court)
+            for (gt, _, _, court), (t1, t2) in zip(schedule, gs)
+        ]
+
+    while True:
+        it += 1
+        if it % 200 == 0:
+            now = time.time()
+            frac = (now - start) / time_budget
+            if frac >= 1.0 or (should_stop is not None and should_stop()):
+                break
+            temp = t0 * (t_end / t0) ** frac
+            if progress is not None and now - last_publish >= progress_every:
+                last_publish = now
+                progress(as_schedule(best_games), best, it, now - start)
+
+        move = rng.random()
+        i = rng.randrange(n_games)
+        r = round_of[i] + 1
+        size = len(games[i][0]) * 2
+
+        if move < 0.35:
+            # 1) 교체: 그 라운드에 쉬는 사람과 (구역이 있으면 같은 구역 선수만)
+            cands = pool if lane_pool is None else lane_pool[lane_of[i]]
+            y = cands[rng.randrange(len(cands))]
+            if y in members[r]:
+                continue
+            team, k = slot(i, rng.randrange(size))
+            x = team[k]
+            d = take(i, -1)
+            team[k] = y
+            d += take(i, +1)
+            if d <= 0 or rng.random() < math.exp(-d / temp):
+                cur += d
+            else:
+                take(i, -1)
+                team[k] = x
+                take(i, +1)
+
+        elif move < 0.7 or (move < 0.85 and not doubles):
+            # 2) 두 경기 사이 맞바꾸기
+            j = rng.randrange(n_games)
+            if j == i or lane_of[j] != lane_of[i]:
+                continue
+            s_ = round_of[j] + 1
+            ti, ki = slot(i, rng.randrange(size))
+            tj, kj = slot(j, rng.randrange(size))
+            x, y = ti[ki], tj[kj]
+            if s_ != r and (y in members[r] or x in members[s_]):
+                continue
+            d = take(i, -1) + take(j, -1)
+            ti[ki], tj[kj] = y, x
+            d += take(i, +1) + take(j, +1)
+            if d <= 0 or rng.random() < math.exp(-d / temp):
+                cur += d
+            else:
+                take(i, -1)
+                take(j, -1)
+                ti[ki], tj[kj] = x, y
+                take(i, +1)
+                take(j, +1)
+
+        elif move < 0.85:
+            # 3) 파트너 바꾸기 (ab|cd → ac|bd / ad|bc)
+            t1, t2 = games[i]
+            old = (t1[:], t2[:])
+            a, b = t1
+            c, e = t2
+            nt1, nt2 = ([a, c], [b, e]) if rng.random() < 0.5 else ([a, e], [b, c])
+            d = take(i, -1)
+            games[i] = (nt1, nt2)
+            d += take(i, +1)
+            if d <= 0 or rng.random() < math.exp(-d / temp):
+                cur += d
+            else:
+                take(i, -1)
+                games[i] = old
+                take(i, +1)
+
+        else:
+            # 4) 다른 라운드의 두 경기 자리 교환 (코트 번호는 자리에 남으니 같은 구역끼리만)
+            j = rng.randrange(n_games)
+            s_ = round_of[j] + 1
+            if s_ == r or lane_of[j] != lane_of[i]:
+                continue
+            gi = set(games[i][0] + games[i][1])
+            gj = set(games[j][0] + games[j][1])
+            if (members[s_] - gj) & gi or (members[r] - gi) & gj:
+                continue
+            d = take(i, -1) + take(j, -1)
+            games[i], games[j] = games[j], games[i]
+            d += take(i, +1) + take(j, +1)
+            if d <= 0 or rng.random() < math.exp(-d / temp):
+                cur += d
+            else:
+                take(i, -1)
+                take(j, -1)
+                games[i], games[j] = games[j], games[i]
+                take(i, +1)
+                take(j, +1)
+
+        if cur < best - 1e-9:
+            best = cur
+            best_games = [(list(t1), list(t2)) for t1, t2 in games]
+
+    result = as_schedule(best_games)
+    if progress is not None:
+        progress(result, best, it, time.time() - start)
+    return (result, best) if with_cost else result
@@ -0,0 +1,127 @@
+# ---------------------------------------------------------
+# drive_download_bytes_shared (single-flight 다운로드) 테스트
+#   - app.py 는 import 하면 화면까지 그려지므로, 필요한 함수만 소스에서 꺼내
+#     가짜 Drive 다운로드와 함께 실행
+#   - 실행: python -m pytest -q tests
+# ---------------------------------------------------------
+import ast
+import os
+import threading
+import time
+
+import pytest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+N_READERS = 20
+
+
+def load_app_functions(names, namespace):
+    """app.py 에서 이름이 names 인 최상위 함수만 namespace 에 정의 (데코레이터는 뺌)"""
+    with open(APP_PATH, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    funcs = [n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name in names]
+    for fn in funcs:
+        fn.decorator_list = []
+    exec(compile(ast.Module(body=funcs, type_ignores=[]), APP_PATH, "exec"), namespace)
+    return namespace
+
+
+class FakeDrive:
+    """drive_download_bytes 대신 쓰는 가짜: 호출 수를 세고, release 될 때까지 붙잡아 둠"""
+
+    def __init__(self, data=b'{"ok": true}', error=None):
+        self.data = data
+        self.error = error
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+
+    def download(self, file_id):
+        with self.lock:
+            self.calls += 1
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.data
+
+
+@pytest.fixture
+def shared():
+    def make(drive):
+        inflight = {"lock": threading.Lock(), "calls": {}}
+        ns = {
+            "threading": threading,
+            "drive_download_bytes": drive.download,
+            "_drive_inflight": lambda: inflight,
+        }
+        load_app_functions({"drive_download_bytes_shared"}, ns)
+        return ns["drive_download_bytes_shared"], inflight
+
+    return make
+
+
+def run_concurrent(fn, n):
+    """n 개 스레드가 동시에 fn() → (결과 목록, 예외 목록)"""
+    start = threading.Barrier(n + 1)
+    results, errors = [None] * n, [None] * n
+
+    def reader(i):
+        start.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    start.wait()
+    return threads, results, errors
+
+
+def test_concurrent_reads_download_once(shared):
+    drive = FakeDrive()
+    download, inflight = shared(drive)
+
+    threads, results, errors = run_concurrent(lambda: download("players", "rev-1"), N_READERS)
+    time.sleep(0.2)  # 나머지 요청이 진행 중인 다운로드에 붙을 시간
+    drive.release.set()
+    for t in threads:
+        t.join(5)
+
+    assert drive.calls == 1
+    assert errors == [None] * N_READERS
+    assert results == [drive.data] * N_READERS
+    assert inflight["calls"] == {}
+
+    # 끝난 뒤의 요청은 새로 받음 (결과를 계속 붙잡아 두지 않음)
+    download("players", "rev-1")
+    assert drive.calls == 2
+
+
+def test_different_versions_are_not_shared(shared):
+    drive = FakeDrive()
+    drive.release.set()
+    download, _ = shared(drive)
+
+    download("players", "rev-1")
+    download("players", "rev-2")
+    download("sessions", "rev-1")
+
+    assert drive.calls == 3
+
+
+def test_download_error_reaches_every_waiter(shared):
+    drive = FakeDrive(error=RuntimeError("drive down"))
+    download, inflight = shared(drive)
+
+    threads, results, errors = run_concurrent(lambda: download("sessions", "rev-1"), N_READERS)
+    time.sleep(0.2)
+    drive.release.set()
+    for t in threads:
+        t.join(5)
+
+    assert drive.calls == 1
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert results == [None] * N_READERS
+    assert inflight["calls"] == {}